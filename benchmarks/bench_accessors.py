@@ -0,0 +1,69 @@
+"""Measure the generic get and set option methods of MapClasses.
+
+Run with:  python benchmarks/bench_accessors.py [calls]
+
+Times getters and setters built once per class (by MapClassType)
+against the previous approach, a __getattr__ creating a closure on
+every call, for Marker, Map and InfoWindow.
+
+"""
+import sys
+import time
+
+from gmapi import maps
+
+
+class Legacy(dict):
+    """A MapClass copy with per-call accessors, as before."""
+    def __init__(self, obj):
+        super(Legacy, self).__init__(obj)
+        self._obj = obj
+        self._getopts, self._setopts = obj._getopts, obj._setopts
+
+    def __getattr__(self, item):
+        if 'arg' in self:
+            if item in self._getopts:
+                key = self._getopts[item]
+
+                def func():
+                    return self['arg'].get('opts', {}).get(key)
+                return func
+            if item in self._setopts:
+                key = self._setopts[item]
+
+                def func(value):
+                    self.setOptions({key: value})
+                return func
+        raise AttributeError(item)
+
+    def setOptions(self, opts):
+        # The same (overridden) setOptions, on the same options.
+        self._obj.setOptions(opts)
+
+
+def timed(func, calls):
+    start = time.time()
+    for _ in xrange(calls):
+        func()
+    return (time.time() - start) * 1e9 / calls
+
+
+def main(calls=200000):
+    here = maps.LatLng(38, -97)
+    objects = [
+        (maps.Marker(opts={'position': here}), 'getPosition', 'setTitle'),
+        (maps.Map(opts={'center': here, 'zoom': 4}), 'getZoom', 'setZoom'),
+        (maps.InfoWindow(opts={'content': 'Hi'}), 'getContent', 'setZIndex'),
+    ]
+    for obj, getter, setter in objects:
+        legacy = Legacy(obj)
+        for label, target in (('closure', legacy), ('built', obj)):
+            get, set = getter, setter
+            before = timed(lambda: getattr(target, get)(), calls)
+            after = timed(lambda: getattr(target, set)(1), calls)
+            print '%-10s %-8s %-12s %6.0f ns  %-10s %6.0f ns' % (
+                obj['cls'], label, get, before, set, after)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,78 @@
+"""Measure argument lookups by name in the static map url hot path.
+
+Run with:  python benchmarks/bench_args_schema.py [markers] [vertices]
+
+Renders the static map url of a map with many markers and a long
+polyline, with Args looking names up in their class's shared
+ArgsSchema, and with the previous Args (a list of names per instance,
+searched on every lookup) swapped in. Also compares their sizes.
+
+"""
+import sys
+import time
+
+from gmapi import maps
+
+
+class LegacyArgs(list):
+    """Args as before: its own list of names, searched with index."""
+    def __init__(self, names, values=None):
+        super(LegacyArgs, self).__init__(values or [])
+        self.names = names
+
+    def get(self, name, default=None):
+        i = self.names.index(name)
+        return self[i] if len(self) > i else default
+
+    def setdefault(self, name, default=None):
+        i = self.names.index(name)
+        if len(self) <= i or self[i] is None:
+            self.extend(None for _ in xrange(len(self), i))
+            self.append(default)
+        return self[i]
+
+
+def legacy(obj):
+    """Swap LegacyArgs into obj and everything it holds."""
+    if isinstance(obj, maps.MapClass) and isinstance(obj.get('arg'),
+                                                      maps.Args):
+        obj['arg'] = LegacyArgs(obj['arg'].names, obj['arg'])
+    if isinstance(obj, dict):
+        values = obj.values()
+    elif isinstance(obj, (list, maps.OverlayList)):
+        values = obj
+    else:
+        return
+    for value in values:
+        legacy(value)
+
+
+def main(markers=2000, vertices=2000):
+    def build():
+        gmap = maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': 4,
+                              'size': maps.Size(640, 480)})
+        for i in xrange(markers):
+            maps.Marker(opts={'map': gmap, 'position': maps.LatLng(
+                25 + i % 25, -125 + i % 55), 'label': 'A'})
+        maps.Polyline(opts={'map': gmap, 'path': [
+            maps.LatLng(30 + (i % 7) * 0.1, -120 + i * 0.02)
+            for i in xrange(vertices)]})
+        return gmap
+
+    shared, old = build(), build()
+    legacy(old)
+    assert unicode(shared) == unicode(old)
+    for label, gmap in (('per-instance names', old),
+                        ('shared ArgsSchema', shared)):
+        start = time.time()
+        for _ in xrange(10):
+            unicode(gmap)
+        print '%-20s %8.1f ms per static url' % (
+            label, (time.time() - start) * 100)
+    args = shared['arg']
+    print 'Args size: %d bytes (was %d, plus its names list)' % (
+        sys.getsizeof(args), sys.getsizeof(LegacyArgs(args.names, args)))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
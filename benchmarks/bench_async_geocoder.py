@@ -0,0 +1,51 @@
+"""Measure request coalescing in AsyncGeocoder.
+
+Run with:  python benchmarks/bench_async_geocoder.py [requests] [addresses]
+
+Simulates a burst of page loads geocoding a few popular addresses,
+against an in-process Web Service taking 20 ms per request (with the
+result cache disabled, so only in-flight requests can be shared).
+Compares Geocoder.geocode_many, where every request is looked up,
+with AsyncGeocoder, where concurrent identical requests share one
+lookup. Also times how long submitting the burst blocks the caller.
+
+"""
+import sys
+import time
+
+from gmapi import maps
+
+
+def respond(request):
+    time.sleep(0.02)
+    return {'status': 'OK', 'results': [{'geometry': {
+        'location': {'lat': 38.0, 'lng': -97.0}}}]}
+
+
+def main(requests=500, addresses=5):
+    maps.GEOCODE_CACHE = None
+    maps.Geocoder._limiter = maps._TokenBucket(1e9, burst=1e9)
+    burst = [{'address': 'Main St %d' % (i % addresses)}
+             for i in xrange(requests)]
+
+    transport = maps.LocalTransport(respond)
+    start = time.time()
+    maps.Geocoder(transport=transport).geocode_many(
+        [dict(r) for r in burst])
+    print 'geocode_many   %6d lookups %8.0f ms' % (
+        transport.requests, (time.time() - start) * 1000)
+
+    transport = maps.LocalTransport(respond)
+    geocoder = maps.AsyncGeocoder(maps.Geocoder(transport=transport))
+    start = time.time()
+    futures = [geocoder.geocode(request) for request in burst]
+    submitted = time.time() - start
+    for future in futures:
+        future.result()
+    geocoder.close()
+    print 'AsyncGeocoder  %6d lookups %8.0f ms (submitted in %.1f ms)' % (
+        transport.requests, (time.time() - start) * 1000, submitted * 1000)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
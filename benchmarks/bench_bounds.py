@@ -0,0 +1,46 @@
+"""Measure computing the bounds of many markers.
+
+Run with:  python benchmarks/bench_bounds.py [markers]
+
+Compares extending a LatLngBounds marker by marker with
+LatLngBounds.from_points, over the markers themselves and over a
+PathArray of their positions, then fits a map to the bounds.
+
+"""
+import random
+import sys
+import time
+
+from gmapi import maps
+
+
+def main(markers=100000):
+    rnd = random.Random(0)
+    lats = [rnd.uniform(25, 50) for _ in xrange(markers)]
+    lngs = [rnd.uniform(-125, -70) for _ in xrange(markers)]
+    points = [maps.Marker(opts={'position': maps.LatLng(lat, lng)})
+              for lat, lng in zip(lats, lngs)]
+    path = maps.PathArray.from_arrays(lats, lngs)
+
+    start = time.time()
+    bounds = maps.LatLngBounds()
+    for marker in points:
+        bounds.extend(marker.getPosition())
+    loop = time.time() - start
+    print 'extend per marker          %8.1f ms' % (loop * 1000)
+    for label, source in (('from_points (markers)', points),
+                          ('from_points (PathArray)', path)):
+        start = time.time()
+        result = maps.LatLngBounds.from_points(source)
+        elapsed = time.time() - start
+        assert result.equals(bounds)
+        print '%-26s %8.1f ms (%.0fx faster)' % (
+            label, elapsed * 1000, loop / elapsed)
+
+    gmap = maps.Map(opts={'size': maps.Size(640, 480)})
+    gmap.fitBounds(bounds)
+    print 'fitted to %s at zoom %d' % (gmap.getCenter(), gmap.getZoom())
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,56 @@
+"""Measure cache backend throughput under concurrent access.
+
+Run with:  python benchmarks/bench_cache_backends.py [threads] [ops]
+
+Each thread performs ops operations, 80% get and 20% set, on keys
+drawn from a pool twice the size of the cache.
+
+"""
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from gmapi.utils.cache import get_cache
+
+
+def run(cache, threads, ops, keys=2000):
+    def work(seed):
+        rnd = random.Random(seed)
+        for _ in xrange(ops):
+            key = 'key%d' % rnd.randrange(keys)
+            if rnd.random() < 0.8:
+                cache.get(key)
+            else:
+                cache.set(key, {'lat': 38.0, 'lng': -97.0})
+
+    workers = [threading.Thread(target=work, args=(i,))
+               for i in xrange(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * ops / (time.time() - start)
+
+
+def main(threads=8, ops=5000):
+    tmp = tempfile.mkdtemp()
+    try:
+        backends = [
+            ('locmem', 'locmem://bench?max_entries=1000'),
+            ('file', 'file://%s/files?max_entries=1000' % tmp),
+            ('sqlite', 'sqlite://%s/cache.db?max_entries=1000' % tmp),
+        ]
+        for name, uri in backends:
+            ops_per_second = run(get_cache(uri), threads, ops)
+            print '%-8s %2d threads: %10.0f ops/s' % (name, threads,
+                                                      ops_per_second)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,75 @@
+"""Measure coordinate formatting for static map urls and JSON.
+
+Run with:  python benchmarks/bench_degree_format.py [points]
+
+Formats the same coordinates as before (a Degree per coordinate,
+printed one at a time, and one JSON float at a time) and in bulk:
+LatLng.toUrlValue, a MarkerLayer's and a Polyline's static map url
+value (with plain, not encoded, paths) and the JSON of a PathArray.
+Checks that both produce the same text.
+
+"""
+import random
+import sys
+import time
+from itertools import izip
+
+from gmapi import maps
+
+
+def legacy_url(path):
+    return '|'.join(['%s,%s' % (maps.Degree(lat), maps.Degree(lng))
+                     for lat, lng in izip(path.lats, path.lngs)])
+
+
+class LegacyEncoder(maps.MapEncoder):
+    """MapEncoder formatting a PathArray one point at a time."""
+    def _iterpath(self, path):
+        d = maps.CompactLatLng(0, 0)._asdict()
+        template = '{%s}' % self.item_separator.join(
+            self._encodestr(key) + self.key_separator +
+            ('[%s' + self.item_separator + '%s]' if key == 'arg'
+             else self._encodestr(d[key])) for key in d)
+        separator = '['
+        for lat, lng in izip(path.lats, path.lngs):
+            yield separator + template % (self._encodefloat(lat),
+                                          self._encodefloat(lng))
+            separator = self.item_separator
+        yield ']'
+
+
+def timed(label, old, new):
+    results = []
+    for fn in (old, new):
+        start = time.time()
+        results.append(fn())
+        results.append(time.time() - start)
+    assert results[0] == results[2], label
+    print '%-22s %9.1f ms -> %8.1f ms (%.1fx)' % (
+        label, results[1] * 1000, results[3] * 1000, results[1] / results[3])
+
+
+def main(points=200000):
+    rnd = random.Random(0)
+    path = maps.PathArray.from_arrays(
+        [rnd.uniform(25, 50) for _ in xrange(points)],
+        [rnd.uniform(-125, -70) for _ in xrange(points)])
+    latlngs = [maps.LatLng(p.lat(), p.lng()) for p in path[:points // 10]]
+    maps.STATIC_ENCODE_PATHS = False
+    layer = maps.MarkerLayer(opts={'positions': path})
+    line = maps.Polyline(opts={'path': path})
+    timed('LatLng.toUrlValue',
+          lambda: [(u'%s,%s' % (maps.Degree(p.lat()), maps.Degree(p.lng())))
+                   for p in latlngs],
+          lambda: [p.toUrlValue() for p in latlngs])
+    timed('MarkerLayer static', lambda: legacy_url(path),
+          lambda: unicode(layer))
+    timed('Polyline static', lambda: legacy_url(path), lambda: unicode(line))
+    separators = (',', ':')
+    timed('PathArray JSON',
+          lambda: LegacyEncoder(separators=separators).encode(path),
+          lambda: maps.MapEncoder(separators=separators).encode(path))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
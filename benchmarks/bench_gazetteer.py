@@ -0,0 +1,64 @@
+"""Measure offline reverse geocoding with a Gazetteer.
+
+Run with:  python benchmarks/bench_gazetteer.py [places] [queries]
+
+Builds a gazetteer of random places (about the size of GeoNames'
+postal code dump by default), saves it, and times loading it back
+(memory-mapped), reverse geocoding GPS fixes with it through a
+Geocoder, and a linear scan over every place for comparison.
+
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from math import cos, radians, sin
+
+from gmapi import maps
+from gmapi.gazetteer import Gazetteer
+
+
+def main(places=1000000, queries=20000):
+    rnd = random.Random(0)
+    start = time.time()
+    gazetteer = Gazetteer(((rnd.uniform(-60, 70), rnd.uniform(-180, 180),
+                            [u'%05d' % i, u'Place %d' % i, u'XX'])
+                           for i in xrange(places)),
+                          ['postal_code', 'locality', 'country'])
+    print 'built %d places in %.1f s' % (places, time.time() - start)
+    path = os.path.join(tempfile.mkdtemp(), 'places.gaz')
+    gazetteer.save(path)
+    start = time.time()
+    loaded = Gazetteer.load(path)
+    print 'loaded %.0f MB in %.1f ms' % (os.path.getsize(path) / 1e6,
+                                         (time.time() - start) * 1000)
+
+    fixes = [maps.LatLng(rnd.uniform(-60, 70), rnd.uniform(-180, 180))
+             for _ in xrange(queries)]
+    for label, backend in (('built', gazetteer), ('loaded', loaded)):
+        geocoder = maps.Geocoder(backend=backend)
+        start = time.time()
+        for fix in fixes:
+            geocoder.geocode({'latLng': fix})
+        print 'reverse geocode (%s)   %8.1f us each' % (
+            label, (time.time() - start) * 1e6 / queries)
+    loaded.close()
+
+    # A linear scan, for comparison.
+    points = [(cos(radians(lat)) * cos(radians(lng)),
+               cos(radians(lat)) * sin(radians(lng)), sin(radians(lat)))
+              for lat, lng in zip(gazetteer._lats, gazetteer._lngs)]
+    fix = fixes[0]
+    start = time.time()
+    qx, qy, qz = (cos(radians(fix.lat())) * cos(radians(fix.lng())),
+                  cos(radians(fix.lat())) * sin(radians(fix.lng())),
+                  sin(radians(fix.lat())))
+    min(xrange(places), key=lambda i: (points[i][0] - qx) ** 2 +
+        (points[i][1] - qy) ** 2 + (points[i][2] - qz) ** 2)
+    print 'linear scan             %8.1f us each' % (
+        (time.time() - start) * 1e6)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
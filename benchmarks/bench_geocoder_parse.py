@@ -0,0 +1,71 @@
+"""Measure decoding of large Geocoder responses.
+
+Run with:  python benchmarks/bench_geocoder_parse.py [results]
+
+Decodes a Web Service response with many results (as returned for
+vague addresses, or when batching) by decoding and then traversing it
+with _parseGeocoderResult, converting while decoding with a json
+object_hook, and lazily (converting only the locations that are read).
+
+"""
+import json
+import random
+import sys
+import time
+
+from gmapi import maps
+
+
+def response(results):
+    rnd = random.Random(0)
+
+    def latlng():
+        return {'lat': rnd.uniform(25, 50), 'lng': rnd.uniform(-125, -70)}
+    return json.dumps({'status': 'OK', 'results': [{
+        'address_components': [
+            {'long_name': 'Component %d' % j, 'short_name': 'C%d' % j,
+             'types': ['political']} for j in xrange(5)],
+        'formatted_address': 'Address %d' % i,
+        'geometry': {
+            'location': latlng(), 'location_type': 'APPROXIMATE',
+            'viewport': {'southwest': latlng(), 'northeast': latlng()},
+            'bounds': {'southwest': latlng(), 'northeast': latlng()}},
+        'types': ['locality', 'political']} for i in xrange(results)]})
+
+
+def timed(label, func, repeat=5):
+    start = time.time()
+    for _ in xrange(repeat):
+        func()
+    elapsed = (time.time() - start) / repeat
+    print '%-36s %8.1f ms' % (label, elapsed * 1000)
+    return elapsed
+
+
+def main(results=5000):
+    data = response(results)
+    print '%d results, %d bytes' % (results, len(data))
+
+    def traverse():
+        maps._parseGeocoderResult(json.loads(data)['results'])
+
+    def hook():
+        json.loads(data, object_hook=maps._geocoderObject)['results']
+
+    def lazy():
+        json.loads(data, object_hook=maps._lazyGeocoderObject)['results']
+
+    def lazyFirst():
+        found = json.loads(data, object_hook=maps._lazyGeocoderObject)
+        found['results'][0]['geometry']['location']
+
+    base = timed('decode, then traverse', traverse)
+    for label, func in (('convert while decoding', hook),
+                        ('lazy, nothing read', lazy),
+                        ('lazy, first location read', lazyFirst)):
+        elapsed = timed(label, func)
+        print '%-36s %8.1fx' % ('', base / elapsed)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,82 @@
+"""Measure Geocoder throughput with different transports.
+
+Run with:  python benchmarks/bench_geocoder_transport.py [requests]
+
+Geocodes distinct addresses (so nothing is cached) with geocode_many:
+in process with a LocalTransport, to measure the pipeline itself, and
+against a local HTTP/1.1 server with one-shot urllib2 requests and
+with an HTTPTransport's pool of keep-alive connections. Over a real
+network (and TLS) the handshakes saved are far more expensive.
+
+"""
+import BaseHTTPServer
+import json
+import sys
+import threading
+import time
+import urllib2
+from SocketServer import ThreadingMixIn
+
+from gmapi import maps
+
+
+def respond(request):
+    return {'status': 'OK', 'results': [{
+        'formatted_address': request['address'],
+        'geometry': {'location': {'lat': 38.0, 'lng': -97.0},
+                     'location_type': 'APPROXIMATE'}}]}
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffer writes, so each response goes out in one packet.
+    wbufsize = -1
+
+    def do_GET(self):
+        body = json.dumps(respond({'address': self.path}))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class OneShotTransport(object):
+    """A new connection per request, as urllib2.urlopen makes."""
+    def fetch(self, url):
+        return urllib2.urlopen(url).read()
+
+
+def main(requests=2000):
+    maps.GEOCODE_CACHE = None
+    maps.Geocoder._limiter = maps._TokenBucket(1e9, burst=1e9)
+    server = Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    maps.GEOCODE_URL = 'http://127.0.0.1:%d/geocode' % server.server_port
+
+    for label, transport in (
+            ('in process (LocalTransport)', maps.LocalTransport(respond)),
+            ('one-shot urllib2', OneShotTransport()),
+            ('keep-alive pool', maps.HTTPTransport())):
+        geocoder = maps.Geocoder(transport=transport)
+        batch = [{'address': '%s %d' % (label, i)}
+                 for i in xrange(requests)]
+        start = time.time()
+        responses = geocoder.geocode_many(batch)
+        elapsed = time.time() - start
+        assert all(status == 'OK' for results, status in responses)
+        print '%-28s %8.0f requests/s' % (label, requests / elapsed)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
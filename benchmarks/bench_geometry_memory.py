@@ -0,0 +1,60 @@
+"""Measure the memory used per marker by LatLng versus CompactLatLng.
+
+Run with:  python benchmarks/bench_geometry_memory.py [count]
+
+"""
+import gc
+import sys
+
+from gmapi import maps
+
+
+def deep_size(obj, seen=None):
+    """Return the approximate size in bytes of an object graph."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += deep_size(item, seen)
+    if hasattr(obj, '__dict__'):
+        size += deep_size(obj.__dict__, seen)
+    for cls in type(obj).__mro__:
+        for slot in cls.__dict__.get('__slots__', ()):
+            if hasattr(obj, slot):
+                size += deep_size(getattr(obj, slot), seen)
+    return size
+
+
+def per_marker(factory, count):
+    gmap = maps.Map()
+    for i in xrange(count):
+        maps.Marker({'map': gmap,
+                     'position': factory(i * 0.0001, -i * 0.0001)})
+    # Shared strings and the map itself are counted once, then amortised.
+    return deep_size(gmap) / float(count)
+
+
+def per_position(factory, count):
+    objs = [factory(i * 0.0001, -i * 0.0001) for i in xrange(count)]
+    seen = set([id(o) for o in ('cls', 'arg', 'lat', 'lng', 'noWrap',
+                                'LatLng')])
+    return sum(deep_size(o, seen) for o in objs) / float(count)
+
+
+def main(count=10000):
+    gc.collect()
+    for name, factory in (('LatLng', maps.LatLng),
+                          ('CompactLatLng', maps.CompactLatLng)):
+        print '%-14s %8.1f bytes/position %8.1f bytes/marker' % (
+            name, per_position(factory, count), per_marker(factory, count))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
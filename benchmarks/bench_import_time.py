@@ -0,0 +1,85 @@
+"""Measure the start-up time of importing gmapi.maps.
+
+Run with:  python benchmarks/bench_import_time.py [runs] [revision]
+
+Compares a bare interpreter, importing gmapi.maps (which no longer
+builds the default cache, or imports the modules the geocoder uses),
+and importing it and then forcing the default cache to be created,
+which is what every import used to do. Each is timed in this tree and
+in revision (by default the repository's first commit), which is
+checked out with git archive into a temporary directory; snippets
+which fail in a tree are shown as n/a. Both are byte-compiled first,
+as an installed package would be.
+
+"""
+import compileall
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SNIPPETS = [
+    ('python', 'pass'),
+    ('import gmapi.maps', 'import gmapi.maps'),
+    ('import + default cache',
+     'import gmapi.maps\nfrom gmapi.utils.cache import cache\ncache.get("x")'),
+]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git(*args):
+    return subprocess.check_output(('git',) + args, cwd=ROOT).strip()
+
+
+def checkout(revision):
+    """Extract revision's gmapi package, returning the directory."""
+    path = tempfile.mkdtemp()
+    archive = subprocess.Popen(['git', 'archive', revision, 'gmapi'],
+                               cwd=ROOT, stdout=subprocess.PIPE)
+    subprocess.check_call(['tar', '-x', '-C', path], stdin=archive.stdout)
+    if archive.wait():
+        raise SystemExit('git archive %s failed' % revision)
+    return path
+
+
+def timed(code, path, runs):
+    """Return the median time to run code with gmapi from path, or
+    None if it fails."""
+    env = dict(os.environ, PYTHONPATH=path)
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in xrange(runs):
+            start = time.time()
+            # Run in path, which python -c puts first on sys.path.
+            if subprocess.call([sys.executable, '-c', code], cwd=path,
+                               env=env, stderr=devnull):
+                return None
+            times.append(time.time() - start)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def ms(seconds):
+    return '   n/a   ' if seconds is None else '%6.1f ms' % (seconds * 1000)
+
+
+def main(runs=20, revision=None):
+    revision = revision or git('rev-list', '--max-parents=0', 'HEAD')
+    baseline = checkout(revision)
+    try:
+        for path in (baseline, ROOT):
+            compileall.compile_dir(os.path.join(path, 'gmapi'), quiet=True)
+        print '%-24s %9s %9s' % ('', revision[:9], 'this tree')
+        for name, code in SNIPPETS:
+            print '%-24s %s %s' % (name, ms(timed(code, baseline, runs)),
+                                   ms(timed(code, ROOT, runs)))
+    finally:
+        shutil.rmtree(baseline)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(*([int(a) for a in args[:1]] + args[1:]))
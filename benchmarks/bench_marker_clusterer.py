@@ -0,0 +1,52 @@
+"""Measure server-side marker clustering.
+
+Run with:  python benchmarks/bench_marker_clusterer.py [markers]
+
+Clusters markers spread over the continental United States, then
+compares the map's JSON with every marker against the clustered map
+at a few zoom levels, and times adding a marker incrementally.
+
+"""
+import random
+import sys
+import time
+
+from gmapi import maps
+from gmapi.markerclusterer import MarkerClusterer
+
+
+def main(markers=100000):
+    rnd = random.Random(0)
+    gmap = maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': 4,
+                          'size': maps.Size(500, 400)})
+    points = [maps.Marker(opts={'position': maps.LatLng(
+        rnd.uniform(25, 50), rnd.uniform(-125, -70))})
+        for _ in xrange(markers)]
+    encoder = maps.MapEncoder(separators=(',', ':'))
+    gmap['mkr'] = points
+    start = time.time()
+    raw = len(encoder.encode(gmap))
+    print 'all markers     %8d markers %10d bytes %8.1f ms' % (
+        markers, raw, (time.time() - start) * 1000)
+    del gmap['mkr']
+
+    start = time.time()
+    clusterer = MarkerClusterer(gmap, points)
+    print 'clustered all zoom levels in %.2f s' % (time.time() - start)
+    for zoom in (4, 8, 12):
+        gmap.setOptions({'zoom': zoom})
+        start = time.time()
+        clusterer.redraw()
+        size = len(encoder.encode(gmap))
+        print 'zoom %2d         %8d markers %10d bytes %8.1f ms' % (
+            zoom, len(gmap.markers), size, (time.time() - start) * 1000)
+
+    marker = maps.Marker(opts={'position': maps.LatLng(38, -97)})
+    start = time.time()
+    clusterer.addMarker(marker)
+    print 'add one marker and redraw  %8.2f ms' % (
+        (time.time() - start) * 1000)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,81 @@
+"""Measure Map.markers_in and Map.nearest against a linear scan.
+
+Run with:  python benchmarks/bench_marker_index.py [markers] [queries]
+
+Markers are spread over the continental United States. Each query
+looks up a 1 degree square viewport and the 20 markers nearest to a
+random point. Building a million Markers takes a while (and a couple
+of gigabytes); pass a smaller count for a quick run.
+
+"""
+import random
+import sys
+import time
+from math import asin, cos, radians, sin, sqrt
+
+from gmapi import maps
+
+
+def distance(a, b):
+    phi1, phi2 = radians(a.lat()), radians(b.lat())
+    h = (sin((phi2 - phi1) / 2) ** 2 + cos(phi1) * cos(phi2) *
+         sin(radians(b.lng() - a.lng()) / 2) ** 2)
+    return 2 * asin(sqrt(min(h, 1.0)))
+
+
+def scan_in(gmap, bounds):
+    sw, ne = bounds.getSouthWest(), bounds.getNorthEast()
+    result = []
+    for marker in gmap.markers:
+        p = marker.getPosition()
+        if (sw.lat() <= p.lat() <= ne.lat() and
+                sw.lng() <= p.lng() <= ne.lng()):
+            result.append(marker)
+    return result
+
+
+def scan_nearest(gmap, latlng, k):
+    return sorted(gmap.markers,
+                  key=lambda m: distance(latlng, m.getPosition()))[:k]
+
+
+def timed(func, args):
+    start = time.time()
+    for a in args:
+        func(*a)
+    return (time.time() - start) / len(args)
+
+
+def main(markers=1000000, queries=100):
+    rnd = random.Random(0)
+    gmap = maps.Map()
+    start = time.time()
+    for _ in xrange(markers):
+        maps.Marker(opts={'map': gmap, 'position': maps.CompactLatLng(
+            rnd.uniform(25, 50), rnd.uniform(-125, -70))})
+    print 'created %d markers  %8.2f s' % (markers, time.time() - start)
+    start = time.time()
+    gmap._getIndex()
+    print 'built index          %8.2f s' % (time.time() - start)
+
+    points = [maps.LatLng(rnd.uniform(26, 49), rnd.uniform(-124, -71))
+              for _ in xrange(queries)]
+    boxes = [(maps.LatLngBounds(maps.LatLng(p.lat() - 0.5, p.lng() - 0.5),
+                                maps.LatLng(p.lat() + 0.5, p.lng() + 0.5)),)
+             for p in points]
+    nearest = [(p, 20) for p in points]
+    indexed_in = timed(gmap.markers_in, boxes)
+    indexed_nearest = timed(gmap.nearest, nearest)
+    # The linear scans are slow, so only run a few of them.
+    scanned_in = timed(lambda b: scan_in(gmap, b), boxes[:3])
+    scanned_nearest = timed(lambda p, k: scan_nearest(gmap, p, k),
+                            nearest[:3])
+    print 'markers_in  %9.3f ms (scan %9.3f ms, %6.0fx)' % (
+        indexed_in * 1000, scanned_in * 1000, scanned_in / indexed_in)
+    print 'nearest     %9.3f ms (scan %9.3f ms, %6.0fx)' % (
+        indexed_nearest * 1000, scanned_nearest * 1000,
+        scanned_nearest / indexed_nearest)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
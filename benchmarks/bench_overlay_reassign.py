@@ -0,0 +1,62 @@
+"""Measure moving markers between maps in bulk.
+
+Run with:  python benchmarks/bench_overlay_reassign.py [markers]
+
+Moves every marker from one map to another, as setMap does, with the
+maps' overlays held in plain lists (as they used to be, where removal
+is a linear scan comparing markers by value) and in OverlayLists.
+Then moves 1, 4 and 16 times as many markers between OverlayLists,
+first marker first, and checks that the cost per marker stays flat.
+
+"""
+import gc
+import sys
+import time
+
+from gmapi import maps
+
+
+def reassign(markers, source, target):
+    # As timeit does, so that collections of the whole heap don't count.
+    gc.disable()
+    try:
+        start = time.time()
+        for marker in markers:
+            marker.setOptions({'map': target})
+        return time.time() - start
+    finally:
+        gc.enable()
+
+
+def move(markers, container, order):
+    source, target = maps.Map(), maps.Map()
+    points = [maps.Marker(opts={'position': maps.LatLng(i / 1e3, i / 1e3)})
+              for i in xrange(markers)]
+    for marker in points:
+        marker._map = source
+    source['mkr'], target['mkr'] = container(points), container()
+    elapsed = reassign(order(points), source, target)
+    assert len(target['mkr']) == markers and not len(source['mkr'])
+    return elapsed
+
+
+def main(markers=5000):
+    timings = []
+    for name, container in (('list', list),
+                            ('OverlayList', maps.OverlayList)):
+        # Move the markers in the order that makes a list scan longest.
+        elapsed = move(markers, container, reversed)
+        timings.append(elapsed)
+        print '%-12s %8.3f s  (%.2f us per marker)' % (
+            name, elapsed, elapsed * 1e6 / markers)
+    print 'speedup      %8.0fx' % (timings[0] / timings[1])
+    costs = []
+    for count in (markers, 4 * markers, 16 * markers):
+        # Removing from the front is the slowest way to empty a list.
+        costs.append(move(count, maps.OverlayList, list) / count)
+        print '%8d markers  %.2f us per marker' % (count, costs[-1] * 1e6)
+    assert costs[-1] < 2 * costs[0], 'cost per marker grows with the map'
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,88 @@
+"""Measure point in polygon queries against sales territories.
+
+Run with:  python benchmarks/bench_polygon_contains.py [points] [vertices]
+
+Splits the continental United States into a grid of territories with
+wiggly borders of the given number of vertices each, then assigns
+random customer points to territories: with a plain ray cast against
+every territory in turn, with Polygon.containsLocation (per point)
+and with PolygonIndex.locate_many.
+
+"""
+import random
+import sys
+import time
+from math import sin
+
+from gmapi import maps
+from gmapi.geometry import PolygonIndex
+
+
+def border(a, b, vertices):
+    """A wiggly line from a to b (both (lat, lng) pairs)."""
+    points = []
+    for i in xrange(vertices):
+        t = float(i) / vertices
+        wiggle = 0.2 * sin(t * 40)
+        points.append((a[0] + (b[0] - a[0]) * t + wiggle * (b[1] != a[1]),
+                       a[1] + (b[1] - a[1]) * t + wiggle * (b[0] != a[0])))
+    return points
+
+
+def territory(south, west, north, east, vertices):
+    corners = [(south, west), (south, east), (north, east), (north, west)]
+    path = []
+    for a, b in zip(corners, corners[1:] + corners[:1]):
+        path.extend(border(a, b, vertices // 4))
+    return maps.Polygon({'paths': [[maps.LatLng(*p) for p in path]]})
+
+
+def rayCast(path, lat, lng):
+    inside = False
+    j = len(path) - 1
+    for i in xrange(len(path)):
+        (y1, x1), (y2, x2) = path[j], path[i]
+        if (y1 > lat) != (y2 > lat) and \
+                lng < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+        j = i
+    return inside
+
+
+def main(points=1000000, vertices=400):
+    rnd = random.Random(0)
+    territories = [territory(lat, lng, lat + 5, lng + 5, vertices)
+                   for lat in xrange(25, 50, 5) for lng in xrange(-125, -70, 5)]
+    rings = [[(p.lat(), p.lng()) for p in t.getPath()] for t in territories]
+    lats = [rnd.uniform(25, 50) for _ in xrange(points)]
+    lngs = [rnd.uniform(-125, -70) for _ in xrange(points)]
+    path = maps.PathArray.from_arrays(lats, lngs)
+    print '%d territories of %d vertices, %d points' % (
+        len(territories), vertices, points)
+
+    # The plain ray cast is slow; time a sample and scale it up.
+    sample = min(points, 2000)
+    start = time.time()
+    for lat, lng in zip(lats[:sample], lngs[:sample]):
+        for ring in rings:
+            if rayCast(ring, lat, lng):
+                break
+    naive = (time.time() - start) * points / sample
+    print 'ray cast every territory   %9.1f s (estimated)' % naive
+
+    index = PolygonIndex(territories)
+    start = time.time()
+    for point in path[:sample * 10]:
+        index.locate(point)
+    each = (time.time() - start) * points / (sample * 10)
+    print 'PolygonIndex.locate        %9.1f s (estimated)' % each
+
+    start = time.time()
+    index.locate_many(path)
+    batched = time.time() - start
+    print 'PolygonIndex.locate_many   %9.1f s (%.0fx faster)' % (
+        batched, naive / batched)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,40 @@
+"""Compare static map path sizes and polyline encoding speed.
+
+Run with:  python benchmarks/bench_polyline_encoding.py [points]
+
+"""
+import random
+import sys
+import timeit
+
+from gmapi import geometry, maps
+
+
+def main(count=100000):
+    random.seed(0)
+    lat, lng, points = 38.0, -97.0, []
+    for _ in xrange(count):
+        lat += random.uniform(-0.001, 0.001)
+        lng += random.uniform(-0.001, 0.001)
+        points.append((lat, lng))
+    path = maps.PathArray(points)
+    line = maps.Polyline({'path': path})
+
+    maps.STATIC_ENCODE_PATHS = False
+    plain = len(unicode(line))
+    maps.STATIC_ENCODE_PATHS = True
+    encoded = len(unicode(line))
+    print 'path value: %d chars plain, %d chars encoded (%.1fx)' % (
+        plain, encoded, plain / float(encoded))
+
+    numpy = geometry.numpy
+    for name in (('numpy', 'python') if numpy else ('python',)):
+        geometry.numpy = numpy if name == 'numpy' else None
+        seconds = min(timeit.repeat(
+            lambda: geometry.encoding.encodePath(path), number=1, repeat=3))
+        print 'encodePath (%s): %d points in %.3fs' % (name, count, seconds)
+    geometry.numpy = numpy
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,69 @@
+"""Measure batched spherical geometry against per-point calls.
+
+Run with:  python benchmarks/bench_spherical.py [points]
+
+Times the length and area of a long random path, and the distances
+and headings from one point to a large number of points and markers,
+with the per-point spherical functions against their batched
+counterparts. With markers, looking up their positions dominates.
+
+"""
+import random
+import sys
+import time
+
+from gmapi import maps
+from gmapi.geometry import spherical
+
+
+def timed(label, func, *args):
+    start = time.time()
+    func(*args)
+    elapsed = time.time() - start
+    print '%-34s %9.1f ms' % (label, elapsed * 1000)
+    return elapsed
+
+
+def main(points=200000):
+    rnd = random.Random(0)
+    lats = [rnd.uniform(25, 50) for _ in xrange(points)]
+    lngs = [rnd.uniform(-125, -70) for _ in xrange(points)]
+    path = maps.PathArray.from_arrays(lats, lngs)
+    latlngs = [maps.LatLng(lat, lng) for lat, lng in zip(lats, lngs)]
+    markers = [maps.Marker(opts={'position': p}) for p in latlngs]
+    origin = maps.LatLng(38, -97)
+
+    def scalarLength():
+        return sum(spherical.computeDistanceBetween(latlngs[i],
+                                                    latlngs[i + 1])
+                   for i in xrange(points - 1))
+
+    def scalarPoints():
+        return [spherical.computeDistanceBetween(origin, p)
+                for p in latlngs]
+
+    def scalarDistances():
+        return [spherical.computeDistanceBetween(origin, m.getPosition())
+                for m in markers]
+
+    def scalarHeadings():
+        return [spherical.computeHeading(origin, m.getPosition())
+                for m in markers]
+
+    for label, scalar, batched in (
+            ('path length', (scalarLength,),
+             (spherical.computeLength, path)),
+            ('distances to points', (scalarPoints,),
+             (spherical.distance_many, origin, path)),
+            ('distances to markers', (scalarDistances,),
+             (spherical.distance_many, origin, markers)),
+            ('headings to markers', (scalarHeadings,),
+             (spherical.heading_many, origin, markers))):
+        slow = timed(label + ' (per point)', *scalar)
+        fast = timed(label + ' (batched)', *batched)
+        print '%-34s %9.1fx' % ('', slow / fast)
+    timed('path area (batched)', spherical.computeArea, path)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,56 @@
+"""Measure tiled loading of a national-scale marker layer.
+
+Run with:  python benchmarks/bench_tiles.py [markers] [zoom]
+
+Compares the JSON sent with the page when every marker is inlined in
+the map against serving them from a TileIndex: the JSON of the tiles
+covering a 640x480 viewport at the given zoom, and the time taken to
+build the index and to serve those tiles.
+
+"""
+import random
+import sys
+import time
+from math import floor
+
+from gmapi import maps
+from gmapi.tiles import TileIndex
+
+
+def main(markers=200000, zoom=8):
+    rnd = random.Random(0)
+    gmap = maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': zoom,
+                          'size': maps.Size(640, 480)})
+    points = [maps.Marker(opts={'position': maps.LatLng(
+        rnd.uniform(25, 50), rnd.uniform(-125, -70))})
+        for _ in xrange(markers)]
+    encoder = maps.MapEncoder(separators=(',', ':'))
+    gmap['mkr'] = points
+    inline = len(encoder.encode(gmap))
+    del gmap['mkr']
+
+    start = time.time()
+    index = TileIndex('/tiles/{z}/{x}/{y}.json', points,
+                      opts={'minZoom': 6, 'maxZoom': 14})
+    built = time.time() - start
+    index.setMap(gmap)
+    page = len(encoder.encode(gmap))
+
+    # The tiles covering the viewport.
+    n = 2 ** zoom
+    x0, y0, x1, y1 = gmap._viewport()
+    tiles = [(zoom, x % n, y)
+             for x in xrange(int(floor(x0 * n)), int(floor(x1 * n)) + 1)
+             for y in xrange(int(floor(y0 * n)), int(floor(y1 * n)) + 1)]
+    start = time.time()
+    sizes = [len(index.tile(*tile)) for tile in tiles]
+    served = time.time() - start
+    print 'inline map          %10d bytes' % inline
+    print 'tiled map page      %10d bytes' % page
+    print 'viewport tiles      %10d bytes in %d tiles (%.1f ms each)' % (
+        sum(sizes), len(tiles), served * 1000 / len(tiles))
+    print 'index built in %.2f s' % built
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,42 @@
+"""Measure the payload saved by viewport culling.
+
+Run with:  python benchmarks/bench_viewport_cull.py [markers] [lines]
+
+Builds a map of the continental United States with random markers
+and long polylines, zoomed in on a city, and compares the JSON and
+static map url sizes with and without Map.culled().
+
+"""
+import random
+import sys
+import time
+
+from gmapi import maps
+
+
+def main(markers=5000, lines=50):
+    rnd = random.Random(0)
+    gmap = maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': 8,
+                          'size': maps.Size(640, 480)})
+    for _ in xrange(markers):
+        maps.Marker(opts={'map': gmap, 'position': maps.LatLng(
+            rnd.uniform(25, 50), rnd.uniform(-125, -70))})
+    for _ in xrange(lines):
+        lat = rnd.uniform(36, 40)
+        maps.Polyline(opts={'map': gmap, 'path': [
+            maps.LatLng(lat + rnd.uniform(-0.5, 0.5), lng)
+            for lng in xrange(-125, -69)]})
+    encoder = maps.MapEncoder(separators=(',', ':'))
+    start = time.time()
+    culled = gmap.culled(margin=32)
+    elapsed = time.time() - start
+    print 'culled in %.1f ms: %d/%d markers, %d polyline pieces' % (
+        elapsed * 1000, len(culled.markers), markers, len(culled.polylines))
+    for name, measure in (('json', encoder.encode), ('static url', unicode)):
+        full, part = len(measure(gmap)), len(measure(culled))
+        print '%-10s %9d -> %8d chars (%.1fx smaller)' % (
+            name, full, part, float(full) / part)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,49 @@
+"""Measure repeated GoogleMap widget renders with and without a cache.
+
+Run with:  python benchmarks/bench_widget_render.py [markers] [renders]
+
+Renders the same map (with the given number of markers and a long
+polyline) over and over, as a page showing a mostly static map does.
+The cached widget only looks up the map's fingerprint, which is kept
+until the map changes.
+
+"""
+import random
+import sys
+import time
+
+from gmapi import maps
+from gmapi.forms.widgets import GoogleMap
+
+
+def build(markers):
+    rnd = random.Random(0)
+    gmap = maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': 4})
+    for i in xrange(markers):
+        maps.Marker(opts={'map': gmap, 'title': 'Marker %d' % i,
+                          'position': maps.LatLng(rnd.uniform(25, 50),
+                                                  rnd.uniform(-125, -70))})
+    maps.Polyline(opts={'map': gmap, 'path': [
+        maps.LatLng(30 + i / 100.0, -100 + rnd.random()) for i in xrange(500)]})
+    return gmap
+
+
+def timed(widget, gmap, renders):
+    start = time.time()
+    for _ in xrange(renders):
+        widget.render('map', gmap)
+    return (time.time() - start) / renders
+
+
+def main(markers=50, renders=200):
+    gmap = build(markers)
+    plain = timed(GoogleMap(), gmap, renders)
+    cached = timed(GoogleMap(attrs={'cache': 'locmem://render'}), gmap,
+                   renders)
+    print 'uncached  %8.3f ms/render' % (plain * 1000)
+    print 'cached    %8.3f ms/render (%.1fx)' % (cached * 1000,
+                                                 plain / cached)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
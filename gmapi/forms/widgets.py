@@ -1,11 +1,12 @@
 """Custom Map widget."""
-import settings
-from json import dumps
-from media import Media, Widget
-from forms import flatatt
+from gmapi.utils import settings
+from gmapi.utils.cache import cache as default_cache, get_cache
+from gmapi.utils.media import Media, Widget
+from gmapi.utils.forms import escape, flatatt
 from gmapi import maps
+from hashlib import md5
 from urlparse import urljoin
-from safestrings import escape, mark_safe
+from gmapi.utils.safestrings import mark_safe
 
 
 JQUERY_URL = getattr(settings, 'GMAPI_JQUERY_URL',
@@ -21,12 +22,52 @@ MEDIA_PREFIX = getattr(settings, 'GMAPI_MEDIA_PREFIX', 'gmapi/')
 
 
 class GoogleMap(Widget):
+    """A widget rendering a maps.Map for our jQuery plugin.
+
+    Pass 'cache' in attrs to cache rendered output, keyed on the
+    map's fingerprint and the widget attributes: True for the default
+    cache, or a cache alias or backend URI. Pass 'cull' (a margin in
+    pixels) to leave out overlays outside the map's viewport (see
+    maps.Map.culled).
+
+    """
     def __init__(self, attrs=None):
         self.nojquery = (attrs or {}).pop('nojquery', False)
         self.nomapsjs = (attrs or {}).pop('nomapsjs', False)
+        self.cache = (attrs or {}).pop('cache', None)
+        self.cull = (attrs or {}).pop('cull', None)
         super(GoogleMap, self).__init__(attrs)
 
     def render(self, name, gmap, attrs=None):
+        if gmap is None:
+            gmap = maps.Map()
+        cache = self._getCache()
+        if cache is None:
+            return mark_safe(u''.join(self.stream(name, gmap, attrs)))
+        key = 'gmapi.render.%s' % md5(repr((
+            name, gmap.fingerprint(), self.cull,
+            sorted(self.build_attrs(attrs or {}).items())))).hexdigest()
+        html = cache.get(key)
+        if html is None:
+            html = u''.join(self.stream(name, gmap, attrs))
+            cache.set(key, html)
+        return mark_safe(html)
+
+    def _getCache(self):
+        if self.cache is True:
+            return default_cache
+        if isinstance(self.cache, basestring):
+            self.cache = get_cache(self.cache)
+        return self.cache
+
+    def stream(self, name, gmap, attrs=None):
+        """Render the widget as a sequence of HTML chunks.
+
+        The map's JSON is encoded and escaped a chunk at a time, so
+        the result can be passed to a streaming HTTP response without
+        ever holding the whole payload in memory.
+
+        """
         if gmap is None:
             gmap = maps.Map()
         default_attrs = {'id': name, 'class': 'gmap'}
@@ -38,16 +79,18 @@ class GoogleMap(Widget):
         style = (u'position:relative;width:%dpx;height:%dpx;' %
                  (width, height))
         final_attrs['style'] = style + final_attrs.get('style', '')
-        map_div = (u'<div class="%s" style="position:absolute;'
-                   u'width:%dpx;height:%dpx"></div>' %
-                   (escape(dumps(gmap, separators=(',', ':'))),
-                    width, height))
-        map_img = (u'<img style="position:absolute;z-index:1" '
-                   u'width="%(x)d" height="%(y)d" alt="Google Map" '
-                   u'src="%(map)s&amp;size=%(x)dx%(y)d" />' %
-                   {'map': escape(gmap), 'x': width, 'y': height})
-        return mark_safe(u'<div%s>%s%s</div>' %
-                         (flatatt(final_attrs), map_div, map_img))
+        if self.cull is not None:
+            gmap = gmap.culled(self.cull, maps.CompactSize(width, height))
+        yield u'<div%s><div class="' % flatatt(final_attrs)
+        encoder = maps.MapEncoder(separators=(',', ':'))
+        for chunk in encoder.iterencode(gmap):
+            yield escape(chunk)
+        yield (u'" style="position:absolute;'
+               u'width:%dpx;height:%dpx"></div>' % (width, height))
+        yield (u'<img style="position:absolute;z-index:1" '
+               u'width="%(x)d" height="%(y)d" alt="Google Map" '
+               u'src="%(map)s&amp;size=%(x)dx%(y)d" /></div>' %
+               {'map': escape(gmap), 'x': width, 'y': height})
 
     def _media(self):
         js = []
@@ -0,0 +1,334 @@
+"""Offline reverse geocoding from a local gazetteer.
+
+A Gazetteer holds places (cities, postcodes...) from a CSV file or a
+GeoNames dump in a KD-tree, and answers reverse geocoding requests
+(geocode({'latLng': LatLng(...)})) with the nearest place, shaped as
+Geocoder results are. Used as a Geocoder's backend, it answers those
+requests without the Web Service:
+
+    gazetteer = Gazetteer.from_geonames(open('cities1000.txt'))
+    gazetteer.save('/var/lib/gmapi/cities.gaz')
+    ...
+    geocoder = Geocoder(backend=Gazetteer.load('/var/lib/gmapi/cities.gaz'))
+    results, status = geocoder.geocode({'latLng': LatLng(38, -97)})
+
+Saved gazetteers are memory-mapped when loaded (with NumPy, when it is
+available), so processes share one copy and start without parsing. The
+map is released with close(), or on leaving a with statement.
+
+Results are made with LatLng objects, whether or not the Geocoder is
+lazy: there is only ever one per request.
+
+"""
+import csv
+import json
+import mmap
+from array import array
+from itertools import chain
+from math import asin, cos, radians, sin, sqrt
+from gmapi.geometry import EARTH_RADIUS
+from gmapi.maps import LatLng
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Places per leaf of the KD-tree.
+LEAF_SIZE = 16
+
+_MAGIC = 'gmapi-gazetteer-1\n'
+
+# Address component types of the columns of GeoNames dumps, in the
+# order of the address components of results.
+_GEONAMES_CITIES = [(1, 'locality'), (10, 'administrative_area_level_1'),
+                    (8, 'country')]
+_GEONAMES_POSTCODES = [(1, 'postal_code'), (2, 'locality'),
+                       (3, 'administrative_area_level_1'), (0, 'country')]
+
+# The order of address components of results.
+_COMPONENT_ORDER = ['postal_code', 'locality', 'administrative_area_level_1',
+                    'country']
+
+# Address component types of CSV columns, by column name.
+CSV_COLUMNS = {
+    'name': 'locality',
+    'city': 'locality',
+    'postcode': 'postal_code',
+    'postal_code': 'postal_code',
+    'admin1': 'administrative_area_level_1',
+    'region': 'administrative_area_level_1',
+    'state': 'administrative_area_level_1',
+    'country': 'country',
+}
+
+
+def _vector(lat, lng):
+    lat, lng = radians(lat), radians(lng)
+    return cos(lat) * cos(lng), cos(lat) * sin(lng), sin(lat)
+
+
+class Gazetteer(object):
+    """An index of named places for reverse geocoding.
+
+    Places are points on the unit sphere in an implicit KD-tree: the
+    points are ordered so that the middle point of every range of
+    them splits the rest, cycling through the axes. So the nearest
+    place by straight line, and so by great circle distance, is found
+    visiting a few leaves of up to LEAF_SIZE places. types names the
+    address component type of each of a place's fields (e.g.
+    ['locality', 'country']).
+
+    Requests for places further than maxDistance meters (if given)
+    aren't answered, so a Geocoder sends them to the Web Service.
+
+    """
+    def __init__(self, places, types, maxDistance=None):
+        """places is a sequence of (lat, lng, fields) tuples."""
+        self.types = list(types)
+        self.maxDistance = maxDistance
+        self._data = None
+        lats, lngs, records = array('d'), array('d'), []
+        for lat, lng, fields in places:
+            lats.append(lat)
+            lngs.append(lng)
+            records.append(u'\t'.join(fields).encode('utf-8'))
+        order = self._build(lats, lngs)
+        self._lats = array('d', (lats[i] for i in order))
+        self._lngs = array('d', (lngs[i] for i in order))
+        self._xs, self._ys, self._zs = array('d'), array('d'), array('d')
+        for lat, lng in zip(self._lats, self._lngs):
+            x, y, z = _vector(lat, lng)
+            self._xs.append(x)
+            self._ys.append(y)
+            self._zs.append(z)
+        # Offsets are stored as doubles (exact up to 2 ** 53), like the
+        # coordinates, so saved files are the same on every platform.
+        self._offsets = array('d', [0])
+        self._blob = ''.join(records[i] for i in order)
+        for i in order:
+            self._offsets.append(self._offsets[-1] + len(records[i]))
+
+    @classmethod
+    def from_csv(cls, f, columns=None, lat='lat', lng='lng', **kwargs):
+        """Load places from a CSV file with a header row.
+
+        columns maps column names to address component types, by
+        default those of CSV_COLUMNS found in the header. lat and lng
+        name the coordinate columns. Other keyword arguments are
+        passed to the constructor.
+
+        """
+        reader = csv.reader(f)
+        header = reader.next()
+        if columns is None:
+            columns = dict((name, CSV_COLUMNS[name]) for name in header
+                           if name in CSV_COLUMNS)
+
+        def rank(field):
+            kind = field[1]
+            return (_COMPONENT_ORDER.index(kind)
+                    if kind in _COMPONENT_ORDER else len(_COMPONENT_ORDER))
+        fields = sorted([(header.index(name), kind)
+                         for name, kind in columns.items()], key=rank)
+        latIndex, lngIndex = header.index(lat), header.index(lng)
+        places = ((float(row[latIndex]), float(row[lngIndex]),
+                   [row[i].decode('utf-8') for i, kind in fields])
+                  for row in reader if row)
+        return cls(places, [kind for i, kind in fields], **kwargs)
+
+    @classmethod
+    def from_geonames(cls, f, **kwargs):
+        """Load places from a GeoNames dump (tab separated).
+
+        Either a gazetteer dump (such as cities1000.txt) or a postal
+        code dump; the kind is told by the number of columns.
+
+        """
+        rows = (line.rstrip('\r\n').decode('utf-8').split('\t')
+                for line in f)
+        first = next(rows, None)
+        if first is None:
+            return cls([], [], **kwargs)
+        if len(first) >= 19:
+            columns, lat, lng = _GEONAMES_CITIES, 4, 5
+        else:
+            columns, lat, lng = _GEONAMES_POSTCODES, 9, 10
+        places = ((float(row[lat]), float(row[lng]),
+                   [row[i] for i, kind in columns])
+                  for row in chain([first], rows) if len(row) > lng)
+        return cls(places, [kind for i, kind in columns], **kwargs)
+
+    @classmethod
+    def load(cls, path, maxDistance=None):
+        """Load a gazetteer saved with save, memory-mapping it."""
+        gazetteer = cls.__new__(cls)
+        gazetteer.maxDistance = maxDistance
+        f = open(path, 'rb')
+        if f.readline() != _MAGIC:
+            raise ValueError('%s is not a saved gazetteer.' % path)
+        header = json.loads(f.readline())
+        gazetteer.types = header['types']
+        count, offset = header['count'], f.tell()
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for name in ('_lats', '_lngs', '_xs', '_ys', '_zs', '_offsets'):
+            length = count + 1 if name == '_offsets' else count
+            if numpy is not None:
+                # Plain arrays over the map (numpy.memmap indexing is
+                # much slower).
+                values = numpy.frombuffer(data, dtype=numpy.float64,
+                                          count=length, offset=offset)
+            else:
+                values = array('d')
+                values.fromstring(data[offset:offset + 8 * length])
+            setattr(gazetteer, name, values)
+            offset += 8 * length
+        gazetteer._blob = buffer(data, offset)
+        gazetteer._data = data
+        f.close()
+        return gazetteer
+
+    def close(self):
+        """Release the memory map of a loaded gazetteer.
+
+        The gazetteer holds no places afterwards.
+
+        """
+        # Drop the arrays over the map before unmapping it.
+        for name in ('_lats', '_lngs', '_xs', '_ys', '_zs'):
+            setattr(self, name, array('d'))
+        self._offsets = array('d', [0])
+        self._blob = ''
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def save(self, path):
+        """Save the gazetteer to be loaded (memory-mapped) with load."""
+        with open(path, 'wb') as f:
+            f.write(_MAGIC)
+            header = json.dumps({'count': len(self), 'types': self.types})
+            # Pad the header so the arrays are aligned.
+            header += ' ' * (-(len(_MAGIC) + len(header) + 1) % 8)
+            f.write(header + '\n')
+            for values in (self._lats, self._lngs, self._xs, self._ys,
+                           self._zs, self._offsets):
+                array('d', values).tofile(f)
+            f.write(self._blob)
+
+    def __len__(self):
+        return len(self._lats)
+
+    @staticmethod
+    def _build(lats, lngs):
+        """Return the order of the places in the KD-tree."""
+        n = len(lats)
+        if numpy is not None:
+            points = numpy.column_stack([
+                numpy.cos(numpy.radians(lats)) * numpy.cos(
+                    numpy.radians(lngs)),
+                numpy.cos(numpy.radians(lats)) * numpy.sin(
+                    numpy.radians(lngs)),
+                numpy.sin(numpy.radians(lats))]) if n else numpy.zeros((0, 3))
+            order = numpy.arange(n)
+        else:
+            points = [_vector(lat, lng) for lat, lng in zip(lats, lngs)]
+            order = range(n)
+        stack = [(0, n, 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                continue
+            mid = (lo + hi) // 2
+            if numpy is not None:
+                part = order[lo:hi]
+                order[lo:hi] = part[numpy.argpartition(points[part, axis],
+                                                       mid - lo)]
+            else:
+                order[lo:hi] = sorted(order[lo:hi],
+                                      key=lambda i: points[i][axis])
+            stack.append((lo, mid, (axis + 1) % 3))
+            stack.append((mid + 1, hi, (axis + 1) % 3))
+        return [int(i) for i in order]
+
+    def nearest(self, latlng):
+        """Return the index of the place nearest to latlng, and its
+        distance in meters (or (None, None) if there are no places)."""
+        q = _vector(latlng.lat(), latlng.lng())
+        coords = (self._xs, self._ys, self._zs)
+        xs, ys, zs = coords
+        qx, qy, qz = q
+        best, bestIndex = 5.0, None
+        stack = [(0, len(self), 0, 0.0)]
+        while stack:
+            lo, hi, axis, bound = stack.pop()
+            if bound >= best:
+                continue
+            if hi - lo <= LEAF_SIZE:
+                for i in xrange(lo, hi):
+                    dx, dy, dz = xs[i] - qx, ys[i] - qy, zs[i] - qz
+                    d = dx * dx + dy * dy + dz * dz
+                    if d < best:
+                        best, bestIndex = d, i
+                continue
+            mid = (lo + hi) // 2
+            dx, dy, dz = xs[mid] - qx, ys[mid] - qy, zs[mid] - qz
+            d = dx * dx + dy * dy + dz * dz
+            if d < best:
+                best, bestIndex = d, mid
+            diff = q[axis] - coords[axis][mid]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else \
+                ((mid + 1, hi), (lo, mid))
+            nextAxis = (axis + 1) % 3
+            # The far side is at least diff away along this axis.
+            stack.append((far[0], far[1], nextAxis, max(bound, diff * diff)))
+            stack.append((near[0], near[1], nextAxis, bound))
+        if bestIndex is None:
+            return None, None
+        return bestIndex, 2 * asin(min(sqrt(best) / 2, 1.0)) * EARTH_RADIUS
+
+    def place(self, index):
+        """Return a place as a Geocoder result."""
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        fields = str(self._blob[start:end]).decode('utf-8').split(u'\t')
+        components = [{'long_name': value, 'short_name': value,
+                       'types': [kind]}
+                      for value, kind in zip(fields, self.types) if value]
+        return {
+            'address_components': components,
+            'formatted_address': u', '.join(
+                c['long_name'] for c in components),
+            'geometry': {
+                'location': LatLng(float(self._lats[index]),
+                                   float(self._lngs[index])),
+                'location_type': 'APPROXIMATE',
+            },
+            'types': components[0]['types'] if components else [],
+        }
+
+    def geocode(self, request, callback=None):
+        """Reverse geocode a request, as Geocoder.geocode.
+
+        Returns None for requests other than reverse geocoding ones
+        (with a latLng), and for those with no place within maxDistance,
+        which a Geocoder using this gazetteer as its backend sends to
+        the Web Service instead.
+
+        """
+        latlng = request.get('latLng')
+        if latlng is None:
+            return None
+        index, distance = self.nearest(latlng)
+        if index is None or (self.maxDistance is not None and
+                             distance > self.maxDistance):
+            return None
+        results = [self.place(index)]
+        if callback:
+            callback(results, 'OK')
+        return results, 'OK'
@@ -0,0 +1,671 @@
+"""Implements the Google Maps API v3 geometry library."""
+import gmapi.utils.settings as settings
+from array import array
+from bisect import bisect_right
+from heapq import heapify, heappop, heappush
+from itertools import izip
+from math import (asin, atan2, ceil, cos, degrees, floor, radians, sin,
+                  sqrt, tan)
+from gmapi.maps import LatLng, Marker, MarkerLayer, PathArray, Polyline
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Paths shorter than this are not worth handing over to NumPy.
+NUMPY_THRESHOLD = 64
+
+# The radius of the earth (in meters) used by the Maps API.
+EARTH_RADIUS = 6378137
+
+# Size (in degrees) of the grid cells PolygonIndex buckets polygons in.
+POLYGON_INDEX_CELL = getattr(settings, 'GMAPI_POLYGON_INDEX_CELL', 1.0)
+
+
+class _encoding(object):
+    """Utilities for polyline encoding.
+
+    Equivalent to google.maps.geometry.encoding. Paths may be
+    lists of LatLng or PathArray instances. Long paths are encoded
+    with NumPy when it is available.
+
+    """
+    def decodePath(self, encodedPath):
+        """Decode an encoded path string into a PathArray."""
+        lats, lngs = array('d'), array('d')
+        index, length = 0, len(encodedPath)
+        lat = lng = 0
+        while index < length:
+            for coords in (lats, lngs):
+                shift = result = 0
+                while True:
+                    b = ord(encodedPath[index]) - 63
+                    index += 1
+                    result |= (b & 0x1f) << shift
+                    shift += 5
+                    if b < 0x20:
+                        break
+                delta = ~(result >> 1) if result & 1 else result >> 1
+                if coords is lats:
+                    lat += delta
+                    coords.append(lat / 1e5)
+                else:
+                    lng += delta
+                    coords.append(lng / 1e5)
+        return PathArray.from_arrays(lats, lngs)
+
+    def encodePath(self, path):
+        """Encode a sequence of LatLng into an encoded path string."""
+        path = PathArray.from_points(path)
+        if numpy is not None and len(path) >= NUMPY_THRESHOLD:
+            return _encodeArrays(numpy.asarray(path.lats),
+                                 numpy.asarray(path.lngs))
+        chunks = []
+        append = chunks.append
+        plat = plng = 0
+        for lat, lng in izip(path.lats, path.lngs):
+            lat = int(floor(lat * 1e5 + 0.5))
+            lng = int(floor(lng * 1e5 + 0.5))
+            for value in (lat - plat, lng - plng):
+                value = ~(value << 1) if value < 0 else value << 1
+                while value >= 0x20:
+                    append(chr((0x20 | (value & 0x1f)) + 63))
+                    value >>= 5
+                append(chr(value + 63))
+            plat, plng = lat, lng
+        return ''.join(chunks)
+
+
+encoding = _encoding()
+
+
+class _spherical(object):
+    """Utility functions for geodesic angles, distances and areas.
+
+    Equivalent to google.maps.geometry.spherical, with distances in
+    meters and headings in degrees. Paths may be lists of LatLng,
+    PathArray, Polyline or MarkerLayer instances, or lists of
+    Markers. Long paths are handled with NumPy when it is available.
+
+    The *_many functions take many origins and/or destinations (as
+    paths, or a single LatLng for all of them) and return an array of
+    results, computed with NumPy when it is available.
+
+    """
+    def computeArea(self, path, radius=EARTH_RADIUS):
+        """Return the area of a closed path, in square meters."""
+        return abs(self.computeSignedArea(path, radius))
+
+    def computeDistanceBetween(self, origin, destination,
+                               radius=EARTH_RADIUS):
+        """Return the distance between two LatLngs, in meters."""
+        return _angle(origin.lat(), origin.lng(), destination.lat(),
+                      destination.lng()) * radius
+
+    def computeHeading(self, origin, destination):
+        """Return the heading from one LatLng to another.
+
+        In degrees clockwise from north, within [-180, 180).
+
+        """
+        return _heading(origin.lat(), origin.lng(), destination.lat(),
+                        destination.lng())
+
+    def computeLength(self, path, radius=EARTH_RADIUS):
+        """Return the length of a path, in meters."""
+        path = _asPath(path)
+        if len(path) < 2:
+            return 0.0
+        if numpy is not None and len(path) >= NUMPY_THRESHOLD:
+            lats, lngs = _radians(path)
+            return float(_angles(lats[:-1], lngs[:-1], lats[1:],
+                                 lngs[1:]).sum()) * radius
+        lats, lngs = path.lats, path.lngs
+        return sum(_angle(lats[i], lngs[i], lats[i + 1], lngs[i + 1])
+                   for i in xrange(len(path) - 1)) * radius
+
+    def computeSignedArea(self, loop, radius=EARTH_RADIUS):
+        """Return the signed area of a closed path, in square meters.
+
+        Positive for counterclockwise paths. The path is closed from
+        its last point back to its first.
+
+        """
+        path = _asPath(loop)
+        if len(path) < 3:
+            return 0.0
+        if numpy is not None and len(path) >= NUMPY_THRESHOLD:
+            lats, lngs = _radians(path)
+            tans = numpy.tan((numpy.pi / 2 - lats) / 2)
+            prev = numpy.roll(numpy.arange(len(path)), 1)
+            t = tans[prev] * tans
+            delta = lngs - lngs[prev]
+            total = float((2 * numpy.arctan2(t * numpy.sin(delta),
+                                             1 + t * numpy.cos(delta))).sum())
+        else:
+            total = 0.0
+            prevTan = tan((radians(90 - path.lats[-1])) / 2)
+            prevLng = radians(path.lngs[-1])
+            for lat, lng in izip(path.lats, path.lngs):
+                tanLat = tan(radians(90 - lat) / 2)
+                lng = radians(lng)
+                t = prevTan * tanLat
+                delta = lng - prevLng
+                total += 2 * atan2(t * sin(delta), 1 + t * cos(delta))
+                prevTan, prevLng = tanLat, lng
+        return total * radius * radius
+
+    def interpolate(self, origin, destination, fraction):
+        """Return the LatLng a fraction of the way between two LatLngs.
+
+        Along the great circle between them.
+
+        """
+        lat, lng = _interpolate(origin.lat(), origin.lng(),
+                                destination.lat(), destination.lng(),
+                                fraction)
+        return LatLng(lat, lng)
+
+    def distance_many(self, origins, destinations, radius=EARTH_RADIUS):
+        """Return the distances between origins and destinations."""
+        if numpy is None:
+            return array('d', [
+                _angle(a, b, c, d) * radius
+                for a, b, c, d in _pairs(origins, destinations)])
+        lats1, lngs1, lats2, lngs2 = _arrays(origins, destinations)
+        return _angles(lats1, lngs1, lats2, lngs2) * radius
+
+    def heading_many(self, origins, destinations):
+        """Return the headings from origins to destinations."""
+        if numpy is None:
+            return array('d', [_heading(a, b, c, d)
+                               for a, b, c, d in _pairs(origins,
+                                                        destinations)])
+        lats1, lngs1, lats2, lngs2 = _arrays(origins, destinations)
+        delta = lngs2 - lngs1
+        heading = numpy.degrees(numpy.arctan2(
+            numpy.sin(delta) * numpy.cos(lats2),
+            numpy.cos(lats1) * numpy.sin(lats2) -
+            numpy.sin(lats1) * numpy.cos(lats2) * numpy.cos(delta)))
+        return (heading + 180) % 360 - 180
+
+    def interpolate_many(self, origins, destinations, fraction):
+        """Interpolate between origins and destinations, as a PathArray."""
+        if numpy is None:
+            points = [_interpolate(a, b, c, d, fraction)
+                      for a, b, c, d in _pairs(origins, destinations)]
+            return PathArray.from_arrays([p[0] for p in points],
+                                         [p[1] for p in points])
+        lats1, lngs1, lats2, lngs2 = _arrays(origins, destinations)
+        angle = _angles(lats1, lngs1, lats2, lngs2)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            a = numpy.sin((1 - fraction) * angle) / numpy.sin(angle)
+            b = numpy.sin(fraction * angle) / numpy.sin(angle)
+        x = a * numpy.cos(lats1) * numpy.cos(lngs1) + \
+            b * numpy.cos(lats2) * numpy.cos(lngs2)
+        y = a * numpy.cos(lats1) * numpy.sin(lngs1) + \
+            b * numpy.cos(lats2) * numpy.sin(lngs2)
+        z = a * numpy.sin(lats1) + b * numpy.sin(lats2)
+        lats = numpy.degrees(numpy.arctan2(z, numpy.sqrt(x * x + y * y)))
+        lngs = numpy.degrees(numpy.arctan2(y, x))
+        # Points (almost) on top of each other are interpolated linearly.
+        close = angle < 1e-6
+        if close.any():
+            lats = numpy.where(close, numpy.degrees(
+                lats1 + fraction * (lats2 - lats1)), lats)
+            lngs = numpy.where(close, numpy.degrees(
+                lngs1 + fraction * (lngs2 - lngs1)), lngs)
+        return PathArray.from_arrays(lats, lngs)
+
+
+spherical = _spherical()
+
+
+def _angle(lat1, lng1, lat2, lng2):
+    """Return the angle between two points, in radians (haversine)."""
+    lat1, lat2 = radians(lat1), radians(lat2)
+    h = (sin((lat2 - lat1) / 2) ** 2 +
+         cos(lat1) * cos(lat2) * sin(radians(lng2 - lng1) / 2) ** 2)
+    return 2 * asin(sqrt(min(h, 1.0)))
+
+
+def _angles(lats1, lngs1, lats2, lngs2):
+    """_angle for NumPy arrays of coordinates in radians."""
+    h = (numpy.sin((lats2 - lats1) / 2) ** 2 + numpy.cos(lats1) *
+         numpy.cos(lats2) * numpy.sin((lngs2 - lngs1) / 2) ** 2)
+    return 2 * numpy.arcsin(numpy.sqrt(numpy.minimum(h, 1.0)))
+
+
+def _heading(lat1, lng1, lat2, lng2):
+    lat1, lat2 = radians(lat1), radians(lat2)
+    delta = radians(lng2 - lng1)
+    heading = degrees(atan2(sin(delta) * cos(lat2),
+                            cos(lat1) * sin(lat2) -
+                            sin(lat1) * cos(lat2) * cos(delta)))
+    return (heading + 180) % 360 - 180
+
+
+def _interpolate(lat1, lng1, lat2, lng2, fraction):
+    angle = _angle(lat1, lng1, lat2, lng2)
+    if angle < 1e-6:
+        return (lat1 + fraction * (lat2 - lat1),
+                lng1 + fraction * (lng2 - lng1))
+    a = sin((1 - fraction) * angle) / sin(angle)
+    b = sin(fraction * angle) / sin(angle)
+    lat1, lng1, lat2, lng2 = [radians(v) for v in (lat1, lng1, lat2, lng2)]
+    x = a * cos(lat1) * cos(lng1) + b * cos(lat2) * cos(lng2)
+    y = a * cos(lat1) * sin(lng1) + b * cos(lat2) * sin(lng2)
+    z = a * sin(lat1) + b * sin(lat2)
+    return degrees(atan2(z, sqrt(x * x + y * y))), degrees(atan2(y, x))
+
+
+def _asPath(points):
+    """Return the positions of a path, Polyline or markers as a PathArray."""
+    if hasattr(points, 'lat'):
+        # A single LatLng.
+        return PathArray([points])
+    if isinstance(points, MarkerLayer):
+        return points.getPositions()
+    if isinstance(points, Polyline):
+        points = points.getPath() or []
+    elif not isinstance(points, PathArray):
+        points = [p.getPosition() if isinstance(p, Marker) else p
+                  for p in points]
+    return PathArray.from_points(points)
+
+
+def _degrees(path):
+    """Return a PathArray's coordinates as NumPy arrays."""
+    lats, lngs = path.lats, path.lngs
+    if isinstance(lats, array):
+        lats = numpy.frombuffer(lats, dtype=numpy.float64)
+        lngs = numpy.frombuffer(lngs, dtype=numpy.float64)
+    return lats, lngs
+
+
+def _radians(path):
+    """Return a PathArray's coordinates as NumPy arrays of radians."""
+    lats, lngs = _degrees(path)
+    return numpy.radians(lats), numpy.radians(lngs)
+
+
+def _paths(origins, destinations):
+    """Return origins and destinations as PathArrays to be paired up.
+
+    Raises ValueError unless they are the same length or one of them
+    is a single point.
+
+    """
+    origins, destinations = _asPath(origins), _asPath(destinations)
+    if (len(origins) != len(destinations) and
+            1 not in (len(origins), len(destinations))):
+        raise ValueError('Cannot pair %d origins with %d destinations.' %
+                         (len(origins), len(destinations)))
+    return origins, destinations
+
+
+def _arrays(origins, destinations):
+    """Return origins and destinations as broadcastable radian arrays."""
+    origins, destinations = _paths(origins, destinations)
+    lats1, lngs1 = _radians(origins)
+    lats2, lngs2 = _radians(destinations)
+    return lats1, lngs1, lats2, lngs2
+
+
+def _pairs(origins, destinations):
+    """Yield (lat1, lng1, lat2, lng2) for origins and destinations.
+
+    A single LatLng is paired with every point of the other side.
+
+    """
+    origins, destinations = _paths(origins, destinations)
+    if len(origins) == 1:
+        origins = PathArray.from_arrays(origins.lats * len(destinations),
+                                        origins.lngs * len(destinations))
+    elif len(destinations) == 1:
+        destinations = PathArray.from_arrays(
+            destinations.lats * len(origins),
+            destinations.lngs * len(origins))
+    return izip(origins.lats, origins.lngs,
+                destinations.lats, destinations.lngs)
+
+
+class _poly(object):
+    """Utility functions for computations involving polygons.
+
+    Equivalent to google.maps.geometry.poly.
+
+    """
+    def containsLocation(self, point, polygon):
+        """Whether point (a LatLng) is inside polygon."""
+        return polygon.containsLocation(point)
+
+
+poly = _poly()
+
+
+class _PolygonEdges(object):
+    """The edges of a polygon's paths, bucketed into latitude bands.
+
+    Points are tested by casting a ray east from them, counting the
+    edges it crosses (so a point inside an odd number of paths is
+    inside the polygon). Each edge is kept once, in the band of its
+    southern end; most end in that band or the next, so a point is
+    only tested against the edges of its band and the one below,
+    and the few longer edges. Edges are sorted by their northern
+    ends, so those which end south of the point are skipped. Edges
+    are straight lines in latitude and longitude. Each path's
+    longitudes are unwrapped, so paths may cross the antimeridian.
+
+    """
+    def __init__(self, paths):
+        rings = []
+        base = None
+        for path in paths or ():
+            path = PathArray.from_points(path)
+            if len(path) < 3:
+                continue
+            lngs = []
+            for lng in path.lngs:
+                if lngs:
+                    lng += 360 * round((lngs[-1] - lng) / 360.0)
+                elif base is not None:
+                    lng += 360 * round((base - lng) / 360.0)
+                lngs.append(lng)
+            base = lngs[0]
+            rings.append((list(path.lats), lngs))
+        self.bounds = None
+        self._bands = []
+        self._tops = []
+        self._long = []
+        if not rings:
+            return
+        edges = []
+        for lats, lngs in rings:
+            prev = len(lats) - 1
+            for i in xrange(len(lats)):
+                # Horizontal edges are never crossed.
+                if lats[i] != lats[prev]:
+                    edges.append((lngs[prev], lats[prev], lngs[i], lats[i]))
+                prev = i
+        south = min(min(lats) for lats, lngs in rings)
+        north = max(max(lats) for lats, lngs in rings)
+        west = min(min(lngs) for lats, lngs in rings)
+        east = max(max(lngs) for lats, lngs in rings)
+        self.bounds = (south, west, north, east)
+        # About four edges to a band, but bands as tall as the edges
+        # (leaving out any much taller ones), so that most edges end in
+        # their band or the next.
+        height = (north - south) / max(len(edges) // 4, 1)
+        height = max([height] + [abs(y2 - y1) for x1, y1, x2, y2 in edges
+                                 if abs(y2 - y1) <= 8 * height])
+        self._count = max(int((north - south) / height), 1) if height else 1
+        self._height = (north - south) / self._count or 1.0
+        self._bands = [[] for _ in xrange(self._count)]
+        for edge in edges:
+            band = self._band(min(edge[1], edge[3]))
+            if self._band(max(edge[1], edge[3])) - band > 1:
+                self._long.append(edge)
+            else:
+                self._bands[band].append(edge)
+        for edges in self._bands:
+            edges.sort(key=_top)
+            self._tops.append(array('d', (_top(edge) for edge in edges)))
+
+    def _band(self, lat):
+        return min(int((lat - self.bounds[0]) / self._height),
+                   self._count - 1)
+
+    def contains(self, lat, lng):
+        if self.bounds is None:
+            return False
+        south, west, north, east = self.bounds
+        lng += 360 * ceil((west - lng) / 360.0)
+        if not (south <= lat <= north and lng <= east):
+            return False
+        inside = False
+        for x1, y1, x2, y2 in self._near(self._band(lat), lat):
+            if ((y1 > lat) != (y2 > lat) and
+                    lng < x1 + (lat - y1) * (x2 - x1) / (y2 - y1)):
+                inside = not inside
+        return inside
+
+    def _near(self, band, lat):
+        """Return the edges a ray at lat (or north of it) in band may
+        cross: those of band and the band below which reach north of
+        lat, and the long ones."""
+        edges = self._bands[band][bisect_right(self._tops[band], lat):]
+        if band:
+            tops = self._tops[band - 1]
+            if tops and tops[-1] > lat:
+                edges += self._bands[band - 1][bisect_right(tops, lat):]
+        if self._long:
+            edges += self._long
+        return edges
+
+    def contains_arrays(self, lats, lngs):
+        """contains for NumPy arrays of coordinates."""
+        result = numpy.zeros(len(lats), dtype=bool)
+        if self.bounds is None:
+            return result
+        south, west, north, east = self.bounds
+        lngs = lngs + 360 * numpy.ceil((west - lngs) / 360.0)
+        candidates = numpy.flatnonzero((lats >= south) & (lats <= north) &
+                                       (lngs <= east))
+        bands = numpy.minimum(
+            ((lats[candidates] - south) / self._height).astype(int),
+            self._count - 1)
+        order = numpy.argsort(bands, kind='mergesort')
+        candidates, bands = candidates[order], bands[order]
+        for start, end in _runs(bands):
+            index = candidates[start:end]
+            y, x = lats[index], lngs[index]
+            inside = numpy.zeros(len(index), dtype=bool)
+            for x1, y1, x2, y2 in self._near(bands[start], y.min()):
+                inside ^= (((y1 > y) != (y2 > y)) &
+                           (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1)))
+            result[index] = inside
+        return result
+
+    def contains_many(self, path):
+        """Whether each point of a PathArray is inside the polygon.
+
+        Returns a NumPy array of booleans when NumPy is available,
+        otherwise a list.
+
+        """
+        if numpy is not None and len(path) >= NUMPY_THRESHOLD:
+            lats, lngs = _degrees(path)
+            return self.contains_arrays(lats, lngs)
+        return [self.contains(lat, lng)
+                for lat, lng in izip(path.lats, path.lngs)]
+
+
+class PolygonIndex(object):
+    """A spatial index of polygons, to find the one containing a point.
+
+    Polygons (territories, say) are bucketed by their bounding boxes
+    into a grid of cells, cell degrees square, so a point is only
+    tested against the polygons covering its cell. Where polygons
+    overlap, the one added first wins.
+
+    """
+    def __init__(self, polygons=(), cell=POLYGON_INDEX_CELL):
+        self.cell = cell
+        self._columns = int(round(360.0 / cell))
+        self._cells = {}
+        self._keys = {}
+        for polygon in polygons:
+            self.add(polygon)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, polygon):
+        """Add polygon to the index, or update its paths."""
+        self.discard(polygon)
+        bounds = polygon._getEdges().bounds
+        if bounds is None:
+            return
+        south, west, north, east = bounds
+        first = int(floor((west + 180) / self.cell))
+        last = min(int(floor((east + 180) / self.cell)),
+                   first + self._columns - 1)
+        keys = [(i, j % self._columns)
+                for i in xrange(int(floor((south + 90) / self.cell)),
+                                int(floor((north + 90) / self.cell)) + 1)
+                for j in xrange(first, last + 1)]
+        for key in keys:
+            self._cells.setdefault(key, []).append(polygon)
+        self._keys[id(polygon)] = keys
+
+    def discard(self, polygon):
+        """Remove polygon from the index, if it is there."""
+        for key in self._keys.pop(id(polygon), ()):
+            cell = self._cells[key]
+            for i, p in enumerate(cell):
+                if p is polygon:
+                    del cell[i]
+                    break
+            if not cell:
+                del self._cells[key]
+
+    def locate(self, latlng):
+        """Return the polygon containing latlng, or None."""
+        lat, lng = latlng.lat(), latlng.lng()
+        key = (int(floor((lat + 90) / self.cell)),
+               int(floor((lng + 180) / self.cell)) % self._columns)
+        for polygon in self._cells.get(key, ()):
+            if polygon._getEdges().contains(lat, lng):
+                return polygon
+        return None
+
+    def locate_many(self, points):
+        """Return the polygon containing each point (or None) as a list.
+
+        points may be a path, a Polyline or MarkerLayer, or a list of
+        Markers (see spherical).
+
+        """
+        path = _asPath(points)
+        if numpy is None or len(path) < NUMPY_THRESHOLD:
+            return [self.locate(point) for point in path]
+        result = [None] * len(path)
+        lats, lngs = _degrees(path)
+        keys = (numpy.floor((lats + 90) / self.cell).astype(int) *
+                self._columns +
+                numpy.floor((lngs + 180) / self.cell).astype(int) %
+                self._columns)
+        order = numpy.argsort(keys, kind='mergesort')
+        keys = keys[order]
+        for start, end in _runs(keys):
+            polygons = self._cells.get(divmod(int(keys[start]),
+                                              self._columns))
+            index = order[start:end]
+            for polygon in polygons or ():
+                inside = polygon._getEdges().contains_arrays(lats[index],
+                                                             lngs[index])
+                for i in index[inside]:
+                    result[i] = polygon
+                index = index[~inside]
+                if not len(index):
+                    break
+        return result
+
+
+def _top(edge):
+    return max(edge[1], edge[3])
+
+
+def _runs(values):
+    """Yield the (start, end) of each run of equal values in an array."""
+    if len(values):
+        starts = numpy.flatnonzero(numpy.r_[True, values[1:] != values[:-1]])
+        for start, end in izip(starts, list(starts[1:]) + [len(values)]):
+            yield start, end
+
+
+def _encodeArrays(lats, lngs):
+    """Encode coordinate arrays in bulk using NumPy."""
+    points = numpy.floor(numpy.column_stack((lats, lngs)) * 1e5 + 0.5)
+    points = points.astype(numpy.int64)
+    deltas = points.copy()
+    deltas[1:] -= points[:-1]
+    values = deltas.ravel() << 1
+    values = numpy.where(values < 0, ~values, values)
+    # Split every value into 5-bit chunks, least significant first.
+    shifts = numpy.arange(7, dtype=numpy.int64) * 5
+    shifted = values[:, None] >> shifts
+    counts = numpy.maximum((shifted > 0).sum(axis=1), 1)[:, None]
+    index = numpy.arange(7)
+    chars = (shifted & 0x1f) + 63 + 0x20 * (index < counts - 1)
+    return chars[index < counts].astype(numpy.uint8).tostring()
+
+
+def effectiveAreas(path):
+    """Return the Visvalingam-Whyatt effective area of each vertex.
+
+    The area of the triangle a vertex forms with its neighbours, as
+    the path is simplified one least significant vertex at a time.
+    Areas are in square degrees (longitudes scaled to the latitude)
+    and never decrease in elimination order, so simplifying with a
+    larger tolerance always keeps a subset of the vertices. The
+    endpoints are always kept (their area is infinite).
+
+    """
+    path = PathArray.from_points(path)
+    n = len(path)
+    inf = float('inf')
+    areas = array('d', [inf]) * n
+    if n < 3:
+        return areas
+    ys = list(path.lats)
+    xs = [lng * cos(radians(lat)) for lat, lng in izip(ys, path.lngs)]
+    prev = range(-1, n - 1)
+    next = range(1, n + 1)
+
+    def area(i):
+        a, c = prev[i], next[i]
+        return abs((xs[a] - xs[c]) * (ys[i] - ys[a]) -
+                   (xs[a] - xs[i]) * (ys[c] - ys[a])) / 2.0
+
+    current = [inf] + [area(i) for i in xrange(1, n - 1)] + [inf]
+    heap = [(current[i], i) for i in xrange(1, n - 1)]
+    heapify(heap)
+    eliminated = 0.0
+    while heap:
+        value, i = heappop(heap)
+        if value != current[i]:
+            # Stale entry: the vertex was updated or removed.
+            continue
+        eliminated = max(eliminated, value)
+        areas[i] = eliminated
+        current[i] = None
+        a, c = prev[i], next[i]
+        next[a] = c
+        prev[c] = a
+        for j in (a, c):
+            if 0 < j < n - 1:
+                current[j] = area(j)
+                heappush(heap, (current[j], j))
+    return areas
+
+
+def simplify(path, tolerance, areas=None):
+    """Simplify a path, returning a PathArray.
+
+    Removes the vertices whose effective area (see effectiveAreas)
+    is at most tolerance. Precomputed areas may be passed in when
+    simplifying the same path several times.
+
+    """
+    path = PathArray.from_points(path)
+    if areas is None:
+        areas = effectiveAreas(path)
+    if numpy is not None and isinstance(path.lats, numpy.ndarray):
+        keep = numpy.asarray(areas) > tolerance
+        return PathArray.from_arrays(path.lats[keep], path.lngs[keep])
+    keep = [i for i, a in enumerate(areas) if a > tolerance]
+    return PathArray.from_arrays([path.lats[i] for i in keep],
+                                 [path.lngs[i] for i in keep])
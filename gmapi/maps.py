@@ -1,7 +1,22 @@
 """Implements the Google Maps API v3."""
 import gmapi.utils.settings as settings
-from gmapi.utils.http import urlencode
-from gmapi.utils.encoding import force_unicode, smart_str
+import sys
+import threading
+import time
+import weakref
+from array import array
+from heapq import heappush, heapreplace
+from itertools import izip
+from json import JSONEncoder, loads
+from json.encoder import (encode_basestring, encode_basestring_ascii,
+                          INFINITY)
+from math import (asin, atan, ceil, cos, degrees, exp, floor, log, pi,
+                  radians, sin, sqrt)
+
+# Modules only needed to encode strings, build URLs and digests, cache
+# geocoder results or talk to the Web Service (gmapi.utils.encoding,
+# which imports decimal, urllib, hashlib, httplib and so on) are imported
+# where they are used, so that importing gmapi.maps stays quick.
 
 STATIC_URL = getattr(settings, 'GMAPI_STATIC_URL',
                      'http://maps.google.com/maps/api/staticmap')
@@ -9,42 +24,432 @@ STATIC_URL = getattr(settings, 'GMAPI_STATIC_URL',
 GEOCODE_URL = getattr(settings, 'GMAPI_GEOCODE_URL',
                       'http://maps.google.com/maps/api/geocode')
 
+# Maximum Geocoding Web Service requests per second (per process).
+GEOCODE_RATE = getattr(settings, 'GMAPI_GEOCODE_RATE', 10)
+
+# Number of threads used by Geocoder.geocode_many.
+GEOCODE_WORKERS = getattr(settings, 'GMAPI_GEOCODE_WORKERS', 8)
+
+# Cache (alias or backend URI) for Geocoding Web Service responses,
+# e.g. 'sqlite:///var/tmp/geocode.db?timeout=2592000&max_entries=100000'
+# for a disk-backed cache. None disables caching.
+GEOCODE_CACHE = getattr(settings, 'GMAPI_GEOCODE_CACHE', 'default')
+
+# Timeout (in seconds) for each Geocoding Web Service request.
+GEOCODE_TIMEOUT = getattr(settings, 'GMAPI_GEOCODE_TIMEOUT', 10)
+
+# Times a failed Geocoding Web Service request is retried.
+GEOCODE_RETRIES = getattr(settings, 'GMAPI_GEOCODE_RETRIES', 3)
+
 CHART_URL = getattr(settings, 'GMAPI_CHART_URL',
                     'http://chart.apis.google.com/chart')
 
+# Use encoded polylines ("enc:...") for paths in static map urls.
+STATIC_ENCODE_PATHS = getattr(settings, 'GMAPI_STATIC_ENCODE_PATHS', True)
+
+# Maximum static map url length (in characters), or None for no limit.
+STATIC_URL_BUDGET = getattr(settings, 'GMAPI_STATIC_URL_BUDGET', None)
+
+# Leave out overlays outside the map's viewport (plus this many pixels
+# around it) from static map urls, or None to include them all.
+STATIC_CULL_MARGIN = getattr(settings, 'GMAPI_STATIC_CULL_MARGIN', None)
+
+# Size (in degrees) of the grid cells used to index a map's markers.
+MARKER_INDEX_CELL = getattr(settings, 'GMAPI_MARKER_INDEX_CELL', 0.1)
+
+
+class ArgsSchema(dict):
+    """The names of a class's positional arguments, mapped to positions.
+
+    Shared by all the Args of a class, so each Args doesn't carry its
+    own list of names, and looking up an argument by name is a dict
+    lookup instead of a search through the names.
+
+    """
+    __slots__ = ('names',)
+    _shared = {}
+
+    def __init__(self, names):
+        super(ArgsSchema, self).__init__(
+            (name, i) for i, name in enumerate(names))
+        self.names = tuple(names)
+
+    def __missing__(self, name):
+        raise ValueError('%r is not an argument name' % (name,))
+
+    @classmethod
+    def of(cls, names):
+        """Return the shared schema for a list of names."""
+        if isinstance(names, ArgsSchema):
+            return names
+        names = tuple(names)
+        schema = cls._shared.get(names)
+        if schema is None:
+            schema = cls._shared[names] = cls(names)
+        return schema
+
+
+def _getter(name, key):
+    def get(self):
+        return self['arg'].get('opts', {}).get(key)
+    get.__name__ = name
+    get._option = key
+    return get
+
+
+def _setter(name, key):
+    def set(self, value):
+        # Call setOptions so that it can be overridden.
+        self.setOptions({key: value})
+    set.__name__ = name
+    set._option = key
+    return set
+
+
+class MapClassType(type):
+    """Builds the generic get and set option methods of MapClasses.
+
+    A class's _getopts and _setopts map method names to option names;
+    a method is made for each, once, when the class is created, unless
+    the class (or a base class) defines one itself.
+
+    """
+    def __init__(cls, name, bases, namespace):
+        super(MapClassType, cls).__init__(name, bases, namespace)
+        for options, accessor in ((cls._getopts, _getter),
+                                  (cls._setopts, _setter)):
+            for method, key in options.iteritems():
+                existing = getattr(cls, method, None)
+                if existing is None or (
+                        hasattr(existing, '_option') and
+                        existing._option != key):
+                    setattr(cls, method, accessor(method, key))
+
 
 class MapClass(dict):
     """A base class for Google Maps API classes."""
+    __metaclass__ = MapClassType
     _getopts = {}
     _setopts = {}
-
-    def __getattr__(self, item):
-        """Handle generic get and set option methods."""
-        if 'arg' in self:
-            if item in self._getopts:
-                key = self._getopts[item]
-
-                def func():
-                    return self['arg'].get('opts', {}).get(key)
-                return func
-            if item in self._setopts:
-                key = self._setopts[item]
-
-#                def func(value):
-#                    # Call setOptions so that it can be overridden.
-#                    self.setOptions({key: value})
-                return func
-        raise AttributeError, item
+    _version = 0
+    _digest = None
+    # The objects holding this one as an option (see _own).
+    _owners = None
 
     def __str__(self):
         """Handle string conversion."""
         if hasattr(self, '__unicode__'):
+            from gmapi.utils.encoding import force_unicode
             return force_unicode(self).encode('utf-8')
         return '%s object' % self.__class__.__name__
 
+    def fingerprint(self):
+        """Return a digest of the structure and contents of this object.
+
+        Objects with the same fingerprint produce the same JSON and
+        static map url, so it can be used as a cache key for their
+        rendered output. The digest is kept until the object's version
+        changes, which every setOptions, setter, setMap, open and event
+        listener call on it (or on an overlay or info window on it)
+        does, as does changing a PathArray, LatLngBounds, Point, Size
+        or MarkerImage it holds in place. Other values changed in
+        place, such as a plain list used as a path, must be set again
+        to be noticed.
+
+        """
+        from hashlib import md5
+        version = self._version
+        if self._digest is None or self._digest[0] != version:
+            digest = md5(_fingerprintEncoder.encode(self))
+            # Marker sizes only show up in static map urls.
+            digest.update(repr([getattr(m, '_size', None)
+                                for m in self.get('mkr', ())]))
+            self._digest = (version, digest.hexdigest())
+        return self._digest[1]
+
+    def _changed(self):
+        """Bump the version of this object, of the map showing it and
+        of the objects holding it."""
+        self._version += 1
+        map = getattr(self, '_map', None)
+        if map is not None:
+            map._changed()
+        if self._owners:
+            _ownersChanged(self)
+
     def setOptions(self, opts):
         if 'arg' in self and opts:
             self['arg'].setdefault('opts', {}).update(opts)
+            for value in opts.itervalues():
+                if isinstance(value, _OWNABLE):
+                    _own(self, value)
+        self._changed()
+
+
+def _own(owner, value):
+    """Note that owner holds value, so that changing value in place
+    bumps owner's version (see MapClass.fingerprint).
+
+    Only PathArrays, LatLngBounds, Points, Sizes and MarkerImages (and
+    lists of paths) are noted, as other values can't change or aren't
+    watched. Owners are held weakly.
+
+    """
+    if isinstance(value, _MUTABLE):
+        if value._owners is None:
+            value._owners = weakref.WeakValueDictionary()
+        value._owners[id(owner)] = owner
+    elif (isinstance(value, (list, tuple)) and value and
+            isinstance(value[0], (list, tuple, PathArray))):
+        # The paths of a Polygon.
+        for path in value:
+            _own(owner, path)
+
+
+def _ownersChanged(value):
+    """Bump the versions of the objects holding value."""
+    for owner in value._owners.values():
+        owner._changed()
+
+
+class CompactMapClass(object):
+    """A base class for compact Google Maps API classes.
+
+    Stores its arguments in slots instead of a dict holding an Args
+    list, which makes it much cheaper to hold large numbers of them.
+    When parsed by MapEncoder, it produces exactly the same output
+    as the equivalent MapClass.
+
+    Subclasses set _cls to the name of the Google Maps class, and
+    define _args() returning its list of positional arguments.
+
+    """
+    __slots__ = ()
+    _cls = None
+
+    def __getitem__(self, key):
+        return self._asdict()[key]
+
+    def __contains__(self, key):
+        return key in ('cls', 'arg')
+
+    def __eq__(self, other):
+        if isinstance(other, CompactMapClass):
+            other = other._asdict()
+        return self._asdict() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self._asdict())
+
+    def __str__(self):
+        """Handle string conversion."""
+        from gmapi.utils.encoding import force_unicode
+        return force_unicode(self).encode('utf-8')
+
+    def _asdict(self):
+        return {'cls': self._cls, 'arg': self._args()}
+
+
+class MapEncoder(JSONEncoder):
+    """A JSONEncoder for trees of Google Maps API classes.
+
+    Understands compact map classes, PathArray and MarkerLayer. The
+    tree is walked iteratively and the output is produced in chunks
+    of roughly chunk_size characters, so json.dump() or iterencode()
+    can stream a large map without holding it in memory as a single
+    string. The output is identical to that of JSONEncoder.
+
+    """
+    chunk_size = 8192
+
+    def default(self, o):
+        if isinstance(o, CompactMapClass):
+            return o._asdict()
+        if isinstance(o, (PathArray, MarkerLayer)):
+            return o._aslist()
+        return super(MapEncoder, self).default(o)
+
+    def iterencode(self, o, _one_shot=False):
+        if self.indent is not None:
+            # Fall back to the standard encoder for pretty printing.
+            return super(MapEncoder, self).iterencode(o, _one_shot)
+        return self._iterchunks(o)
+
+    def _iterchunks(self, o):
+        """Encode o, yielding chunks of about chunk_size characters."""
+        buf = []
+        size = 0
+        markers = {} if self.check_circular else None
+        stack = [(self._iterframe(o), None)]
+        while stack:
+            for text in stack[-1][0]:
+                if not isinstance(text, basestring):
+                    # A container: descend into it.
+                    if markers is not None:
+                        if id(text) in markers:
+                            raise ValueError('Circular reference detected')
+                        markers[id(text)] = text
+                    stack.append((self._iterframe(text), id(text)))
+                    break
+                buf.append(text)
+                size += len(text)
+                if size >= self.chunk_size:
+                    yield ''.join(buf)
+                    buf = []
+                    size = 0
+            else:
+                frame, marker = stack.pop()
+                if markers is not None and marker is not None:
+                    del markers[marker]
+        if buf:
+            yield ''.join(buf)
+
+    def _encodestr(self, s):
+        if self.ensure_ascii:
+            return encode_basestring_ascii(s)
+        return encode_basestring(s)
+
+    def _encodeleaf(self, o):
+        """Return the JSON text for a scalar, or None for a container."""
+        if isinstance(o, basestring):
+            if isinstance(o, str) and self.encoding != 'utf-8':
+                o = o.decode(self.encoding)
+            return self._encodestr(o)
+        if o is None:
+            return 'null'
+        if o is True:
+            return 'true'
+        if o is False:
+            return 'false'
+        if isinstance(o, (int, long)):
+            return str(o)
+        if isinstance(o, float):
+            return self._encodefloat(o)
+        return None
+
+    def _encodefloat(self, o):
+        if o != o:
+            text = 'NaN'
+        elif o == INFINITY:
+            text = 'Infinity'
+        elif o == -INFINITY:
+            text = '-Infinity'
+        else:
+            return float.__repr__(o)
+        if not self.allow_nan:
+            raise ValueError('Out of range float values are not JSON '
+                             'compliant: %r' % o)
+        return text
+
+    def _encodekey(self, key):
+        if isinstance(key, basestring):
+            return self._encodeleaf(key)
+        if isinstance(key, float):
+            return self._encodestr(self._encodefloat(key))
+        if key is True or key is False or key is None:
+            return self._encodestr(self._encodeleaf(key))
+        if isinstance(key, (int, long)):
+            return self._encodestr(str(key))
+        if self.skipkeys:
+            return None
+        raise TypeError('key %r is not a string' % (key,))
+
+    def _iterframe(self, o):
+        """Yield JSON text for o, or the containers it holds."""
+        text = self._encodeleaf(o)
+        if text is not None:
+            yield text
+        elif isinstance(o, dict):
+            for text in self._iterdict(o):
+                yield text
+        elif isinstance(o, (list, tuple, MarkerLayer)):
+            for text in self._iterlist(o):
+                yield text
+        elif isinstance(o, PathArray):
+            for text in self._iterpath(o):
+                yield text
+        else:
+            yield self.default(o)
+
+    def _iterdict(self, dct):
+        if not dct:
+            yield '{}'
+            return
+        item_separator, key_separator = self.item_separator, self.key_separator
+        items = sorted(dct.items()) if self.sort_keys else dct.iteritems()
+        first = True
+        for key, value in items:
+            key = self._encodekey(key)
+            if key is None:
+                continue
+            if first:
+                yield '{' + key + key_separator
+                first = False
+            else:
+                yield item_separator + key + key_separator
+            text = self._encodeleaf(value)
+            yield value if text is None else text
+        yield '{}' if first else '}'
+
+    def _iterlist(self, lst):
+        if not len(lst):
+            yield '[]'
+            return
+        item_separator = self.item_separator
+        separator = '['
+        for value in lst:
+            yield separator
+            separator = item_separator
+            text = self._encodeleaf(value)
+            yield value if text is None else text
+        yield ']'
+
+    def _iterpath(self, path):
+        """Yield a PathArray as LatLng objects without creating any."""
+        if not len(path):
+            yield '[]'
+            return
+        d = CompactLatLng(0, 0)._asdict()
+        parts = []
+        for key in (sorted(d) if self.sort_keys else d):
+            if key == 'arg':
+                value = '[%s' + self.item_separator + '%s]'
+            else:
+                value = self._encodestr(d[key])
+            parts.append(self._encodestr(key) + self.key_separator + value)
+        template = '{' + self.item_separator.join(parts) + '}'
+        item_separator = self.item_separator
+        lats, lngs = _reprFloats(path.lats), _reprFloats(path.lngs)
+        if lats is None or lngs is None:
+            encodefloat = self._encodefloat
+            separator = '['
+            for lat, lng in izip(path.lats, path.lngs):
+                yield separator + template % (encodefloat(lat),
+                                              encodefloat(lng))
+                separator = item_separator
+            yield ']'
+            return
+        values = [None] * (2 * len(path))
+        values[::2] = lats
+        values[1::2] = lngs
+        # Fill in the points a block at a time.
+        block = max(self.chunk_size // (len(template) + 32), 1)
+        text = item_separator + template
+        for start in xrange(0, len(path), block):
+            end = min(start + block, len(path))
+            chunk = (text * (end - start)) % tuple(values[2 * start:2 * end])
+            yield ('[' + chunk[len(item_separator):]) if not start else chunk
+        yield ']'
+
+
+# A standard (C accelerated) encoder for computing fingerprints.
+_fingerprintEncoder = JSONEncoder(separators=(',', ':'),
+                                  default=MapEncoder().default)
 
 
 class MapConstant(MapClass):
@@ -81,9 +486,11 @@ class Map(MapClass):
     converted to an actual google.maps.Map instance.
 
     """
+    _schema = ArgsSchema.of(['mapDiv', 'opts'])
     _getopts = {
         'getCenter': 'center',
         'getMapTypeId': 'mapTypeId',
+        'getSize': 'size',
         'getZoom': 'zoom',
     }
     _setopts = {
@@ -95,7 +502,8 @@ class Map(MapClass):
     def __init__(self, opts=None):
         """mapDiv is not used, so not included in parameters."""
         super(Map, self).__init__(cls='Map')
-        self['arg'] = Args(['mapDiv', 'opts'], ['div'])
+        self._index = None
+        self['arg'] = Args(self._schema, ['div'])
         self.setOptions(opts)
 
     def __unicode__(self):
@@ -105,7 +513,151 @@ class Map(MapClass):
         of maps.Size). Or alternatively you can append it to the
         resulting string (e.g. '&size=400x400').
 
+        If GMAPI_STATIC_URL_BUDGET is set, paths are simplified to
+        keep the url within that many characters (see staticUrl).
+        If GMAPI_STATIC_CULL_MARGIN is set, overlays outside the map's
+        viewport are left out (see culled).
+
         """
+        if STATIC_CULL_MARGIN is not None:
+            return self.culled(STATIC_CULL_MARGIN).staticUrl(
+                STATIC_URL_BUDGET)[0]
+        return self.staticUrl(STATIC_URL_BUDGET)[0]
+
+    def staticUrl(self, budget=None):
+        """Produces a static map image url within a length budget.
+
+        Returns the url and the number of path vertices dropped. If
+        the full url is longer than budget characters, polyline and
+        polygon paths are simplified (Visvalingam-Whyatt) with an
+        area tolerance that is tightened by bisection until the url
+        fits. If even the simplest paths don't fit, the shortest url
+        is returned.
+
+        """
+        url = self._staticUrl()
+        if budget is None or len(url) <= budget:
+            return url, 0
+        # Imported here as gmapi.geometry depends on this module.
+        from gmapi.geometry import effectiveAreas, simplify
+        paths = [p.getPath() for p in self.polylines if p.getPath()]
+        paths.extend(path for p in self.polygons
+                     for path in (p.getPaths() or []))
+        areas = dict((id(path), effectiveAreas(path)) for path in paths)
+        total = sum(len(path) for path in paths)
+        tolerances = sorted(set(a for path_areas in areas.itervalues()
+                                for a in path_areas if a != float('inf')))
+        if not tolerances:
+            return url, 0
+
+        def render(tolerance):
+            simplified = {}
+            for path in paths:
+                simplified[id(path)] = simplify(path, tolerance,
+                                                areas[id(path)])
+
+            def lookup(path):
+                return simplified.get(id(path), path)
+            kept = sum(len(path) for path in simplified.itervalues())
+            return self._staticUrl(lookup), total - kept
+
+        # Find the smallest tolerance at which the url fits.
+        lo, hi = 0, len(tolerances) - 1
+        best = render(tolerances[hi])
+        while lo < hi:
+            mid = (lo + hi) // 2
+            result = render(tolerances[mid])
+            if len(result[0]) <= budget:
+                best, hi = result, mid
+            else:
+                lo = mid + 1
+        return best
+
+    def culled(self, margin=0, size=None):
+        """Return a copy of this map without off-screen overlays.
+
+        The viewport is computed as for getBounds, widened by margin
+        pixels on each side; size overrides the map's size option.
+        Markers outside it are left out, as are polygons whose bounding
+        boxes miss it, and polylines are clipped to it (a polyline may
+        be split into several). Returns the map itself if its center,
+        zoom or size is unknown. Overlays are shared with this map,
+        except for the clipped polylines and culled MarkerLayers; its
+        options are copied.
+
+        """
+        rect = self._viewport(margin, size)
+        if rect is None:
+            return self
+        x0, y0, x1, y1 = rect
+
+        def visible(lat, lng):
+            x, y = _mercator(lat, lng)
+            return y0 <= y <= y1 and (x - x0) % 1.0 <= x1 - x0
+
+        culled = Map()
+        # Copy the arguments (with the options) and lists, so that
+        # changing the copy (say with setOptions or fitBounds) leaves
+        # this map as it was.
+        culled.update((k, list(v) if isinstance(v, list) else v)
+                      for k, v in self.iteritems()
+                      if k not in ('arg', 'mkr', 'pln', 'pgn'))
+        culled['arg'] = Args(self._schema, [
+            dict(v) if isinstance(v, dict) else v for v in self['arg']])
+        markers = []
+        for marker in self.markers:
+            if isinstance(marker, MarkerLayer):
+                layer = MarkerLayer()
+                layer._marker = marker._marker
+                layer._positions = PathArray.from_points(
+                    p for p in marker._positions
+                    if visible(p.lat(), p.lng()))
+                if len(layer):
+                    markers.append(layer)
+                continue
+            position = marker['arg'].get('opts', {}).get('position')
+            if position is None or visible(position.lat(), position.lng()):
+                markers.append(marker)
+        lines = []
+        for line in self.polylines:
+            opts = line['arg'].get('opts', {})
+            if not opts.get('path'):
+                continue
+            for piece in _clipPath(opts['path'], x0, y0, x1, y1):
+                clipped = Polyline()
+                clipped['arg'] = Args(Polyline._schema,
+                                      [dict(opts, path=piece)])
+                lines.append(clipped)
+        polygons = [p for p in self.polygons
+                    if any(_pathTouches(path, x0, y0, x1, y1)
+                           for path in (p.getPaths() or []))]
+        for key, overlays in (('mkr', markers), ('pln', lines),
+                              ('pgn', polygons)):
+            if overlays:
+                culled[key] = OverlayList(overlays)
+        return culled
+
+    def _viewport(self, margin=0, size=None):
+        """Return the viewport rectangle in world coordinates, or None.
+
+        As an (x0, y0, x1, y1) tuple (see _mercator). x0 may be
+        negative and x1 more than 1, when the viewport crosses the
+        antimeridian.
+
+        """
+        opts = self['arg'].get('opts', {})
+        size = size or opts.get('size')
+        if not ('center' in opts and 'zoom' in opts and size):
+            return None
+        scale = 256.0 * 2 ** opts['zoom']
+        x, y = _mercator(opts['center'].lat(), opts['center'].lng())
+        dx = (size.width / 2.0 + margin) / scale
+        dy = (size.height / 2.0 + margin) / scale
+        if dx >= 0.5:
+            return 0.0, max(y - dy, 0.0), 1.0, min(y + dy, 1.0)
+        return x - dx, max(y - dy, 0.0), x + dx, min(y + dy, 1.0)
+
+    def _staticUrl(self, simplify=None):
         opts = self['arg'].get('opts', {})
         params = []
         for p in ['center', 'zoom', 'size', 'format', 'language']:
@@ -119,18 +671,92 @@ class Map(MapClass):
         if 'mkr' in self:
             params.append(('markers', [unicode(m) for m in self['mkr']]))
         if 'pln' in self:
-            params.append(('path', [unicode(p) for p in self['pln']]))
+            params.append(('path', [p._staticValue(simplify)
+                                    for p in self['pln']]))
         if 'pgn' in self:
-            params.append(('path', [q for p in self['pgn']
-                                    for q in unicode(p).split('&path=')]))
+            params.append(('path', [q for p in self['pgn'] for q in
+                                    p._staticValue(simplify).split('&path=')]))
         params.append(('sensor', 'true' if opts.get('sensor') else 'false'))
+        from gmapi.utils.http import urlencode
         return '%s?%s' % (STATIC_URL, urlencode(params, doseq=True))
 
+    def fitBounds(self, bounds, padding=0, size=None):
+        """Set the center and zoom to show bounds.
+
+        Like google.maps.Map.fitBounds, picks the deepest zoom level at
+        which bounds fit within the map's size, less padding pixels on
+        each side; size overrides the map's size option, which must
+        otherwise be set. Zoom is kept within the minZoom and maxZoom
+        options. Does nothing if bounds are empty.
+
+        """
+        opts = self['arg'].get('opts', {})
+        size = size or opts.get('size')
+        if not size:
+            raise ValueError('fitBounds needs the map size.')
+        edges = bounds._edges()
+        if edges is None:
+            return
+        south, west, north, east = edges
+        x0, y0 = _mercator(north, west)
+        x1, y1 = _mercator(south, east)
+        width = _lngWidth(west, east) / 360.0
+        height = y1 - y0
+        zoom = opts.get('maxZoom', 21)
+        for extent, pixels in ((width, size.width), (height, size.height)):
+            pixels -= 2 * padding
+            if extent > 0 and pixels > 0:
+                zoom = min(zoom, int(floor(log(pixels / (256.0 * extent),
+                                               2))))
+        zoom = max(zoom, opts.get('minZoom', 0))
+        lat, lng = _inverseMercator((x0 + width / 2) % 1.0, (y0 + y1) / 2)
+        self.setOptions({'center': LatLng(lat, lng), 'zoom': zoom})
+
+    def getBounds(self):
+        """Return the LatLngBounds shown by the map, or None.
+
+        Computed with the Web Mercator projection from the map's
+        center, zoom and size options, so None unless all are set.
+
+        """
+        rect = self._viewport()
+        if rect is None:
+            return None
+        x0, y0, x1, y1 = rect
+        north, south = _inverseMercator(0, y0)[0], _inverseMercator(0, y1)[0]
+        if x1 - x0 >= 1:
+            west, east = -180.0, 180.0
+        else:
+            west = _inverseMercator(x0 % 1.0, 0)[1]
+            east = _inverseMercator(x1 % 1.0, 0)[1]
+        return LatLngBounds(LatLng(south, west), LatLng(north, east))
+
     def _markers(self):
         return self.get('mkr', [])
 
     markers = property(_markers)
 
+    def markers_in(self, bounds):
+        """Return the markers positioned within bounds.
+
+        Uses a MarkerIndex, built on first use and then kept up to
+        date as markers are added, removed or moved with setMap,
+        setPosition or setOptions. Markers in a MarkerLayer are not
+        indexed.
+
+        """
+        return self._getIndex().within(bounds)
+
+    def nearest(self, latlng, k=1):
+        """Return the k markers nearest to latlng, nearest first."""
+        return self._getIndex().nearest(latlng, k)
+
+    def _getIndex(self):
+        if self._index is None:
+            self._index = MarkerIndex(m for m in self.markers
+                                      if isinstance(m, Marker))
+        return self._index
+
     def _polylines(self):
         return self.get('pln', [])
 
@@ -142,6 +768,157 @@ class Map(MapClass):
     polygons = property(_polygons)
 
 
+class OverlayList(list):
+    """An ordered list of a map's overlays.
+
+    Holds a Map's markers, polylines or polygons. Overlays are kept
+    by identity, so membership tests take constant time, an overlay
+    is only added once, and removing an overlay never removes another
+    one that is equal to it. It is a list, so it encodes to JSON as
+    one with any encoder.
+
+    The position of each overlay in the underlying list is kept by
+    id. Removing an overlay only forgets its position; removed
+    overlays are dropped from the underlying list in one pass when
+    the list is next read, or once they are half of it. So moving
+    overlays between maps takes constant time per overlay.
+
+    """
+    def __init__(self, overlays=()):
+        super(OverlayList, self).__init__()
+        self._reindex()
+        self.extend(overlays)
+
+    def __reduce__(self):
+        return OverlayList, (list(self),)
+
+    def _reindex(self):
+        overlays = super(OverlayList, self).__iter__()
+        self._positions = dict((id(o), i) for i, o in enumerate(overlays))
+        # The number of removed overlays still in the underlying list.
+        self._removed = 0
+
+    def _compact(self):
+        """Drop removed overlays from the underlying list."""
+        if self._removed:
+            positions = self._positions
+            overlays = super(OverlayList, self)
+            overlays.__setslice__(0, overlays.__len__(), [
+                o for i, o in enumerate(overlays.__iter__())
+                if positions.get(id(o)) == i])
+            self._reindex()
+
+    def __contains__(self, overlay):
+        return id(overlay) in self._positions
+
+    def __len__(self):
+        return super(OverlayList, self).__len__() - self._removed
+
+    def __iter__(self):
+        self._compact()
+        return super(OverlayList, self).__iter__()
+
+    def __radd__(self, other):
+        return other + list(self)
+
+    def append(self, overlay):
+        """Add overlay at the end, unless it is already here."""
+        if id(overlay) not in self._positions:
+            self._positions[id(overlay)] = super(OverlayList, self).__len__()
+            super(OverlayList, self).append(overlay)
+
+    def extend(self, overlays):
+        for overlay in overlays:
+            self.append(overlay)
+
+    def index(self, overlay):
+        """Return the position of overlay (this very object)."""
+        self._compact()
+        position = self._positions.get(id(overlay))
+        if position is None:
+            raise ValueError('OverlayList.index(x): x not in list')
+        return position
+
+    def remove(self, overlay):
+        """Remove overlay, raising ValueError if it isn't here."""
+        if self._positions.pop(id(overlay), None) is None:
+            raise ValueError('OverlayList.remove(x): x not in list')
+        self._removed += 1
+        if 2 * self._removed > super(OverlayList, self).__len__():
+            self._compact()
+
+    # Other changes renumber every overlay.
+
+    def __delitem__(self, index):
+        self._compact()
+        super(OverlayList, self).__delitem__(index)
+        self._reindex()
+
+    def __delslice__(self, i, j):
+        self._compact()
+        super(OverlayList, self).__delslice__(i, j)
+        self._reindex()
+
+    def __setitem__(self, index, value):
+        self._compact()
+        super(OverlayList, self).__setitem__(index, value)
+        self._reindex()
+
+    def __setslice__(self, i, j, values):
+        self._compact()
+        super(OverlayList, self).__setslice__(i, j, values)
+        self._reindex()
+
+    def __iadd__(self, overlays):
+        self.extend(overlays)
+        return self
+
+    def insert(self, index, overlay):
+        if id(overlay) not in self._positions:
+            self._compact()
+            super(OverlayList, self).insert(index, overlay)
+            self._reindex()
+
+    def pop(self, index=-1):
+        self._compact()
+        overlay = super(OverlayList, self).pop(index)
+        self._reindex()
+        return overlay
+
+    def reverse(self):
+        self._compact()
+        super(OverlayList, self).reverse()
+        self._reindex()
+
+    def sort(self, *args, **kwargs):
+        self._compact()
+        super(OverlayList, self).sort(*args, **kwargs)
+        self._reindex()
+
+
+def _compacting(name):
+    """Return list method name, dropping the removed overlays of any
+    OverlayLists it is given first."""
+    method = getattr(list, name)
+
+    def compacting(self, *args):
+        for overlays in (self,) + args:
+            if isinstance(overlays, OverlayList):
+                overlays._compact()
+        return method(self, *args)
+    compacting.__name__ = name
+    compacting.__doc__ = method.__doc__
+    return compacting
+
+
+# The rest of the list methods read the underlying list.
+for _name in ('__getitem__', '__getslice__', '__reversed__', '__repr__',
+              '__eq__', '__ne__', '__lt__', '__le__', '__gt__', '__ge__',
+              '__add__', '__mul__', '__rmul__', 'count'):
+    setattr(OverlayList, _name, _compacting(_name))
+del _name
+
+
 MapTypeId = MapConstantClass('MapTypeId',
                              ('HYBRID', 'ROADMAP', 'SATELLITE', 'TERRAIN',))
 
@@ -173,6 +950,7 @@ class Marker(MapClass):
     converted to an actual google.maps.Marker instance.
 
     """
+    _schema = ArgsSchema.of(['opts'])
     _getopts = {
         'getClickable': 'clickable',
         'getCursor': 'cursor',
@@ -207,7 +985,7 @@ class Marker(MapClass):
         self._size = None
         self._color = None
         self._label = None
-        self['arg'] = Args(['opts'])
+        self['arg'] = Args(self._schema)
         self.setOptions(opts)
 
     def __unicode__(self):
@@ -233,15 +1011,20 @@ class Marker(MapClass):
         return self._map
 
     def setOptions(self, options):
+        reindex = options and 'position' in options
         if options and 'map' in options:
             if self._map:
                 # Remove this marker from the map.
                 self._map['mkr'].remove(self)
+                if self._map._index is not None:
+                    self._map._index.discard(self)
+                self._map._changed()
             # Save new map reference.
             self._map = options.pop('map')
             if self._map:
                 # Add this marker to the map.
-                self._map.setdefault('mkr', []).append(self)
+                self._map.setdefault('mkr', OverlayList()).append(self)
+                reindex = True
         if options:
             self._size = options.pop('size', self._size)
             self._color = options.pop('color', self._color)
@@ -258,6 +1041,238 @@ class Marker(MapClass):
                 self._color = None
                 self._label = None
         super(Marker, self).setOptions(options)
+        if reindex and self._map and self._map._index is not None:
+            self._map._index.add(self)
+
+
+class MarkerIndex(object):
+    """A spatial index of markers for area and proximity queries.
+
+    Markers are bucketed by position into a grid of cells, cell
+    degrees square, so queries only visit the cells around them.
+    Markers without a position are ignored. Distances are great
+    circle distances, as computed by the Maps API.
+
+    """
+    def __init__(self, markers=(), cell=MARKER_INDEX_CELL):
+        self.cell = cell
+        self._columns = int(round(360.0 / cell))
+        self._cells = {}
+        self._keys = {}
+        for marker in markers:
+            self._insert(marker)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _key(self, lat, lng):
+        return (int(floor((lat + 90) / self.cell)),
+                int(floor((lng + 180) / self.cell)) % self._columns)
+
+    def add(self, marker):
+        """Add marker to the index, or update its position."""
+        self.discard(marker)
+        self._insert(marker)
+
+    def _insert(self, marker):
+        position = marker['arg'].get('opts', {}).get('position')
+        if position is not None:
+            lat, lng = position.lat(), position.lng()
+            key = self._key(lat, lng)
+            self._cells.setdefault(key, []).append((lat, lng, marker))
+            self._keys[id(marker)] = key
+
+    def discard(self, marker):
+        """Remove marker from the index, if it is there."""
+        key = self._keys.pop(id(marker), None)
+        if key is not None:
+            cell = self._cells[key]
+            for i, entry in enumerate(cell):
+                if entry[2] is marker:
+                    del cell[i]
+                    break
+            if not cell:
+                del self._cells[key]
+
+    def within(self, bounds):
+        """Return the markers within bounds (a LatLngBounds)."""
+        sw, ne = bounds.getSouthWest(), bounds.getNorthEast()
+        south, north = sw.lat(), ne.lat()
+        west, east = sw.lng(), ne.lng()
+        if south > north:
+            return []
+        if west > east:
+            # The bounds cross the antimeridian.
+            ranges = [(west, 180.0), (-180.0, east)]
+        else:
+            ranges = [(west, east)]
+        top, bottom = self._key(south, 0)[0], self._key(north, 0)[0]
+        result = []
+        for lo, hi in ranges:
+            first, last = self._key(0, lo)[1], self._key(0, hi)[1]
+            if hi >= 180:
+                last = self._columns - 1
+            if (bottom - top + 1) * (last - first + 1) > len(self._cells):
+                # Cheaper to check every occupied cell.
+                cells = [cell for (i, j), cell in self._cells.iteritems()
+                         if top <= i <= bottom and first <= j <= last]
+            else:
+                cells = [self._cells[(i, j)]
+                         for i in xrange(top, bottom + 1)
+                         for j in xrange(first, last + 1)
+                         if (i, j) in self._cells]
+            result.extend(marker for cell in cells
+                          for lat, lng, marker in cell
+                          if south <= lat <= north and lo <= lng <= hi)
+        return result
+
+    def nearest(self, latlng, k=1):
+        """Return the k markers nearest to latlng, nearest first.
+
+        Searches rings of cells outwards from latlng until no
+        unvisited cell can hold anything closer than the k nearest
+        markers found so far.
+
+        """
+        if k <= 0 or not self._keys:
+            return []
+        lat, lng = latlng.lat(), latlng.lng()
+        phi, lam = radians(lat), radians(lng)
+        cosphi = cos(phi)
+        heap = []
+        count = 0
+        visited = set()
+        row, column = self._key(lat, lng)
+        edge = lambda i: i * self.cell - 90
+        offset = (lng + 180) % 360 - column * self.cell
+        radius = 0
+        while True:
+            if 8 * radius > len(self._cells) - len(visited):
+                # Cheaper to check every remaining cell.
+                keys = [key for key in self._cells if key not in visited]
+            else:
+                keys = set(self._ring(row, column, radius))
+                keys = [key for key in keys
+                        if key in self._cells and key not in visited]
+            for key in keys:
+                visited.add(key)
+                for plat, plng, marker in self._cells[key]:
+                    a = (sin((radians(plat) - phi) / 2) ** 2 +
+                         cosphi * cos(radians(plat)) *
+                         sin((radians(plng) - lam) / 2) ** 2)
+                    d = 2 * asin(sqrt(min(a, 1.0)))
+                    count += 1
+                    if len(heap) < k:
+                        heappush(heap, (-d, count, marker))
+                    elif d < -heap[0][0]:
+                        heapreplace(heap, (-d, count, marker))
+            if len(visited) == len(self._cells):
+                break
+            # Lower bound on the distance to any unvisited cell.
+            gaps = []
+            south, north = edge(row - radius), edge(row + radius + 1)
+            if south > -90:
+                gaps.append(radians(lat - south))
+            if north < 90:
+                gaps.append(radians(north - lat))
+            if (2 * radius + 1) < self._columns:
+                gap = min(offset, self.cell - offset) + radius * self.cell
+                gaps.append(asin(cosphi * sin(radians(min(gap, 90)))))
+            if not gaps or (len(heap) == k and -heap[0][0] <= min(gaps)):
+                break
+            radius += 1
+        return [marker for d, c, marker in sorted(heap, reverse=True)]
+
+    def _ring(self, row, column, radius):
+        """Yield the keys of the cells radius cells from a cell."""
+        columns = self._columns
+        for j in xrange(column - radius, column + radius + 1):
+            yield row - radius, j % columns
+            yield row + radius, j % columns
+        for i in xrange(row - radius + 1, row + radius):
+            yield i, (column - radius) % columns
+            yield i, (column + radius) % columns
+
+
+class MarkerLayer(object):
+    """A bulk collection of markers sharing the same options.
+
+    Positions are kept in a PathArray rather than as one Marker and
+    LatLng per point. A MarkerLayer is added to a Map's markers
+    like a Marker. When parsed by MapEncoder, it produces a list of
+    Marker objects which our custom jQuery plugin adds to the map.
+    As a string, it produces a single static map 'markers' value.
+
+    """
+    def __init__(self, opts=None):
+        self._map = None
+        self._positions = PathArray()
+        self._marker = Marker()
+        self.setOptions(opts)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __iter__(self):
+        """Iterate over Marker instances (created on the fly)."""
+        opts = self._marker['arg'].get('opts', {})
+        for position in self._positions:
+            marker = Marker()
+            marker['arg'].append(dict(opts, position=position))
+            yield marker
+
+    def __str__(self):
+        from gmapi.utils.encoding import force_unicode
+        return force_unicode(self).encode('utf-8')
+
+    def __unicode__(self):
+        style = unicode(self._marker)
+        return '|'.join(([style] if style else []) +
+                        ([_formatPath(self._positions)]
+                         if self._positions else []))
+
+    def _aslist(self):
+        return list(self)
+
+    def _getSize(self):
+        return self._marker._size
+
+    _size = property(_getSize)
+
+    def getMap(self):
+        return self._map
+
+    def getPositions(self):
+        return self._positions
+
+    def setMap(self, map):
+        self.setOptions({'map': map})
+
+    def setPositions(self, positions):
+        self.setOptions({'positions': positions})
+
+    def setOptions(self, options):
+        if options and 'map' in options:
+            if self._map:
+                # Remove this layer from the map.
+                self._map['mkr'].remove(self)
+                self._map._changed()
+            # Save new map reference.
+            self._map = options.pop('map')
+            if self._map:
+                # Add this layer to the map.
+                self._map.setdefault('mkr', OverlayList()).append(self)
+        if options and 'positions' in options:
+            self._positions = PathArray.from_points(options.pop('positions'))
+            _own(self, self._positions)
+        self._marker.setOptions(options)
+        for value in (options or {}).itervalues():
+            _own(self, value)
+        self._changed()
+
+    def _changed(self):
+        if self._map:
+            self._map._changed()
 
 
 class MarkerImage(MapClass):
@@ -269,11 +1284,12 @@ class MarkerImage(MapClass):
     instance.
 
     """
+    _schema = ArgsSchema.of(['url', 'size', 'origin', 'anchor', 'scaledSize'])
+
     def __init__(self, url, size=None, origin=None, anchor=None,
                  scaledSize=None):
         super(MarkerImage, self).__init__(cls='MarkerImage')
-        self['arg'] = Args(['url', 'size', 'origin', 'anchor', 'scaledSize'],
-                           [url])
+        self['arg'] = Args(self._schema, [url])
         if size:
             self['arg'].setdefault('size', size)
         if origin:
@@ -282,6 +1298,8 @@ class MarkerImage(MapClass):
             self['arg'].setdefault('anchor', anchor)
         if scaledSize:
             self['arg'].setdefault('scaledSize', scaledSize)
+        for value in (size, origin, anchor, scaledSize):
+            _own(self, value)
 
     def __unicode__(self):
         return self['arg'].get('url')
@@ -295,6 +1313,7 @@ class Polyline(MapClass):
     converted to an actual google.maps.Polyline instance.
 
     """
+    _schema = ArgsSchema.of(['opts'])
     _getopts = {
         'getPath': 'path',
     }
@@ -306,10 +1325,13 @@ class Polyline(MapClass):
     def __init__(self, opts=None):
         super(Polyline, self).__init__(cls='Polyline')
         self._map = None
-        self['arg'] = Args(['opts'])
+        self['arg'] = Args(self._schema)
         self.setOptions(opts)
 
     def __unicode__(self):
+        return self._staticValue()
+
+    def _staticValue(self, simplify=None):
         opts = self['arg'].get('opts', {})
         params = []
         if 'strokeColor' in opts:
@@ -320,7 +1342,7 @@ class Polyline(MapClass):
         if 'strokeWeight' in opts:
             params.append('weight:%d' % opts['strokeWeight'])
         if 'path' in opts:
-            params.append('|'.join([unicode(p) for p in opts['path']]))
+            params.append(_staticPath(opts['path'], simplify=simplify))
         return '|'.join(params)
 
     def getMap(self):
@@ -331,11 +1353,12 @@ class Polyline(MapClass):
             if self._map:
                 # Remove this polyline from the map.
                 self._map['pln'].remove(self)
+                self._map._changed()
             # Save new map reference.
             self._map = options.pop('map')
             if self._map:
                 # Add this polyline to the map.
-                self._map.setdefault('pln', []).append(self)
+                self._map.setdefault('pln', OverlayList()).append(self)
         super(Polyline, self).setOptions(options)
 
 
@@ -347,6 +1370,7 @@ class Polygon(MapClass):
     converted to an actual google.maps.Polygon instance.
 
     """
+    _schema = ArgsSchema.of(['opts'])
     _getopts = {
         'getPaths': 'paths',
     }
@@ -358,10 +1382,14 @@ class Polygon(MapClass):
     def __init__(self, opts=None):
         super(Polygon, self).__init__(cls='Polygon')
         self._map = None
-        self['arg'] = Args(['opts'])
+        self._edges = None
+        self['arg'] = Args(self._schema)
         self.setOptions(opts)
 
     def __unicode__(self):
+        return self._staticValue()
+
+    def _staticValue(self, simplify=None):
         opts = self['arg'].get('opts', {})
         params = []
         paths = []
@@ -381,11 +1409,44 @@ class Polygon(MapClass):
             params.append('weight:%d' % opts['strokeWeight'])
         if 'paths' in opts:
             for path in opts['paths']:
-                loop = ['' if path[-1].equals(path[0]) else unicode(path[0])]
-                paths.append('|'.join(params + [unicode(p) for p in path] +
-                                      loop))
+                paths.append('|'.join(params +
+                                      [_staticPath(path, closed=True,
+                                                   simplify=simplify)]))
         return '&path='.join(paths)
 
+    def containsLocation(self, latlng):
+        """Whether latlng is inside this polygon.
+
+        As google.maps.geometry.poly.containsLocation. A point inside
+        an odd number of the polygon's paths is inside it, so paths
+        within another path make holes in it.
+
+        """
+        return self._getEdges().contains(latlng.lat(), latlng.lng())
+
+    def contains_many(self, points):
+        """Whether each of many points is inside this polygon.
+
+        points may be a path, a Polyline or MarkerLayer, or a list of
+        Markers. Returns a NumPy array of booleans when NumPy is
+        available, otherwise a list.
+
+        """
+        from gmapi.geometry import _asPath
+        return self._getEdges().contains_many(_asPath(points))
+
+    def _getEdges(self):
+        # Edges are rebuilt when the paths are set, or added to in place
+        # (as with PathArray.push), which changes their lengths.
+        if self._edges is not None:
+            paths, lengths, edges = self._edges
+            if map(len, paths) == lengths:
+                return edges
+        from gmapi.geometry import _PolygonEdges
+        paths = self.getPaths() or []
+        self._edges = (paths, map(len, paths), _PolygonEdges(paths))
+        return self._edges[2]
+
     def getMap(self):
         return self._map
 
@@ -393,21 +1454,166 @@ class Polygon(MapClass):
         return (self.getPaths() or [None])[0]
 
     def setOptions(self, options):
+        if options and isinstance(options.get('paths'), PathArray):
+            # A single path, as with google.maps.Polygon.
+            options['paths'] = [options['paths']]
+        if options and 'paths' in options:
+            self._edges = None
         if options and 'map' in options:
             if self._map:
                 # Remove this polygon from the map.
                 self._map['pgn'].remove(self)
+                self._map._changed()
             # Save new map reference.
             self._map = options.pop('map')
             if self._map:
                 # Add this polygon to the map.
-                self._map.setdefault('pgn', []).append(self)
+                self._map.setdefault('pgn', OverlayList()).append(self)
         super(Polygon, self).setOptions(options)
 
     def setPath(self, path):
         self.setPaths([path])
 
 
+def _mercator(lat, lng):
+    """Project to Web Mercator world coordinates, scaled to [0, 1]."""
+    siny = min(max(sin(radians(lat)), -0.9999), 0.9999)
+    return ((lng + 180) / 360.0,
+            0.5 - log((1 + siny) / (1 - siny)) / (4 * pi))
+
+
+def _inverseMercator(x, y):
+    """Unproject Web Mercator world coordinates (see _mercator)."""
+    return (degrees(2 * atan(exp((0.5 - y) * 2 * pi)) - pi / 2),
+            x * 360.0 - 180)
+
+
+def _unwrapPath(path):
+    """Project a path to world coordinates (see _mercator).
+
+    Returns lists of x and y coordinates. Each x is moved by whole
+    worlds to within half a world of the one before, so segments
+    crossing the antimeridian stay short, as Google Maps draws them.
+
+    """
+    xs, ys = [], []
+    for lat, lng in izip(path.lats, path.lngs):
+        x, y = _mercator(lat, lng)
+        if xs:
+            x += round(xs[-1] - x)
+        xs.append(x)
+        ys.append(y)
+    return xs, ys
+
+
+def _worldShifts(xs, x0, x1):
+    """Whole world shifts which could bring xs into [x0, x1]."""
+    return xrange(int(floor(x0 - max(xs))), int(ceil(x1 - min(xs))) + 1)
+
+
+def _pathTouches(path, x0, y0, x1, y1):
+    """Whether a path's bounding box meets a world rectangle."""
+    path = PathArray.from_points(path)
+    if not len(path):
+        return False
+    xs, ys = _unwrapPath(path)
+    if max(ys) < y0 or min(ys) > y1:
+        return False
+    return any(min(xs) + k <= x1 and max(xs) + k >= x0
+               for k in _worldShifts(xs, x0, x1))
+
+
+def _clipSegment(ax, ay, bx, by, x0, y0, x1, y1):
+    """Clip a segment to a rectangle (Liang-Barsky).
+
+    Returns the (t0, t1) parameters of the part of the segment inside
+    the rectangle, or None if it misses it.
+
+    """
+    t0, t1 = 0.0, 1.0
+    dx, dy = bx - ax, by - ay
+    for p, q in ((-dx, ax - x0), (dx, x1 - ax), (-dy, ay - y0), (dy, y1 - ay)):
+        if p == 0:
+            if q < 0:
+                return None
+        elif p < 0:
+            t0 = max(t0, q / p)
+        else:
+            t1 = min(t1, q / p)
+        if t0 > t1:
+            return None
+    return t0, t1
+
+
+def _clipPath(path, x0, y0, x1, y1):
+    """Clip a path to a rectangle in world coordinates.
+
+    Segments are straight lines in the projection, as Google Maps
+    draws them. Returns the pieces of the path inside the rectangle
+    as PathArrays. Vertices inside it keep their exact coordinates.
+
+    """
+    path = PathArray.from_points(path)
+    if len(path) < 2:
+        return []
+    xs, ys = _unwrapPath(path)
+    pieces = []
+
+    def point(i, t):
+        if t == 0:
+            return path.lats[i], path.lngs[i]
+        if t == 1:
+            return path.lats[i + 1], path.lngs[i + 1]
+        x = xs[i] + (xs[i + 1] - xs[i]) * t
+        y = ys[i] + (ys[i + 1] - ys[i]) * t
+        return _inverseMercator(x % 1.0, y)
+
+    for k in _worldShifts(xs, x0, x1):
+        piece = None
+        for i in xrange(len(xs) - 1):
+            clip = _clipSegment(xs[i] + k, ys[i], xs[i + 1] + k, ys[i + 1],
+                                x0, y0, x1, y1)
+            if clip is None:
+                piece = None
+                continue
+            t0, t1 = clip
+            if piece is None or t0 > 0:
+                piece = [point(i, t0)]
+                pieces.append(piece)
+            piece.append(point(i, t1))
+            if t1 < 1:
+                piece = None
+    return [PathArray.from_arrays([p[0] for p in piece],
+                                  [p[1] for p in piece])
+            for piece in pieces]
+
+
+def _staticPath(path, closed=False, simplify=None):
+    """Return the static map url value for a path's locations.
+
+    Closed paths (polygons) are looped back to their first point.
+    Unless disabled with GMAPI_STATIC_ENCODE_PATHS, the locations
+    are written as an encoded polyline. If given, simplify is
+    called with the path and returns the path to use instead.
+
+    """
+    if simplify is not None:
+        path = simplify(path)
+    if not len(path):
+        return ''
+    if STATIC_ENCODE_PATHS:
+        # Imported here as gmapi.geometry depends on this module.
+        from gmapi.geometry import encoding
+        if closed and not path[-1].equals(path[0]):
+            path = PathArray.from_points(path)[:]
+            path.append(path[0])
+        return 'enc:' + encoding.encodePath(path)
+    text = _formatPath(PathArray.from_points(path))
+    if closed:
+        text += '|' + ('' if path[-1].equals(path[0]) else unicode(path[0]))
+    return text
+
+
 class InfoWindow(MapClass):
     """A Google InfoWindow.
 
@@ -416,6 +1622,7 @@ class InfoWindow(MapClass):
     converted to an actual google.maps.InfoWindow instance.
 
     """
+    _schema = ArgsSchema.of(['opts'])
     _getopts = {
         'getContent': 'content',
         'getPosition': 'position',
@@ -429,7 +1636,8 @@ class InfoWindow(MapClass):
 
     def __init__(self, opts=None):
         super(InfoWindow, self).__init__(cls='InfoWindow')
-        self['arg'] = Args(['opts'])
+        self._map = None
+        self['arg'] = Args(self._schema)
         self.setOptions(opts)
 
     def open(self, map, anchor=None):
@@ -438,8 +1646,11 @@ class InfoWindow(MapClass):
             # Make sure the marker is assigned to the specified map.
             anchor.setMap(map)
             anchor['nfo'] = self
+            anchor._changed()
         else:
             map['nfo'] = self
+        self._map = map
+        self._changed()
 
 
 class Geocoder(object):
@@ -452,10 +1663,35 @@ class Geocoder(object):
     and thus is much less likely to hit any limits.
 
     """
-    # Handle blocking and sleeping at class level.
+    # Handle blocking and rate limiting at class level, shared by
+    # all threads.
     _block = False
-    _sleep = 0
-    _last = 0
+    _lock = threading.Lock()
+    _limiter = None
+    _cache = None
+    _transport = None
+
+    def __init__(self, lazy=False, transport=None, backend=None):
+        """If lazy, LatLng and LatLngBounds are created on access.
+
+        Results are then dicts which convert their coordinate values
+        when looked up, so decoding large responses of which only a
+        little is used costs less. Unconverted values are plain dicts
+        as decoded from the response.
+
+        transport fetches Web Service responses (see HTTPTransport and
+        LocalTransport). By default, all Geocoders share one
+        HTTPTransport, and so its pool of connections.
+
+        backend, if given, answers requests locally (see
+        gmapi.gazetteer.Gazetteer); requests it can't answer go to the
+        Web Service. Its results are returned as it makes them, lazy
+        or not.
+
+        """
+        self.lazy = lazy
+        self.transport = transport
+        self.backend = backend
 
     def geocode(self, request, callback=None):
         """Geocode a request.
@@ -465,56 +1701,432 @@ class Geocoder(object):
         return the results and status directly.
 
         """
-        # Handle any unicode in the request.
+        if self.backend is not None:
+            response = self.backend.geocode(request, callback)
+            if response is not None:
+                return response
+        from hashlib import md5
+        query = self._normalize(request)
+        url = '%s/json?%s' % (GEOCODE_URL, query)
+        cache = self._getCache()
+        cache_key = 'gmapi.geocode.%s' % md5(query).hexdigest()
+        limiter = self._getLimiter()
+        # Try up to 30 times if over query limit.
+        for _ in xrange(30):
+            # Check if result is already cached.
+            data = cache.get(cache_key) if cache else None
+            cached = data is not None
+            if not cached:
+                # Wait for our turn so that we don't make requests too fast.
+                limiter.acquire()
+                data = self._fetch(url)
+            # Results are converted as they are decoded.
+            response = loads(data, object_hook=_lazyGeocoderObject
+                             if self.lazy else _geocoderObject)
+            status = response['status']
+
+            if status == 'OVER_QUERY_LIMIT':
+                # Over limit, slow down.
+                if Geocoder._block:
+                    break
+                limiter.slowDown()
+            else:
+                if not cached:
+                    limiter.speedUp()
+                    # Save results to cache, but not failures (such as
+                    # REQUEST_DENIED), which may not happen again.
+                    if cache and status in ('OK', 'ZERO_RESULTS'):
+                        cache.set(cache_key, data)
+                if status == 'OK':
+                    # Successful query, clear block if there is one.
+                    if Geocoder._block:
+                        with Geocoder._lock:
+                            Geocoder._block = False
+                    results = response['results']
+                    if callback:
+                        callback(results, status)
+                    return results, status
+                else:
+                    return None, status
+        with Geocoder._lock:
+            Geocoder._block = True
+        raise SystemError('Geocoding has failed too many times. '
+                          'You might have exceeded your daily limit.')
+
+    def geocode_many(self, requests, workers=GEOCODE_WORKERS):
+        """Geocode a batch of requests concurrently.
+
+        Requests are shared out between a pool of worker threads, all
+        subject to the same rate limit (GMAPI_GEOCODE_RATE requests
+        per second, backing off while over the query limit). Returns
+        a list of (results, status) tuples in the same order as the
+        requests. If any request raises, the first exception is
+        re-raised once all workers have stopped.
+
+        """
+        import Queue
+        requests = list(requests)
+        queue = Queue.Queue()
+        for item in enumerate(requests):
+            queue.put(item)
+        responses = [None] * len(requests)
+        errors = []
+
+        def work():
+            while not errors:
+                try:
+                    index, request = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    responses[index] = self.geocode(request)
+                except Exception:
+                    errors.append(sys.exc_info())
+
+        threads = [threading.Thread(target=work)
+                   for _ in xrange(max(1, min(workers, len(requests))))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0][0], errors[0][1], errors[0][2]
+        return responses
+
+    def _normalize(self, request):
+        """Normalize request in place, and return its query string."""
+        from gmapi.utils.encoding import smart_str
+        from gmapi.utils.http import urlencode
+        # Handle any unicode in the request, and normalise case and
+        # whitespace so that variants of an address share a cache entry.
         if 'address' in request:
-            request['address'] = smart_str(request['address'],
-                                           strings_only=True).lower()
+            request['address'] = ' '.join(smart_str(
+                request['address'], strings_only=True).lower().split())
         # Add the sensor parameter if needed.
         if 'sensor' in request:
             if request['sensor'] != 'false':
                 request['sensor'] = 'true' if request['sensor'] else 'false'
         else:
             request['sensor'] = 'false'
-#        cache_key = urlencode(request)
-#        url = '%s/json?%s' % (GEOCODE_URL, cache_key)
-#        # Try up to 30 times if over query limit.
-#        for _ in xrange(30):
-#            # Check if result is already cached.
-#            data = cache.get(cache_key)
-#            if data is None:
-#                if (max(0, time.time() - self.__class__._last) <
-#                    self.__class__._sleep):
-#                    # Wait a bit so that we don't make requests too fast.
-#                    time.sleep(max(0, self.__class__._sleep +
-#                                      self.__class__._last - time.time()))
-#                data = urllib.urlopen(url).read()
-#                self.__class__._last = time.time()
-#            response = loads(data)
-#            status = response['status']
-#
-#            if status == 'OVER_QUERY_LIMIT':
-#                # Over limit, increase delay a bit.
-#                if self.__class__._block:
-#                    break
-#                self.__class__._sleep += .1
-#            else:
-#                # Save results to cache.
-#                cache.set(cache_key, data)
-#                if status == 'OK':
-#                    # Successful query, clear block if there is one.
-#                    if self.__class__._block:
-#                        self.__class__._block = False
-#                        self.__class__._sleep = 0
-#                    results = _parseGeocoderResult(response['results'])
-#                    if callback:
-#                        callback(results, status)
-#                    return results, status
-#                else:
-#                    return None, status
-#        self.__class__._block = True
-#        raise SystemError('Geocoding has failed too many times. '
-#                          'You might have exceeded your daily limit.')
-#
+        # The Web Service calls the javascript API's latLng latlng. The
+        # request keeps latLng, for backends that look it up.
+        params = dict(request)
+        if 'latLng' in params:
+            latLng = params.pop('latLng')
+            params['latlng'] = (latLng.toUrlValue()
+                                if hasattr(latLng, 'toUrlValue') else latLng)
+        return urlencode(sorted(params.items()))
+
+    def _fetch(self, url):
+        """Return the body of a Web Service response."""
+        return self._getTransport().fetch(url)
+
+    def _getCache(self):
+        """Return the geocode result cache (or None if disabled)."""
+        from gmapi.utils.cache import get_cache
+        with Geocoder._lock:
+            if Geocoder._cache is None and GEOCODE_CACHE:
+                Geocoder._cache = get_cache(GEOCODE_CACHE)
+            return Geocoder._cache
+
+    def _getLimiter(self):
+        with Geocoder._lock:
+            if Geocoder._limiter is None:
+                Geocoder._limiter = _TokenBucket(GEOCODE_RATE)
+            return Geocoder._limiter
+
+    def _getTransport(self):
+        if self.transport is not None:
+            return self.transport
+        with Geocoder._lock:
+            if Geocoder._transport is None:
+                Geocoder._transport = HTTPTransport()
+            return Geocoder._transport
+
+
+class AsyncGeocoder(object):
+    """A Geocoder which doesn't block, for use from event loops.
+
+    geocode returns a future of its (results, status) straight away,
+    while the request is made by one of a pool of worker threads
+    (started on first use). Concurrent requests which are the same
+    once normalized (as by Geocoder.geocode) share one lookup, so a
+    burst of requests for an address costs a single request to the
+    Web Service. Lookups go through geocoder (a Geocoder, by default a
+    new one), with its cache, rate limit and transport.
+
+    """
+    def __init__(self, geocoder=None, workers=GEOCODE_WORKERS):
+        import Queue
+        self.geocoder = geocoder or Geocoder()
+        self.workers = workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def geocode(self, request, callback=None):
+        """Geocode a request in the background, returning a GeocodeFuture.
+
+        If given, callback is called with the results and status (in
+        a worker thread) once the request completes, or with None and
+        the exception raised if the lookup failed.
+
+        """
+        request = dict(request)
+        query = self.geocoder._normalize(request)
+        with self._lock:
+            future = self._inflight.get(query)
+            if future is None:
+                future = self._inflight[query] = GeocodeFuture()
+                self._queue.put((query, request, future))
+                self._threads = [t for t in self._threads if t.is_alive()]
+                if len(self._threads) < self.workers:
+                    thread = threading.Thread(target=self._work)
+                    thread.daemon = True
+                    thread.start()
+                    self._threads.append(thread)
+        if callback:
+            def done(future):
+                if future._error is not None:
+                    callback(None, future._error[1])
+                else:
+                    callback(*future._result)
+            future.add_done_callback(done)
+        return future
+
+    def close(self):
+        """Stop the worker threads, once queued requests are done."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            query, request, future = item
+            try:
+                result = self.geocoder.geocode(request)
+            except Exception:
+                error = sys.exc_info()
+            else:
+                error = None
+            # Later identical requests make a new lookup.
+            with self._lock:
+                del self._inflight[query]
+            future._set(result if error is None else None, error)
+
+
+class GeocodeFuture(object):
+    """The eventual (results, status) of an AsyncGeocoder request.
+
+    Modelled on concurrent.futures.Future.
+
+    """
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = self._error = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def _set(self, result, error):
+        with self._lock:
+            self._result, self._error = result, error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._call(callback)
+
+    def _call(self, callback):
+        # Errors in one callback mustn't stop the others (or the worker
+        # thread running them).
+        try:
+            callback(self)
+        except Exception:
+            import logging
+            logging.getLogger(__name__).exception(
+                'Exception in GeocodeFuture callback')
+
+    def add_done_callback(self, callback):
+        """Call callback with this future once done (now, if it is)."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        self._call(callback)
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Wait for and return (results, status), or raise its error."""
+        if not self._done.wait(timeout):
+            raise RuntimeError('Geocoding did not complete in time.')
+        if self._error is not None:
+            raise self._error[0], self._error[1], self._error[2]
+        return self._result
+
+
+class HTTPTransport(object):
+    """Fetches urls over a pool of persistent (keep-alive) connections.
+
+    Connections are kept open between requests, up to poolSize per
+    host, saving a TCP (and TLS) handshake per request. Responses are
+    requested gzipped. Requests which fail with a network error or a
+    server error (5xx) are retried up to retries times, after a random
+    wait of up to backoff seconds, doubled after every attempt (so
+    that clients which fail together don't retry together). Other
+    HTTP errors raise urllib2.HTTPError straight away. Safe to share
+    between threads.
+
+    """
+    def __init__(self, timeout=GEOCODE_TIMEOUT, retries=GEOCODE_RETRIES,
+                 backoff=0.5, poolSize=GEOCODE_WORKERS):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.poolSize = poolSize
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, scheme, netloc):
+        import Queue
+        with self._lock:
+            pool = self._pools.get((scheme, netloc))
+            if pool is None:
+                pool = self._pools[(scheme, netloc)] = Queue.LifoQueue()
+            return pool
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            pools, self._pools = self._pools.values(), {}
+        for pool in pools:
+            while not pool.empty():
+                pool.get_nowait().close()
+
+    def fetch(self, url):
+        """Return the body of the response to a GET request for url."""
+        import httplib
+        import Queue
+        import random
+        import socket
+        import urllib2
+        import urlparse
+        import zlib
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if query:
+            path = '%s?%s' % (path, query)
+        pool = self._pool(scheme, netloc)
+        attempt = 0
+        while True:
+            try:
+                conn, reused = pool.get_nowait(), True
+            except Queue.Empty:
+                connection = (httplib.HTTPSConnection if scheme == 'https'
+                              else httplib.HTTPConnection)
+                conn, reused = connection(netloc, timeout=self.timeout), False
+            try:
+                conn.request('GET', path or '/',
+                             headers={'Accept-Encoding': 'gzip'})
+                response = conn.getresponse()
+                body = response.read()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if reused:
+                    # Most likely a kept-alive connection the server
+                    # has since closed, so retry straight away, without
+                    # counting an attempt. The pool only holds so many.
+                    continue
+                if attempt == self.retries:
+                    raise
+            else:
+                if pool.qsize() < self.poolSize:
+                    pool.put(conn)
+                else:
+                    conn.close()
+                if response.status == 200:
+                    if response.getheader('Content-Encoding') == 'gzip':
+                        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+                    return body
+                if response.status < 500 or attempt == self.retries:
+                    raise urllib2.HTTPError(url, response.status,
+                                            response.reason,
+                                            response.msg, None)
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            attempt += 1
+
+
+class LocalTransport(object):
+    """Answers requests in process, without a network.
+
+    A stand-in for HTTPTransport, for tests and benchmarks: respond is
+    called with the parameters of each request (as a dict, e.g.
+    {'address': 'main st', 'sensor': 'false'}) and returns the Web
+    Service response as a dict (or a string of JSON).
+
+    """
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, url):
+        import urlparse
+        with self._lock:
+            self.requests += 1
+        query = urlparse.urlsplit(url).query
+        response = self.respond(dict(urlparse.parse_qsl(query)))
+        if isinstance(response, basestring):
+            return response
+        return JSONEncoder().encode(response)
+
+
+class _TokenBucket(object):
+    """A thread-safe token bucket rate limiter.
+
+    Hands out up to rate tokens per second (bursts of at most burst
+    tokens). The rate is halved by slowDown and recovers gradually,
+    a tenth of the maximum at a time, with speedUp.
+
+    """
+    def __init__(self, rate, burst=1, minRate=0.1):
+        self.maxRate = self.rate = float(rate)
+        self.minRate = min(minRate, self.maxRate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait for and take a token."""
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.burst, self._tokens +
+                                   (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def slowDown(self):
+        with self._lock:
+            self.rate = max(self.minRate, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+
+    def speedUp(self):
+        with self._lock:
+            self.rate = min(self.maxRate, self.rate + self.maxRate / 10)
+
 
 def _parseGeocoderResult(result):
     """ Parse Geocoder Results.
@@ -540,6 +2152,117 @@ def _parseGeocoderResult(result):
     return result
 
 
+def _geocoderObject(obj):
+    """Convert a JSON object decoded from a Geocoder response.
+
+    A json object_hook with the same effect as _parseGeocoderResult.
+    Objects are decoded innermost first, so the corners of bounds are
+    already LatLngs.
+
+    """
+    if 'lat' in obj and 'lng' in obj:
+        return LatLng(obj['lat'], obj['lng'])
+    if 'southwest' in obj and 'northeast' in obj:
+        return LatLngBounds(obj['southwest'], obj['northeast'])
+    return obj
+
+
+def _lazyGeocoderObject(obj):
+    """As _geocoderObject, but leaving conversion to _LazyResult."""
+    if ('lat' in obj and 'lng' in obj or
+            'southwest' in obj and 'northeast' in obj):
+        return obj
+    return _LazyResult(obj)
+
+
+def _materialize(value):
+    if type(value) is dict:
+        if 'lat' in value and 'lng' in value:
+            return LatLng(value['lat'], value['lng'])
+        return LatLngBounds(_materialize(value['southwest']),
+                            _materialize(value['northeast']))
+    return value
+
+
+class _LazyResult(dict):
+    """A Geocoder result object which converts values when looked up.
+
+    Coordinates are left as plain dicts (see _lazyGeocoderObject) and
+    replaced by a LatLng or LatLngBounds when first read: by lookup,
+    get, iterating over values or items (and so json.dumps), pop and
+    setdefault. Comparison, repr, copy and views convert every value
+    first. dict(result) and dict.update copy the values as they are
+    stored, unconverted; use result.copy() instead.
+
+    """
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if type(value) is dict:
+            value = _materialize(value)
+            dict.__setitem__(self, key, value)
+        return value
+
+    def _convert(self):
+        """Convert every value."""
+        for key, value in dict.items(self):
+            if type(value) is dict:
+                dict.__setitem__(self, key, _materialize(value))
+
+    def __eq__(self, other):
+        self._convert()
+        if isinstance(other, _LazyResult):
+            other._convert()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        self._convert()
+        return dict.__repr__(self)
+
+    def copy(self):
+        self._convert()
+        return _LazyResult(self)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def pop(self, key, *default):
+        return _materialize(dict.pop(self, key, *default))
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        return key, _materialize(value)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        return dict.setdefault(self, key, default)
+
+    def itervalues(self):
+        for key in self:
+            yield self[key]
+
+    def iteritems(self):
+        for key in self:
+            yield key, self[key]
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def viewvalues(self):
+        self._convert()
+        return dict.viewvalues(self)
+
+    def viewitems(self):
+        self._convert()
+        return dict.viewitems(self)
+
+
 class MapsEventListener(list):
     pass
 
@@ -549,17 +2272,20 @@ class _event(object):
         listener = MapsEventListener([eventName, handlerName])
         instance.setdefault('evt', []).append(listener)
         listener.instance = instance
+        instance._changed()
         return listener
 
     def addListenerOnce(self, instance, eventName, handlerName):
         listener = MapsEventListener([eventName, handlerName, True])
         instance.setdefault('evt', []).append(listener)
         listener.instance = instance
+        instance._changed()
         return listener
 
     def clearInstanceListeners(self, instance):
         if 'evt' in instance:
             del instance['evt']
+            instance._changed()
 
     def clearListeners(self, instance, eventName):
         if 'evt' in instance:
@@ -568,6 +2294,7 @@ class _event(object):
                     instance['evt'].remove(listener)
             if not instance['evt']:
                 del instance['evt']
+            instance._changed()
 
     def removeListener(self, listener):
         instance = listener.instance
@@ -576,6 +2303,7 @@ class _event(object):
                 instance['evt'].remove(listener)
             if not instance['evt']:
                 del instance['evt']
+            instance._changed()
 
 
 event = _event()
@@ -589,9 +2317,11 @@ class LatLng(MapClass):
     converted to an actual google.maps.LatLng instance.
 
     """
+    _schema = ArgsSchema.of(['lat', 'lng', 'noWrap'])
+
     def __init__(self, lat, lng, noWrap=None):
         super(LatLng, self).__init__(cls='LatLng')
-        self['arg'] = Args(['lat', 'lng', 'noWrap'], [Degree(lat), Degree(lng)])
+        self['arg'] = Args(self._schema, [Degree(lat), Degree(lng)])
         if noWrap is not None:
             self['arg'].setdefault('noWrap', noWrap)
 
@@ -611,8 +2341,9 @@ class LatLng(MapClass):
         return '(%s, %s)' % (self.lat(), self.lng())
 
     def toUrlValue(self, precision=6):
-        return '%s,%s' % (Degree(self.lat(), precision),
-                          Degree(self.lng(), precision))
+        arg = self['arg']
+        return '%s,%s' % (_formatDegree(arg[0], precision),
+                          _formatDegree(arg[1], precision))
 
 
 class LatLngBounds(MapClass):
@@ -623,35 +2354,153 @@ class LatLngBounds(MapClass):
     it will be converted to an actual google.maps.LatLngBounds
     instance.
 
+    Bounds whose west edge is east of their east edge cross the
+    antimeridian. Bounds without corners are empty; extending them
+    (or taking their union) gives them corners.
+
     """
+    _schema = ArgsSchema.of(['sw', 'ne'])
+
     def __init__(self, sw=None, ne=None):
         super(LatLngBounds, self).__init__(cls='LatLngBounds')
-        self['arg'] = Args(['sw', 'ne'])
+        self['arg'] = Args(self._schema)
         if sw:
             self['arg'].setdefault('sw', sw)
         if ne:
             self['arg'].setdefault('ne', ne)
 
+    @classmethod
+    def from_points(cls, points):
+        """Return the smallest bounds containing all of points.
+
+        points may be a path (a list of LatLng or a PathArray), a
+        Polyline or MarkerLayer, or a list of Markers. The bounds cross
+        the antimeridian if that makes them narrower. Computed with
+        NumPy when it is available.
+
+        """
+        # Imported here as gmapi.geometry depends on this module.
+        from gmapi.geometry import NUMPY_THRESHOLD, _asPath, _degrees, numpy
+        path = _asPath(points)
+        if not len(path):
+            return cls()
+        if numpy is not None and len(path) >= NUMPY_THRESHOLD:
+            lats, lngs = _degrees(path)
+            south, north = float(lats.min()), float(lats.max())
+            lngs = numpy.unique(lngs)
+            gaps = numpy.diff(lngs)
+            i = int(gaps.argmax()) if len(gaps) else 0
+            widest = float(gaps[i]) if len(gaps) else 0.0
+            lngs = lngs.tolist()
+        else:
+            south, north = min(path.lats), max(path.lats)
+            lngs = sorted(set(path.lngs))
+            widest, i = max((lngs[k + 1] - lngs[k], k)
+                            for k in xrange(len(lngs) - 1)) \
+                if len(lngs) > 1 else (0.0, 0)
+        # The bounds span everything but the widest gap between
+        # longitudes, which may be the one across the antimeridian.
+        if lngs[0] + 360 - lngs[-1] >= widest:
+            west, east = lngs[0], lngs[-1]
+        else:
+            west, east = lngs[i + 1], lngs[i]
+        return cls(LatLng(south, west), LatLng(north, east))
+
     def __unicode__(self):
         return self.toUrlValue()
 
+    def _edges(self):
+        """Return (south, west, north, east), or None if empty."""
+        sw, ne = self.getSouthWest(), self.getNorthEast()
+        if not sw:
+            return None
+        ne = ne or sw
+        if sw.lat() > ne.lat():
+            return None
+        return sw.lat(), sw.lng(), ne.lat(), ne.lng()
+
+    def _setEdges(self, south, west, north, east):
+        self['arg'] = Args(self._schema, [LatLng(south, west),
+                                        LatLng(north, east)])
+        self._changed()
+
+    def contains(self, latlng):
+        edges = self._edges()
+        if edges is None:
+            return False
+        south, west, north, east = edges
+        return (south <= latlng.lat() <= north and
+                _lngContains(west, east, latlng.lng()))
+
     def equals(self, other):
         # Check if our corners are equal.
         return (self.getSouthWest().equals(other.getSouthWest()) and
                 self.getNorthEast().equals(other.getNorthEast()))
 
+    def extend(self, point):
+        """Extend the bounds to contain point, and return them.
+
+        Longitudes are extended in whichever direction (possibly
+        across the antimeridian) adds less width.
+
+        """
+        lat, lng = point.lat(), point.lng()
+        edges = self._edges()
+        if edges is None:
+            self._setEdges(lat, lng, lat, lng)
+            return self
+        south, west, north, east = edges
+        if _lngContains(west, east, lng):
+            if south <= lat <= north:
+                return self
+        elif (west - lng) % 360 < (lng - east) % 360:
+            west = lng
+        else:
+            east = lng
+        self._setEdges(min(south, lat), west, max(north, lat), east)
+        return self
+
+    def getCenter(self):
+        edges = self._edges()
+        if edges is None:
+            return None
+        south, west, north, east = edges
+        if west > east:
+            east += 360
+        return LatLng((south + north) / 2.0,
+                      180 - (180 - (west + east) / 2.0) % 360)
+
     def getNorthEast(self):
         return self['arg'].get('ne')
 
     def getSouthWest(self):
         return self['arg'].get('sw')
 
+    def intersects(self, other):
+        a, b = self._edges(), other._edges()
+        if a is None or b is None:
+            return False
+        if a[0] > b[2] or b[0] > a[2]:
+            return False
+        # Two longitude intervals meet if either contains the start of
+        # the other.
+        return (_lngContains(a[1], a[3], b[1]) or
+                _lngContains(b[1], b[3], a[1]))
+
     def isEmpty(self):
         return ((not self.getSouthWest()) or
                 (self.getNorthEast() and
                  self.getSouthWest().lat() >
                  self.getNorthEast().lat()))
 
+    def toSpan(self):
+        edges = self._edges()
+        if edges is None:
+            return LatLng(0, 0)
+        south, west, north, east = edges
+        return LatLng(north - south, (east - west) % 360 or
+                      (360 if west != east else 0))
+
     def toString(self):
         return '(%s, %s)' % (self.getSouthWest().toString(),
                              self.getNorthEast().toString())
@@ -660,6 +2509,45 @@ class LatLngBounds(MapClass):
         return '%s,%s' % (self.getSouthWest().toUrlValue(precision),
                           self.getNorthEast().toUrlValue(precision))
 
+    def union(self, other):
+        """Extend the bounds to contain other, and return them."""
+        a, b = self._edges(), other._edges()
+        if b is None:
+            return self
+        if a is None:
+            self._setEdges(*b)
+            return self
+        west, east = _lngUnion(a[1], a[3], b[1], b[3])
+        self._setEdges(min(a[0], b[0]), west, max(a[2], b[2]), east)
+        return self
+
+
+def _lngContains(west, east, lng):
+    """Whether a longitude interval contains lng."""
+    if west <= east:
+        return west <= lng <= east
+    # The interval crosses the antimeridian.
+    return lng >= west or lng <= east
+
+
+def _lngWidth(west, east):
+    """The width of a longitude interval, in degrees."""
+    return east - west if west <= east else east - west + 360
+
+
+def _lngUnion(west1, east1, west2, east2):
+    """Return the narrowest longitude interval covering two others."""
+    def covers(west, east):
+        width = _lngWidth(west, east)
+        return all((w - west) % 360 + _lngWidth(w, e) <= width
+                   for w, e in ((west1, east1), (west2, east2)))
+    candidates = [(west1, east1), (west2, east2),
+                  (west1, east2), (west2, east1)]
+    candidates = [c for c in candidates if covers(*c)]
+    if not candidates:
+        return -180.0, 180.0
+    return min(candidates, key=lambda c: _lngWidth(*c))
+
 
 class Point(MapClass):
     """A point on a two-dimensional plane.
@@ -669,9 +2557,11 @@ class Point(MapClass):
     converted to an actual google.maps.Point instance.
 
     """
+    _schema = ArgsSchema.of(['x', 'y'])
+
     def __init__(self, x, y):
         super(Point, self).__init__(cls='Point')
-        self['arg'] = Args(['x', 'y'], [x, y])
+        self['arg'] = Args(self._schema, [x, y])
 
     def __unicode__(self):
         return '%s,%s' % (self['arg'].get('x', 0),
@@ -685,9 +2575,11 @@ class Point(MapClass):
 
     def _setX(self, x):
         self['arg'][0] = x
+        self._changed()
 
     def _setY(self, y):
         self['arg'][1] = y
+        self._changed()
 
     def equals(self, other):
         return self.x == other.x and self.y == other.y
@@ -708,10 +2600,11 @@ class Size(MapClass):
     converted to an actual google.maps.Size instance.
 
     """
+    _schema = ArgsSchema.of(['width', 'height', 'widthUnit', 'heightUnit'])
+
     def __init__(self, width, height, widthUnit=None, heightUnit=None):
         super(Size, self).__init__(cls='Size')
-        self['arg'] = Args(['width', 'height', 'widthUnit', 'heightUnit'],
-                           [int(width), int(height)])
+        self['arg'] = Args(self._schema, [int(width), int(height)])
         if widthUnit:
             self['arg'].setdefault('widthUnit', widthUnit)
         if heightUnit:
@@ -729,9 +2622,11 @@ class Size(MapClass):
 
     def _setHeight(self, height):
         self['arg'][1] = height
+        self._changed()
 
     def _setWidth(self, width):
         self['arg'][0] = width
+        self._changed()
 
     def equals(self, other):
         return self.width == other.width and self.height == other.height
@@ -744,6 +2639,218 @@ class Size(MapClass):
     width = property(_getWidth, _setWidth)
 
 
+class CompactLatLng(CompactMapClass):
+    """A compact LatLng.
+
+    Behaves like LatLng but is stored as two plain floats in slots.
+
+    """
+    __slots__ = ('_lat', '_lng', '_noWrap')
+    _cls = 'LatLng'
+
+    def __init__(self, lat, lng, noWrap=None):
+        self._lat = float(lat)
+        self._lng = float(lng)
+        self._noWrap = noWrap
+
+    def __unicode__(self):
+        return self.toUrlValue()
+
+    def _args(self):
+        args = [Degree(self._lat), Degree(self._lng)]
+        if self._noWrap is not None:
+            args.append(self._noWrap)
+        return args
+
+    def equals(self, other):
+        return (self.lat() == other.lat() and self.lng() == other.lng())
+
+    def lat(self):
+        return Degree(self._lat)
+
+    def lng(self):
+        return Degree(self._lng)
+
+    def toString(self):
+        return '(%s, %s)' % (self.lat(), self.lng())
+
+    def toUrlValue(self, precision=6):
+        return '%s,%s' % (_formatDegree(self._lat, precision),
+                          _formatDegree(self._lng, precision))
+
+
+class CompactPoint(CompactMapClass):
+    """A compact Point.
+
+    Behaves like Point but is stored as two slots.
+
+    """
+    __slots__ = ('x', 'y')
+    _cls = 'Point'
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __unicode__(self):
+        return '%s,%s' % (self.x, self.y)
+
+    def _args(self):
+        return [self.x, self.y]
+
+    def equals(self, other):
+        return self.x == other.x and self.y == other.y
+
+    def toString(self):
+        return '(%s, %s)' % (self.x, self.y)
+
+
+class CompactSize(CompactMapClass):
+    """A compact Size.
+
+    Behaves like Size but is stored as slots.
+
+    """
+    __slots__ = ('width', 'height', 'widthUnit', 'heightUnit')
+    _cls = 'Size'
+
+    def __init__(self, width, height, widthUnit=None, heightUnit=None):
+        self.width = int(width)
+        self.height = int(height)
+        self.widthUnit = widthUnit
+        self.heightUnit = heightUnit
+
+    def __unicode__(self):
+        return '%sx%s' % (self.width, self.height)
+
+    def _args(self):
+        args = [self.width, self.height]
+        if self.widthUnit or self.heightUnit:
+            args.append(self.widthUnit)
+        if self.heightUnit:
+            args.append(self.heightUnit)
+        return args
+
+    def equals(self, other):
+        return self.width == other.width and self.height == other.height
+
+    def toString(self):
+        return '(%s, %s)' % (self.width, self.height)
+
+
+class PathArray(object):
+    """A columnar array of LatLng coordinates.
+
+    Latitudes and longitudes are stored in two contiguous buffers
+    (array('d'), or NumPy arrays when given them) rather than as one
+    LatLng per point. It can be used anywhere a path (a list of
+    LatLng) is expected, for instance with Polyline.setPath and
+    Polygon.setPaths. Indexing and iteration produce CompactLatLng
+    instances on the fly. When parsed by MapEncoder, it produces a
+    list of LatLng objects.
+
+    """
+    __slots__ = ('lats', 'lngs', '_owners')
+
+    def __init__(self, points=None):
+        self.lats = array('d')
+        self.lngs = array('d')
+        self._owners = None
+        if points is not None:
+            self.extend(points)
+
+    @classmethod
+    def from_arrays(cls, lats, lngs):
+        """Create a PathArray from separate latitude/longitude sequences.
+
+        NumPy arrays are kept as (float64) NumPy arrays, anything else
+        is copied into array('d') buffers.
+
+        """
+        path = cls()
+        # NumPy is not imported here: if we were given NumPy arrays, it
+        # already has been.
+        numpy = sys.modules.get('numpy')
+        if numpy is not None and (isinstance(lats, numpy.ndarray) or
+                                  isinstance(lngs, numpy.ndarray)):
+            path.lats = numpy.asarray(lats, dtype=numpy.float64)
+            path.lngs = numpy.asarray(lngs, dtype=numpy.float64)
+        else:
+            path.lats = array('d', lats)
+            path.lngs = array('d', lngs)
+        if len(path.lats) != len(path.lngs):
+            raise ValueError('lats and lngs must be the same length')
+        return path
+
+    @classmethod
+    def from_points(cls, points):
+        """Return points as a PathArray, converting only if needed."""
+        if isinstance(points, cls):
+            return points
+        return cls(points)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def __iter__(self):
+        for lat, lng in izip(self.lats, self.lngs):
+            yield CompactLatLng(lat, lng)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.from_arrays(self.lats[index], self.lngs[index])
+        return CompactLatLng(self.lats[index], self.lngs[index])
+
+    def __repr__(self):
+        return 'PathArray(%r)' % list(self)
+
+    def _aslist(self):
+        return list(self)
+
+    def append(self, point):
+        """Append a LatLng (or a (lat, lng) pair)."""
+        self.extend([point])
+
+    def extend(self, points):
+        """Append LatLng instances, (lat, lng) pairs or another PathArray."""
+        if isinstance(points, PathArray):
+            lats, lngs = points.lats, points.lngs
+        else:
+            lats, lngs = [], []
+            for point in points:
+                if hasattr(point, 'lat'):
+                    lats.append(point.lat())
+                    lngs.append(point.lng())
+                else:
+                    lats.append(point[0])
+                    lngs.append(point[1])
+        if isinstance(self.lats, array):
+            self.lats.extend(array('d', lats))
+            self.lngs.extend(array('d', lngs))
+        else:
+            numpy = sys.modules['numpy']
+            self.lats = numpy.concatenate((self.lats, lats))
+            self.lngs = numpy.concatenate((self.lngs, lngs))
+        if self._owners:
+            _ownersChanged(self)
+
+    def getAt(self, i):
+        return self[i]
+
+    def getLength(self):
+        return len(self)
+
+    def push(self, point):
+        self.append(point)
+        return len(self)
+
+
+# The values whose changes in place are passed on to their owners, and
+# the values (with lists of paths) which _own may note.
+_MUTABLE = (LatLngBounds, MarkerImage, PathArray, Point, Size)
+_OWNABLE = _MUTABLE + (list, tuple)
+
+
 class Degree(float):
     """A custom float class for degrees.
 
@@ -752,14 +2859,19 @@ class Degree(float):
     will output with, at most, the specified precision.
 
     """
+    __slots__ = ('precision',)
+
     def __new__(cls, value, precision=6):
         return float.__new__(cls, value)
 
     def __init__(self, value, precision=6):
         self.precision = precision
 
+    def __reduce__(self):
+        return Degree, (float(self), self.precision)
+
     def __repr__(self):
-        return (('%%0.%df' % self.precision) % self).rstrip('0').rstrip('.')
+        return _formatDegree(self, self.precision)
 
     def __unicode__(self):
         return self.__repr__()
@@ -768,18 +2880,88 @@ class Degree(float):
         return self.__repr__()
 
 
+class _DegreeFormats(dict):
+    """The format of Degree values (e.g. '%0.6f'), by precision."""
+    def __missing__(self, precision):
+        self[precision] = fmt = '%%0.%df' % precision
+        return fmt
+
+
+_degreeFormats = _DegreeFormats()
+
+
+def _formatDegree(value, precision=6):
+    """Return value as Degree(value, precision) prints it."""
+    return (_degreeFormats[precision] % value).rstrip('0').rstrip('.')
+
+
+def _formatPath(path, precision=6):
+    """Return a PathArray's locations as 'lat,lng|lat,lng|...'.
+
+    The same as joining the points' toUrlValue(precision), but every
+    coordinate is formatted by a single % operation, and the trailing
+    zeros of all of them are stripped together.
+
+    """
+    n = len(path)
+    if not n:
+        return ''
+    if precision < 1:
+        # Without decimals, stripping zeros goes into the integer part.
+        return '|'.join(['%s,%s' % (_formatDegree(lat, precision),
+                                    _formatDegree(lng, precision))
+                         for lat, lng in izip(path.lats, path.lngs)])
+    fmt = _degreeFormats[precision]
+    values = [None] * (2 * n)
+    values[::2] = path.lats.tolist()
+    values[1::2] = path.lngs.tolist()
+    text = ((fmt + ',' + fmt + '|') * n) % tuple(values)
+    # Every coordinate has up to precision trailing zeros: strip runs of
+    # 4, 2 and 1 of them (say), each pass taking at most one run from
+    # each coordinate, so they go in a few passes over the text.
+    zeros = '0' * (1 << (precision.bit_length() - 1))
+    while zeros:
+        text = text.replace(zeros + ',', ',').replace(zeros + '|', '|')
+        zeros = zeros[:len(zeros) // 2]
+    return text.replace('.,', ',').replace('.|', '|')[:-1]
+
+
+def _reprFloats(values):
+    """Return the repr of each float in an array('d') (or NumPy array),
+    or None if any is not finite."""
+    text = repr(values.tolist())
+    if 'n' in text:
+        # nan or inf.
+        return None
+    return text[1:-1].split(', ') if len(values) else []
+
+
 class Args(list):
-    """A custom list that implements setdefault and get by name."""
+    """A custom list that implements setdefault and get by name.
+
+    names is an ArgsSchema (usually the _schema of a MapClass), or a
+    list of names, for which the shared schema is looked up.
+
+    """
+    __slots__ = ('schema',)
+
     def __init__(self, names, values=None):
         super(Args, self).__init__(values or [])
-        self.names = names
+        self.schema = ArgsSchema.of(names)
+
+    def __reduce__(self):
+        return Args, (self.schema.names, list(self))
+
+    @property
+    def names(self):
+        return list(self.schema.names)
 
     def get(self, name, default=None):
-        i = self.names.index(name)
+        i = self.schema[name]
         return self[i] if len(self) > i else default
 
     def setdefault(self, name, default=None):
-        i = self.names.index(name)
+        i = self.schema[name]
         if len(self) <= i or self[i] is None:
             # Fill gaps with None.
             self.extend(None for _ in xrange(len(self), i))
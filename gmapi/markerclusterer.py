@@ -0,0 +1,227 @@
+"""Server-side marker clustering.
+
+The equivalent of the MarkerClusterer utility library, run on the
+server so that maps with many markers only send the browser the
+clusters visible at the map's current zoom and viewport.
+
+"""
+from math import atan2, cos, degrees, floor, radians, sin
+from gmapi.maps import LatLng, Marker, _mercator
+
+# Width (in pixels) of the square grid cells markers are clustered in.
+GRID_SIZE = 60
+
+# Above this zoom level markers are never clustered.
+MAX_ZOOM = 20
+
+
+class _Cell(object):
+    """Markers in one grid cell at one zoom level.
+
+    Longitudes are summed as points on the unit circle, so that cells
+    at zoom level 0 that span the antimeridian average correctly.
+
+    """
+    __slots__ = ('markers', 'lat', 'x', 'y')
+
+    def __init__(self):
+        self.markers = {}
+        self.lat = self.x = self.y = 0.0
+
+    def center(self):
+        """Return the average (lat, lng) of the cell's markers."""
+        return self.lat / len(self.markers), degrees(atan2(self.y, self.x))
+
+
+class MarkerClusterer(object):
+    """Clusters a large number of markers by zoom level.
+
+    Markers are bucketed into grid cells gridSize pixels square at
+    every zoom level up to maxZoom. The cells are aligned so that
+    each one is made up of four cells one zoom level in, so adding
+    or removing a marker updates a single cell per zoom level.
+
+    Markers given to the clusterer are removed from their map.
+    redraw() adds to the map a Marker, labelled with its size, for
+    each cluster in the map's viewport (see Map.getBounds) at the
+    map's zoom level, and the markers that are not clustered. The
+    markers are clustered by the position they had when added.
+
+    """
+    def __init__(self, map=None, markers=None, opts=None):
+        opts = opts or {}
+        self._gridSize = opts.get('gridSize', GRID_SIZE)
+        self._maxZoom = opts.get('maxZoom', MAX_ZOOM)
+        self._minimumClusterSize = opts.get('minimumClusterSize', 2)
+        self._map = map
+        self._levels = [{} for _ in xrange(self._maxZoom + 1)]
+        self._keys = {}
+        self._markers = {}
+        self._shown = []
+        # The number of the markers shown which are clusters.
+        self._clusters = 0
+        if markers:
+            self.addMarkers(markers)
+
+    def addMarker(self, marker, nodraw=False):
+        self.removeMarker(marker, True)
+        if marker.getMap():
+            marker.setOptions({'map': None})
+        position = marker.getPosition()
+        if position is not None:
+            lat, lng = position.lat(), position.lng()
+            x, y = _mercator(lat, lng)
+            # Cell indices at maxZoom; each zoom out halves them.
+            scale = 256.0 * 2 ** self._maxZoom / self._gridSize
+            i, j = int(floor(x * scale)), int(floor(y * scale))
+            x, y = cos(radians(lng)), sin(radians(lng))
+            self._keys[id(marker)] = (i, j, lat, x, y)
+            for level in reversed(self._levels):
+                cell = level.get((i, j))
+                if cell is None:
+                    cell = level[(i, j)] = _Cell()
+                cell.markers[id(marker)] = marker
+                cell.lat += lat
+                cell.x += x
+                cell.y += y
+                i >>= 1
+                j >>= 1
+        self._markers[id(marker)] = marker
+        if not nodraw:
+            self.redraw()
+
+    def addMarkers(self, markers, nodraw=False):
+        for marker in markers:
+            self.addMarker(marker, True)
+        if not nodraw:
+            self.redraw()
+
+    def removeMarker(self, marker, nodraw=False):
+        """Remove marker, returning whether it was in the clusterer."""
+        if self._markers.pop(id(marker), None) is None:
+            return False
+        key = self._keys.pop(id(marker), None)
+        if key is not None:
+            i, j, lat, x, y = key
+            for level in reversed(self._levels):
+                cell = level[(i, j)]
+                del cell.markers[id(marker)]
+                if cell.markers:
+                    cell.lat -= lat
+                    cell.x -= x
+                    cell.y -= y
+                else:
+                    del level[(i, j)]
+                i >>= 1
+                j >>= 1
+        if not nodraw:
+            self.redraw()
+        return True
+
+    def clearMarkers(self):
+        self._levels = [{} for _ in xrange(self._maxZoom + 1)]
+        self._keys.clear()
+        self._markers.clear()
+        self.redraw()
+
+    def getClusters(self, zoom, bounds=None):
+        """Return the clusters at zoom, within bounds if given.
+
+        Each cluster is a (position, markers) pair, positioned at
+        the average position of its markers. Clusters smaller than
+        minimumClusterSize are returned as single markers, with a
+        position of None.
+
+        """
+        level = self._levels[min(zoom, self._maxZoom)]
+        if bounds is None:
+            cells = level.values()
+        else:
+            sw, ne = bounds.getSouthWest(), bounds.getNorthEast()
+            south, north = sw.lat(), ne.lat()
+            west, east = sw.lng(), ne.lng()
+            scale = 256.0 * 2 ** min(zoom, self._maxZoom) / self._gridSize
+            (x0, y0), (x1, y1) = _mercator(north, west), _mercator(south, east)
+            first, last = int(floor(x0 * scale)), int(floor(x1 * scale))
+            if west > east:
+                # The bounds cross the antimeridian.
+                columns = [(first, int(scale)), (0, last)]
+            else:
+                columns = [(first, last)]
+            top, bottom = int(floor(y0 * scale)), int(floor(y1 * scale))
+            area = sum(b - a + 1 for a, b in columns) * (bottom - top + 1)
+            if area < len(level):
+                cells = [level[(i, j)] for a, b in columns
+                         for i in xrange(a, b + 1)
+                         for j in xrange(top, bottom + 1) if (i, j) in level]
+            else:
+                cells = level.values()
+
+            def visible(cell):
+                lat, lng = cell.center()
+                if west <= east:
+                    inside = west <= lng <= east
+                else:
+                    inside = lng >= west or lng <= east
+                return inside and south <= lat <= north
+            cells = [cell for cell in cells if visible(cell)]
+        clusters = []
+        for cell in cells:
+            n = len(cell.markers)
+            if zoom > self._maxZoom or n < self._minimumClusterSize:
+                clusters.extend((None, [m]) for m in cell.markers.values())
+            else:
+                clusters.append((LatLng(*cell.center()),
+                                 cell.markers.values()))
+        return clusters
+
+    def getGridSize(self):
+        return self._gridSize
+
+    def getMap(self):
+        return self._map
+
+    def getMarkers(self):
+        return self._markers.values()
+
+    def getMaxZoom(self):
+        return self._maxZoom
+
+    def getMinimumClusterSize(self):
+        return self._minimumClusterSize
+
+    def getTotalClusters(self):
+        """Return the number of clusters shown, leaving out the single
+        markers shown with them."""
+        return self._clusters
+
+    def getTotalMarkers(self):
+        return len(self._markers)
+
+    def redraw(self):
+        """Show the clusters for the map's zoom and viewport on it."""
+        for marker in self._shown:
+            marker.setOptions({'map': None})
+        self._shown = []
+        self._clusters = 0
+        if self._map is None or self._map.getZoom() is None:
+            return
+        for position, markers in self.getClusters(self._map.getZoom(),
+                                                  self._map.getBounds()):
+            if position is None:
+                marker = markers[0]
+            else:
+                marker = Marker(opts={
+                    'position': position, 'label': str(len(markers)),
+                    'title': '%d markers' % len(markers)})
+                self._clusters += 1
+            marker.setOptions({'map': self._map})
+            self._shown.append(marker)
+
+    def setMap(self, map):
+        for marker in self._shown:
+            marker.setOptions({'map': None})
+        self._shown = []
+        self._clusters = 0
+        self._map = map
+        self.redraw()
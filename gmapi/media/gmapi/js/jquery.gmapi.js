@@ -159,7 +159,8 @@
     }
 
     // Add and render an array of objects.
-    function addObjects(name, obj) {
+    // If an added array is given, the new objects are also pushed to it.
+    function addObjects(name, obj, added) {
         return function() {
             if (obj) {
                 var div = $(this);
@@ -168,12 +169,20 @@
                 // Get any existing objects.
                 var objects = div.data(name) || [];
                 for (var o in obj) {
-                    // Parse the marker.
-                    var object = parse(obj[o], this);
-                    // Render it to the map.
-                    object.setMap(map);
-                    // Add the marker to our array.
-                    objects.push(object);
+                    // Parse the marker (or a layer of markers).
+                    var parsed = parse(obj[o], this);
+                    if (!$.isArray(parsed)) {
+                        parsed = [parsed];
+                    }
+                    for (var i = 0; i < parsed.length; i++) {
+                        // Render it to the map.
+                        parsed[i].setMap(map);
+                        // Add the marker to our array.
+                        objects.push(parsed[i]);
+                        if (added) {
+                            added.push(parsed[i]);
+                        }
+                    }
                 }
                 // Save the marker array to div data.
                 div.data(name, objects);
@@ -181,6 +190,81 @@
         };
     }
 
+    // Clear some of the objects added by addObjects and remove them.
+    function dropObjects(div, dropped) {
+        for (var d in dropped) {
+            dropped[d].setMap(null);
+        }
+        var names = ['markers', 'polylines', 'polygons'];
+        for (var i = 0; i < names.length; i++) {
+            var objects = div.data(names[i]);
+            if (objects) {
+                div.data(names[i], $.grep(objects, function(o) {
+                    return $.inArray(o, dropped) < 0;
+                }));
+            }
+        }
+    }
+
+    // Load objects from a tile index (see gmapi.tiles) as the map moves.
+    // Fetches the tiles in view at the current zoom level (or the index's
+    // maxZoom when zoomed in further). Tiles from other zoom levels are
+    // removed when the zoom level changes.
+    function loadTiles(til) {
+        return function() {
+            var div = $(this);
+            var map = div.data('map');
+            var loaded = {};
+            var loadedZoom = null;
+            google.maps.event.addListener(map, 'idle', function() {
+                var bounds = map.getBounds();
+                var zoom = Math.min(map.getZoom(), til.maxZoom);
+                if (zoom !== loadedZoom) {
+                    for (var key in loaded) {
+                        dropObjects(div, loaded[key]);
+                    }
+                    loaded = {};
+                    loadedZoom = zoom;
+                }
+                if (!bounds || zoom < til.minZoom) {
+                    return;
+                }
+                // Find the tiles in view (the map may wrap around).
+                var n = Math.pow(2, zoom);
+                var projection = map.getProjection();
+                var sw = projection.fromLatLngToPoint(bounds.getSouthWest());
+                var ne = projection.fromLatLngToPoint(bounds.getNorthEast());
+                var x0 = Math.floor(sw.x * n / 256);
+                var x1 = Math.floor(ne.x * n / 256);
+                var y0 = Math.max(Math.floor(ne.y * n / 256), 0);
+                var y1 = Math.min(Math.floor(sw.y * n / 256), n - 1);
+                if (x1 < x0) {
+                    x1 += n;
+                }
+                for (var x = x0; x <= Math.min(x1, x0 + n - 1); x++) {
+                    for (var y = y0; y <= y1; y++) {
+                        var url = til.url.replace('{z}', zoom)
+                            .replace('{x}', x % n).replace('{y}', y);
+                        if (!(url in loaded)) {
+                            loaded[url] = [];
+                            (function(url, added) {
+                                $.getJSON(url, function(data) {
+                                    // Ignore tiles dropped while loading.
+                                    if (loaded[url] === added) {
+                                        addObjects('markers', data.mkr,
+                                                   added).call(div[0]);
+                                        addObjects('polylines', data.pln,
+                                                   added).call(div[0]);
+                                    }
+                                });
+                            })(url, loaded[url]);
+                        }
+                    }
+                }
+            });
+        };
+    }
+
     // Fit the map to the objects.
     function fitObjects(name, zoom) {
         return function() {
@@ -277,6 +361,10 @@
                         }
                     }
                 }
+                // Handle tile indexes.
+                for (var t in obj.til || []) {
+                    loadTiles(obj.til[t]).call(this);
+                }
             });
         },
         initMap: function() {
@@ -26,6 +26,30 @@
 >>> b
 {'arg': [{'arg': [18, -119], 'cls': 'LatLng'}, {'arg': [53, -74], 'cls': 'LatLng'}], 'cls': 'LatLngBounds'}
 
+# Test LatLngBounds algebra.
+>>> b.contains(maps.LatLng(38, -97)), b.contains(maps.LatLng(38, 0))
+(True, False)
+>>> b.getCenter().toUrlValue()
+'35.5,-96.5'
+>>> strait = maps.LatLngBounds()
+>>> strait.isEmpty()
+True
+>>> for lng in (170, -170, 175):
+...     strait = strait.extend(maps.LatLng(0, lng))
+>>> strait.toUrlValue(), strait.getCenter().toUrlValue()
+('0,170,0,-170', '0,180')
+>>> strait.contains(maps.LatLng(0, 179)), strait.intersects(b)
+(True, False)
+>>> maps.LatLngBounds(maps.LatLng(0, -10), maps.LatLng(1, 0)).union(
+...     maps.LatLngBounds(maps.LatLng(2, 5), maps.LatLng(3, 15))).toUrlValue()
+'0,-10,3,15'
+>>> maps.LatLngBounds.from_points([(0, 170), (1, -170), (-1, 175)]).toUrlValue()
+'-1,170,1,-170'
+>>> fitted = maps.Map(opts={'size': maps.Size(640, 480)})
+>>> fitted.fitBounds(b)
+>>> fitted.getCenter().toUrlValue(), fitted.getZoom()
+('37.50885,-96.5', 3)
+
 # Test setting multiple options at once.
 >>> m.setOptions({'center': maps.LatLng(0, 0), 'zoom': 4, 'mapTypeId': maps.MapTypeId.SATELLITE})
 >>> m
@@ -42,5 +66,693 @@
 >>> m
 {'arg': ['div', {'mapTypeId': {'val': 'MapTypeId.SATELLITE'}, 'center': {'arg': [0, 0], 'cls': 'LatLng'}, 'zoom': 4}], 'mkr': [{'arg': [{'position': {'arg': [38, -97], 'cls': 'LatLng'}}], 'cls': 'Marker'}], 'cls': 'Map'}
 
+# Test compact geometry classes.
+>>> from json import dumps
+>>> c = maps.CompactLatLng(38.5, -97)
+>>> c
+{'arg': [38.5, -97], 'cls': 'LatLng'}
+>>> c == maps.LatLng(38.5, -97)
+True
+>>> c.lat(), c.lng(), c.toUrlValue(), c.toString()
+(38.5, -97, '38.5,-97', '(38.5, -97)')
+>>> (dumps(c, cls=maps.MapEncoder) ==
+...  dumps(maps.LatLng(38.5, -97), cls=maps.MapEncoder))
+True
+>>> import pickle
+>>> pickle.loads(pickle.dumps(maps.LatLng(38.5, -97))) == maps.LatLng(38.5, -97)
+True
+>>> pickle.loads(pickle.dumps(maps.Degree(38.123456, 2))).precision
+2
+>>> maps.CompactPoint(10, 33) == maps.Point(10, 33)
+True
+>>> maps.CompactSize(400, 300, heightUnit='px') == maps.Size(400, 300, heightUnit='px')
+True
+>>> unicode(maps.CompactSize(400, 300))
+u'400x300'
+
+# Test columnar paths and marker layers.
+>>> p = maps.PathArray([maps.LatLng(38, -97), (39.5, -96)])
+>>> len(p), p[1], p[-1].toUrlValue()
+(2, {'arg': [39.5, -96], 'cls': 'LatLng'}, '39.5,-96')
+>>> p.extend(maps.PathArray.from_arrays([40], [-95]))
+>>> dumps(p, cls=maps.MapEncoder)
+'[{"arg": [38.0, -97.0], "cls": "LatLng"}, {"arg": [39.5, -96.0], "cls": "LatLng"}, {"arg": [40.0, -95.0], "cls": "LatLng"}]'
+>>> l = maps.Polyline({'path': p})
+>>> unicode(l)
+u'enc:_{|fF~h`oQ_~cH_ibE_t`B_ibE'
+>>> g = maps.Polygon({'paths': p})
+>>> unicode(g)
+u'enc:_{|fF~h`oQ_~cH_ibE_t`B_ibE~reK~reK'
+>>> m2 = maps.Map()
+>>> y = maps.MarkerLayer({'map': m2, 'positions': p, 'size': 'tiny'})
+>>> m2.markers == [y], len(y)
+(True, 3)
+>>> unicode(y)
+u'size:tiny|38,-97|39.5,-96|40,-95'
+>>> y.setOptions({'title': 'Store'})
+>>> dumps(y, cls=maps.MapEncoder, sort_keys=True)[:82]
+'[{"arg": [{"position": {"arg": [38.0, -97.0], "cls": "LatLng"}, "title": "Store"}]'
+>>> [k.getPosition().toUrlValue() for k in y]
+['38,-97', '39.5,-96', '40,-95']
+>>> p[0].toUrlValue(2), maps.LatLng(-0.0000001, 100.004).toUrlValue(2)
+('38,-97', '-0,100')
+>>> dumps(maps.PathArray.from_arrays([1e-07, float('nan')], [0.1, 2]), cls=maps.MapEncoder)
+'[{"arg": [1e-07, 0.1], "cls": "LatLng"}, {"arg": [NaN, 2.0], "cls": "LatLng"}]'
+
+# Test streaming encoding.
+>>> e = maps.MapEncoder(separators=(',', ':'))
+>>> e.chunk_size = 64
+>>> chunks = list(e.iterencode(m2))
+>>> len(chunks) > 1, max(len(c) for c in chunks) < 2 * e.chunk_size
+(True, True)
+>>> ''.join(chunks) == dumps(m2, default=e.default, separators=(',', ':'))
+True
+>>> from gmapi.forms.widgets import GoogleMap
+>>> html = GoogleMap().render('map', m2)
+>>> html == u''.join(GoogleMap().stream('map', m2))
+True
+>>> html[:98]
+u'<div style="position:relative;width:500px;height:400px;" id="map" class="gmap"><div class="{&quot;'
+
+# Test polyline encoding.
+>>> from gmapi import geometry
+>>> e = geometry.encoding.encodePath([maps.LatLng(38.5, -120.2),
+...                                   maps.LatLng(40.7, -120.95),
+...                                   maps.LatLng(43.252, -126.453)])
+>>> e
+'_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+>>> [q.toUrlValue() for q in geometry.encoding.decodePath(e)]
+['38.5,-120.2', '40.7,-120.95', '43.252,-126.453']
+>>> m3 = maps.Map()
+>>> l = maps.Polyline({'map': m3, 'path': geometry.encoding.decodePath(e)})
+>>> unicode(m3)
+u'http://maps.google.com/maps/api/staticmap?path=enc:_p%7EiF%7Eps%7CU_ulLnnqC_mqNvxq%60%40&sensor=false'
+
+# Test spherical geometry.
+>>> london, paris = maps.LatLng(51.5, -0.12), maps.LatLng(48.86, 2.35)
+>>> round(geometry.spherical.computeDistanceBetween(london, paris))
+342548.0
+>>> round(geometry.spherical.computeHeading(london, paris), 2)
+148.12
+>>> geometry.spherical.interpolate(london, paris, 0.5).toUrlValue()
+'50.186542,1.149137'
+>>> square = [maps.LatLng(0, 0), maps.LatLng(0, 1), maps.LatLng(1, 1),
+...           maps.LatLng(1, 0)]
+>>> round(geometry.spherical.computeArea(square) / 1e6)
+12392.0
+>>> geometry.spherical.computeSignedArea(square[::-1]) < 0
+True
+>>> route = maps.Polyline({'path': square})
+>>> round(geometry.spherical.computeLength(route))
+333942.0
+>>> [round(d) for d in geometry.spherical.distance_many(square, london)]
+[5732965.0, 5733923.0, 5622617.0, 5621646.0]
+>>> [q.toUrlValue() for q in
+...  geometry.spherical.interpolate_many(square, square[1:] + square[:1], 0.5)]
+['0,0.5', '0.5,1', '1.000038,0.5', '0.5,0']
+>>> geometry.spherical.heading_many(square, square[:3])
+Traceback (most recent call last):
+    ...
+ValueError: Cannot pair 4 origins with 3 destinations.
+>>> withNumpy, geometry.numpy = geometry.numpy, None
+>>> geometry.spherical.heading_many(square, square[:3])
+Traceback (most recent call last):
+    ...
+ValueError: Cannot pair 4 origins with 3 destinations.
+>>> geometry.numpy = withNumpy
+
+# Test point in polygon queries.
+>>> ring = [maps.LatLng(0, 0), maps.LatLng(0, 10), maps.LatLng(10, 10),
+...         maps.LatLng(10, 0)]
+>>> hole = [maps.LatLng(3, 3), maps.LatLng(3, 7), maps.LatLng(7, 7),
+...         maps.LatLng(7, 3)]
+>>> west = maps.Polygon({'paths': [ring, hole]})
+>>> west.containsLocation(maps.LatLng(1, 1))
+True
+>>> west.containsLocation(maps.LatLng(5, 5))
+False
+>>> list(west.contains_many([(1, 9), (5, 5), (11, 5)]))
+[True, False, False]
+>>> corner = maps.PathArray([(0, 0), (0, 10), (10, 10)])
+>>> square = maps.Polygon({'paths': corner})
+>>> square.containsLocation(maps.LatLng(8, 2))
+False
+>>> corner.push(maps.LatLng(10, 0))
+4
+>>> square.containsLocation(maps.LatLng(8, 2))
+True
+>>> pacific = maps.Polygon({'paths': [[
+...     maps.LatLng(-5, 170), maps.LatLng(-5, -170), maps.LatLng(5, -170),
+...     maps.LatLng(5, 170)]]})
+>>> geometry.poly.containsLocation(maps.LatLng(0, -179), pacific)
+True
+>>> territories = geometry.PolygonIndex([west, pacific])
+>>> territories.locate(maps.LatLng(0, 179)) is pacific
+True
+>>> print territories.locate(maps.LatLng(5, 5))
+None
+>>> [t is west for t in territories.locate_many([(1, 1), (5, 5)])]
+[True, False]
+
+# Test path simplification for static urls.
+>>> z = maps.PathArray([(0, 0), (0.001, 1), (0, 2), (1, 3), (0, 4)])
+>>> list(geometry.effectiveAreas(z))
+[inf, 0.001, 1.0, 2.0, inf]
+>>> [q.toUrlValue() for q in geometry.simplify(z, 0.5)]
+['0,0', '0,2', '1,3', '0,4']
+>>> m4 = maps.Map()
+>>> l = maps.Polyline({'map': m4, 'path': z})
+>>> len(unicode(m4))
+100
+>>> url, dropped = m4.staticUrl(92)
+>>> len(url), dropped
+(90, 2)
+>>> m4.staticUrl(10)[1]
+3
+
+# Test batch geocoding against a local stub of the Web Service.
+>>> import BaseHTTPServer, json, threading, urlparse
+>>> class StubGeocoder(BaseHTTPServer.BaseHTTPRequestHandler):
+...     calls = []
+...     def do_GET(self):
+...         query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+...         address = query['address'][0]
+...         self.calls.append(address)
+...         if address == 'busy' and self.calls.count(address) < 3:
+...             body = {'status': 'OVER_QUERY_LIMIT', 'results': []}
+...         elif address == 'nowhere':
+...             body = {'status': 'ZERO_RESULTS', 'results': []}
+...         else:
+...             body = {'status': 'OK', 'results': [{'geometry': {
+...                 'location': {'lat': len(address), 'lng': -97}}}]}
+...         self.send_response(200)
+...         self.end_headers()
+...         self.wfile.write(json.dumps(body))
+...     def log_message(self, *args):
+...         pass
+>>> server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StubGeocoder)
+>>> thread = threading.Thread(target=server.serve_forever)
+>>> thread.daemon = True
+>>> thread.start()
+>>> geocodeUrl, limiter = maps.GEOCODE_URL, maps.Geocoder._limiter
+>>> maps.GEOCODE_URL = 'http://127.0.0.1:%d/geocode' % server.server_port
+>>> maps.Geocoder._limiter = maps._TokenBucket(1000)
+>>> geocoder = maps.Geocoder()
+>>> results, status = geocoder.geocode({'address': u'Main St'})
+>>> status == 'OK', results[0]['geometry']['location']
+(True, {'arg': [7, -97], 'cls': 'LatLng'})
+>>> batch = [{'address': 'a' * (i + 1)} for i in xrange(20)]
+>>> batch.insert(5, {'address': 'busy'})
+>>> batch.insert(9, {'address': 'nowhere'})
+>>> responses = geocoder.geocode_many(batch, workers=4)
+>>> [s for r, s in responses].count('OK'), responses[9] == (None, 'ZERO_RESULTS')
+(21, True)
+>>> [r[0]['geometry']['location'].lat() for r, s in responses[:7]]
+[1, 2, 3, 4, 5, 4, 6]
+>>> StubGeocoder.calls.count('busy')
+3
+>>> bucket = maps._TokenBucket(10)
+>>> bucket.slowDown()
+>>> bucket.rate
+5.0
+>>> bucket.speedUp()
+>>> bucket.rate
+6.0
+>>> calls = len(StubGeocoder.calls)
+>>> results, status = geocoder.geocode({'address': '  MAIN   st '})
+>>> len(StubGeocoder.calls) == calls, results[0]['geometry']['location'].lat()
+(True, 7)
+>>> results, status = maps.Geocoder(lazy=True).geocode({'address': 'Main St'})
+>>> location = dict.__getitem__(results[0]['geometry'], 'location')
+>>> sorted(location.items())
+[(u'lat', 7), (u'lng', -97)]
+>>> results[0]['geometry']['location'].toUrlValue()
+'7,-97'
+>>> results, status = maps.Geocoder(lazy=True).geocode({'address': 'Main St'})
+>>> results == maps.Geocoder().geocode({'address': 'Main St'})[0]
+True
+>>> results, status = maps.Geocoder(lazy=True).geocode({'address': 'Main St'})
+>>> results
+[{u'geometry': {u'location': {'arg': [7, -97], 'cls': 'LatLng'}}}]
+>>> results, status = maps.Geocoder(lazy=True).geocode({'address': 'Main St'})
+>>> json.dumps(results)
+'[{"geometry": {"location": {"arg": [7.0, -97.0], "cls": "LatLng"}}}]'
+>>> results, status = maps.Geocoder(lazy=True).geocode({'address': 'Main St'})
+>>> dict(results[0]['geometry']), results[0]['geometry'].copy()
+({u'location': {u'lat': 7, u'lng': -97}}, {u'location': {'arg': [7, -97], 'cls': 'LatLng'}})
+>>> server.shutdown()
+>>> maps.GEOCODE_URL, maps.Geocoder._limiter = geocodeUrl, limiter
+>>> response = json.loads('{"viewport": {"southwest": {"lat": 1, "lng": 2}, '
+...                       '"northeast": {"lat": 3, "lng": 4}}}',
+...                       object_hook=maps._geocoderObject)
+>>> response['viewport'].toUrlValue()
+'1,2,3,4'
+
+# Test Geocoder transports.
+>>> import gzip, StringIO
+>>> class KeepAlive(BaseHTTPServer.BaseHTTPRequestHandler):
+...     protocol_version = 'HTTP/1.1'
+...     calls = []
+...     def do_GET(self):
+...         self.calls.append(self.client_address[1])
+...         if len(self.calls) == 1:
+...             self.send_response(503)
+...             self.send_header('Content-Length', '0')
+...             self.end_headers()
+...             return
+...         body = StringIO.StringIO()
+...         with gzip.GzipFile(fileobj=body, mode='wb') as f:
+...             f.write('{"status": "ZERO_RESULTS", "results": []}')
+...         self.send_response(200)
+...         self.send_header('Content-Encoding', 'gzip')
+...         self.send_header('Content-Length', str(len(body.getvalue())))
+...         self.end_headers()
+...         self.wfile.write(body.getvalue())
+...     def log_message(self, *args):
+...         pass
+>>> server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), KeepAlive)
+>>> thread = threading.Thread(target=server.serve_forever)
+>>> thread.daemon = True
+>>> thread.start()
+>>> maps.GEOCODE_URL = 'http://127.0.0.1:%d/geocode' % server.server_port
+>>> transport = maps.HTTPTransport(backoff=0)
+>>> pooled = maps.Geocoder(transport=transport)
+>>> pooled.geocode({'address': 'nowhere 1'})
+(None, u'ZERO_RESULTS')
+>>> pooled.geocode({'address': 'nowhere 2'})
+(None, u'ZERO_RESULTS')
+>>> len(KeepAlive.calls), len(set(KeepAlive.calls))
+(3, 1)
+>>> transport.close()
+>>> server.shutdown()
+>>> class HangUp(KeepAlive):
+...     def do_GET(self):
+...         KeepAlive.do_GET(self)
+...         # Close without saying so, as idle kept-alive connections are.
+...         self.close_connection = 1
+>>> KeepAlive.calls = [None]
+>>> server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), HangUp)
+>>> thread = threading.Thread(target=server.serve_forever)
+>>> thread.daemon = True
+>>> thread.start()
+>>> maps.GEOCODE_URL = 'http://127.0.0.1:%d/geocode' % server.server_port
+>>> once = maps.Geocoder(transport=maps.HTTPTransport(retries=0))
+>>> once.geocode({'address': 'nowhere 3'})
+(None, u'ZERO_RESULTS')
+>>> once.geocode({'address': 'nowhere 4'})
+(None, u'ZERO_RESULTS')
+>>> len(KeepAlive.calls), len(set(KeepAlive.calls))
+(3, 3)
+>>> server.shutdown()
+>>> maps.GEOCODE_URL = geocodeUrl
+>>> import socket
+>>> silent = socket.socket()
+>>> silent.bind(('127.0.0.1', 0))
+>>> silent.listen(1)
+>>> stalled = maps.HTTPTransport(timeout=0.2, retries=0)
+>>> stalled.fetch('http://127.0.0.1:%d/geocode' % silent.getsockname()[1])
+Traceback (most recent call last):
+    ...
+timeout: timed out
+>>> silent.close()
+>>> def respond(request):
+...     return {'status': 'OK', 'results': [{'geometry': {
+...         'location': {'lat': len(request['address']), 'lng': 0}}}]}
+>>> local = maps.LocalTransport(respond)
+>>> results, status = maps.Geocoder(transport=local).geocode(
+...     {'address': 'Nowhere Lane'})
+>>> results[0]['geometry']['location'].lat(), local.requests
+(12, 1)
+>>> answers = ['REQUEST_DENIED', 'OK']
+>>> def denyOnce(request):
+...     return {'status': answers.pop(0), 'results': []}
+>>> flaky = maps.LocalTransport(denyOnce)
+>>> [maps.Geocoder(transport=flaky).geocode({'address': 'Cache Lane'})[1]
+...  for _ in range(3)], flaky.requests
+([u'REQUEST_DENIED', u'OK', u'OK'], 2)
+
+# Test asynchronous geocoding, with concurrent requests coalesced.
+>>> release = threading.Event()
+>>> def slow(request):
+...     release.wait()
+...     return respond(request)
+>>> slowTransport = maps.LocalTransport(slow)
+>>> background = maps.AsyncGeocoder(maps.Geocoder(transport=slowTransport))
+>>> futures = [background.geocode({'address': a})
+...            for a in ['Elm St', ' elm  ST'] * 250 + ['Oak Ave']]
+>>> len(set(futures)), futures[0].done()
+(2, False)
+>>> release.set()
+>>> results, status = futures[1].result(timeout=10)
+>>> str(status), results[0]['geometry']['location'].lat()
+('OK', 6)
+>>> futures[-1].result(timeout=10)[0][0]['geometry']['location'].lat()
+7
+>>> slowTransport.requests
+2
+>>> called = threading.Event()
+>>> future = background.geocode({'address': 'Pine Rd'}, lambda r, s: called.set())
+>>> called.wait(10), slowTransport.requests
+(True, 3)
+>>> background.close()
+>>> class FailingGeocoder(maps.Geocoder):
+...     def geocode(self, request, callback=None):
+...         if request['address'] == 'fail':
+...             raise IOError('unreachable')
+...         return [], 'ZERO_RESULTS'
+>>> single = maps.AsyncGeocoder(FailingGeocoder(), workers=1)
+>>> failures = []
+>>> future = single.geocode({'address': 'fail'}, lambda r, s: failures.append(s))
+>>> future.result(timeout=10)
+Traceback (most recent call last):
+    ...
+IOError: unreachable
+>>> single.geocode({'address': 'next'}).result(timeout=10), failures
+(([], 'ZERO_RESULTS'), [IOError('unreachable',)])
+>>> single.close()
+
+# Test offline reverse geocoding.
+>>> import os, StringIO, tempfile
+>>> from gmapi.gazetteer import Gazetteer
+>>> towns = Gazetteer.from_csv(StringIO.StringIO(
+...     'name,state,country,lat,lng\\n'
+...     'Wichita,KS,US,37.69,-97.34\\n'
+...     'Topeka,KS,US,39.05,-95.68\\n'
+...     'Suva,,FJ,-18.14,178.44\\n'), maxDistance=500000)
+>>> offline = maps.Geocoder(backend=towns)
+>>> results, status = offline.geocode({'latLng': maps.LatLng(38, -97)})
+>>> status, results[0]['formatted_address'], results[0]['types']
+('OK', u'Wichita, KS, US', ['locality'])
+>>> results[0]['geometry']['location'].toUrlValue()
+'37.69,-97.34'
+>>> offline.geocode({'latLng': maps.LatLng(-17, -179)})[0][0]['formatted_address']
+u'Suva, FJ'
+>>> towns.geocode({'latLng': maps.LatLng(0, 0)}) is None
+True
+>>> def ocean(request):
+...     if request != {'latlng': '0,0', 'sensor': 'false'}:
+...         return {'status': 'INVALID_REQUEST', 'results': []}
+...     return {'status': 'ZERO_RESULTS', 'results': []}
+>>> online = maps.LocalTransport(ocean)
+>>> maps.Geocoder(backend=towns, transport=online).geocode(
+...     {'latLng': maps.LatLng(0, 0)}), online.requests
+((None, u'ZERO_RESULTS'), 1)
+>>> path = os.path.join(tempfile.mkdtemp(), 'towns.gaz')
+>>> towns.save(path)
+>>> with Gazetteer.load(path) as loaded:
+...     loaded.geocode({'latLng': maps.LatLng(39, -96)})[0][0]['formatted_address']
+u'Topeka, KS, US'
+>>> len(loaded), loaded.geocode({'latLng': maps.LatLng(39, -96)}) is None
+(0, True)
+>>> postcodes = Gazetteer.from_geonames(StringIO.StringIO(
+...     'US\\t67202\\tWichita\\tKansas\\tKS\\tSedgwick\\t173\\t\\t\\t37.6864\\t-97.3350\\t4\\n'))
+>>> postcodes.geocode({'latLng': maps.LatLng(38, -97)})[0][0]['formatted_address']
+u'67202, Wichita, Kansas, US'
+
+# Test the cache backends.
+>>> import os, tempfile, time
+>>> from gmapi.utils.cache import get_cache
+>>> lru = get_cache('locmem://lru?max_entries=2')
+>>> lru.set('a', 1); lru.set('b', 2); lru.get('a'); lru.set('c', 3)
+1
+>>> lru.get('a'), lru.get('b'), lru.get('c')
+(1, None, 3)
+>>> lru.set('d', 4, timeout=-1)
+>>> lru.get('d', 'expired')
+'expired'
+>>> path = os.path.join(tempfile.mkdtemp(), 'geocode.db')
+>>> disk = get_cache('sqlite://%s?max_entries=2' % path)
+>>> disk.set('a', [1, 2]); disk.set('b', 2); disk.get('a'); disk.set('c', 3)
+[1, 2]
+>>> disk.close()
+>>> disk = get_cache('sqlite://%s?max_entries=2' % path)
+>>> disk.get('a'), disk.get('b'), disk.get('c')
+([1, 2], None, 3)
+>>> files = get_cache('file://%s?max_entries=3&cull_frequency=2' %
+...                   os.path.join(tempfile.mkdtemp(), 'files'))
+>>> files.set_many({'a': 1, 'b': {'c': 2}})
+>>> sorted(files.get_many(['a', 'b', 'z']).items())
+[('a', 1), ('b', {'c': 2})]
+>>> files.delete('a')
+>>> files.get('a', 'gone'), files.has_key('b')
+('gone', True)
+>>> files.set('e', 1, timeout=-1)
+>>> files.get('e')
+>>> for key in 'fghij':
+...     files.set(key, key)
+>>> len(files._list_cache_files()) <= 3, files.get('j')
+(True, 'j')
+>>> lru.set_many({'x': 1, 'y': 2})
+>>> sorted(lru.get_many(['x', 'y']).items()), lru.incr('x', 10)
+([('x', 1), ('y', 2)], 11)
+>>> from gmapi.utils.cache import CacheProxy
+>>> proxy = CacheProxy('default')
+>>> proxy._backend is None
+True
+>>> proxy.set('p', 1)
+>>> proxy.get('p'), 'p' in proxy, proxy._backend is not None
+(1, True, True)
+
+# Test caching rendered widgets, keyed on the map's fingerprint.
+>>> m5 = maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': 4})
+>>> f = m5.fingerprint()
+>>> f == maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': 4}).fingerprint()
+True
+>>> renders = []
+>>> class CountingMap(GoogleMap):
+...     def stream(self, *args):
+...         renders.append(args[1])
+...         return super(CountingMap, self).stream(*args)
+>>> cached = CountingMap(attrs={'cache': 'locmem://render'})
+>>> html = cached.render('map', m5)
+>>> html == GoogleMap().render('map', m5)
+True
+>>> cached.render('map', m5) == html, len(renders)
+(True, 1)
+>>> marker = maps.Marker(opts={'map': m5, 'position': maps.LatLng(38, -97)})
+>>> m5.fingerprint() == f
+False
+>>> marker.setOptions({'size': 'tiny'})
+>>> f = m5.fingerprint()
+>>> marker.setOptions({'size': 'small'})
+>>> m5.fingerprint() == f
+False
+>>> cached.render('map', m5) == GoogleMap().render('map', m5), len(renders)
+(True, 2)
+>>> cached.render('map', m5, {'width': 300}) == html, len(renders)
+(False, 3)
+>>> f = m5.fingerprint()
+>>> marker.setMap(None)
+>>> m5.fingerprint() == f
+False
+>>> info = maps.InfoWindow(opts={'content': 'Wichita'})
+>>> info.open(m5)
+>>> f = m5.fingerprint()
+>>> info.setContent('Topeka')
+>>> m5.fingerprint() == f
+False
+>>> trail = maps.Polyline(opts={'map': m5, 'path': maps.PathArray([(38, -97)])})
+>>> f = m5.fingerprint()
+>>> trail.getPath().push(maps.LatLng(39, -96))
+2
+>>> m5.fingerprint() == f
+False
+>>> anchor = maps.Point(10, 33)
+>>> flag = maps.Marker(opts={'map': m5,
+...                          'icon': maps.MarkerImage('pin.png', anchor=anchor)})
+>>> f = m5.fingerprint()
+>>> anchor.x = 12
+>>> m5.fingerprint() == f
+False
+>>> frame = maps.Size(400, 300)
+>>> m5.setOptions({'size': frame})
+>>> f = m5.fingerprint()
+>>> frame.width = 500
+>>> m5.fingerprint() == f
+False
+
+# Test indexing markers for area and proximity queries.
+>>> m6 = maps.Map()
+>>> stores = [maps.Marker(opts={'map': m6, 'title': str(i),
+...                             'position': maps.LatLng(i, i * 2)})
+...           for i in range(-5, 6)]
+>>> box = maps.LatLngBounds(maps.LatLng(-1, -2), maps.LatLng(2, 4))
+>>> sorted(int(s.getTitle()) for s in m6.markers_in(box))
+[-1, 0, 1, 2]
+>>> [s.getTitle() for s in m6.nearest(maps.LatLng(3.2, 6), 3)]
+['3', '4', '2']
+>>> stores[8].setOptions({'map': None})
+>>> stores[9].setOptions({'position': maps.LatLng(0.5, 1)})
+>>> sorted(int(s.getTitle()) for s in m6.markers_in(box))
+[-1, 0, 1, 2, 4]
+>>> [s.getTitle() for s in m6.nearest(maps.LatLng(3.2, 6), 3)]
+['2', '5', '1']
+>>> wrapped = maps.LatLngBounds(maps.LatLng(-1, 179), maps.LatLng(1, -179))
+>>> marker = maps.Marker(opts={'map': m6, 'position': maps.LatLng(0, -179.5)})
+>>> m6.markers_in(wrapped) == [marker], m6.nearest(maps.LatLng(0, 179.9))[0] is marker
+(True, True)
+
+# Test clustering markers on the server, for every zoom level.
+>>> m7 = maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': 4,
+...                     'size': maps.Size(500, 400)})
+>>> m7.getBounds().toUrlValue()
+'22.922408,-118.972656,50.516523,-75.027344'
+>>> from gmapi.markerclusterer import MarkerClusterer
+>>> towns = [maps.Marker(opts={'map': m7, 'title': str(i),
+...                            'position': maps.LatLng(38 + i / 100.0, -97)})
+...          for i in range(10)]
+>>> towns.append(maps.Marker(opts={'title': 'far',
+...                                'position': maps.LatLng(45, -80)}))
+>>> clusterer = MarkerClusterer(m7, towns)
+>>> sorted(m.getTitle() for m in m7.markers)
+['10 markers', 'far']
+>>> [m.getPosition().toUrlValue() for m in m7.markers
+...  if m.getTitle() == '10 markers']
+['38.045,-97']
+>>> sorted(len(markers) for position, markers in clusterer.getClusters(0))
+[1, 10]
+>>> sorted(len(markers) for position, markers in clusterer.getClusters(16))
+[1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+>>> clusterer.addMarker(maps.Marker(opts={'position': maps.LatLng(45, -80)}))
+>>> sorted(m.getTitle() for m in m7.markers)
+['10 markers', '2 markers']
+>>> m7.setOptions({'zoom': 12})
+>>> clusterer.redraw()
+>>> sorted(m.getTitle() for m in m7.markers)
+['0', '1', '2 markers', '2 markers']
+>>> clusterer.getTotalClusters(), len(m7.markers)
+(2, 4)
+>>> clusterer.removeMarker(towns[0]), clusterer.getTotalMarkers()
+(True, 11)
+>>> sorted(m.getTitle() for m in m7.markers)
+['1', '2 markers', '2 markers']
+>>> dateline = MarkerClusterer(markers=[
+...     maps.Marker(opts={'position': maps.LatLng(0, 170)}),
+...     maps.Marker(opts={'position': maps.LatLng(0, 200)})])
+>>> [position.toUrlValue() for position, markers in dateline.getClusters(0)]
+['0,-175']
+
+# Test leaving out overlays outside the viewport, and clipping polylines.
+>>> m8 = maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': 6,
+...                     'size': maps.Size(400, 300)})
+>>> print m8.getBounds()
+35.357188,-101.394531,40.5509,-92.605469
+>>> here = maps.Marker(opts={'map': m8, 'position': maps.LatLng(38, -97)})
+>>> there = maps.Marker(opts={'map': m8, 'position': maps.LatLng(10, 10)})
+>>> route = maps.Polyline(opts={'map': m8, 'strokeWeight': 2, 'path': [
+...     maps.LatLng(38, -110), maps.LatLng(38, -97), maps.LatLng(38, -80),
+...     maps.LatLng(39, -80), maps.LatLng(39, -110)]})
+>>> area = maps.Polygon(opts={'map': m8, 'paths': [[maps.LatLng(0, 0),
+...     maps.LatLng(1, 0), maps.LatLng(1, 1)]]})
+>>> c = m8.culled()
+>>> c.markers == [here], c.polygons
+(True, [])
+>>> [(unicode(line.getPath()[0]), unicode(line.getPath()[-1]),
+...   line['arg'][0]['strokeWeight']) for line in c.polylines]
+[(u'38,-101.394531', u'38,-92.605469', 2), (u'39,-92.605469', u'39,-101.394531', 2)]
+>>> len(m8.culled(margin=10000).polygons)
+1
+>>> unicode(m8.culled(size=maps.Size(1, 1)).polylines[0].getPath()[1])
+u'38,-97'
+>>> len(unicode(c)) < len(unicode(m8))
+True
+>>> size = {'width': 400, 'height': 300}
+>>> (GoogleMap(attrs={'cull': 0}).render('map', m8, size) ==
+...  GoogleMap().render('map', c, size))
+True
+>>> c.setZoom(8)
+>>> c.fitBounds(maps.LatLngBounds(maps.LatLng(0, 0), maps.LatLng(1, 1)))
+>>> m8.getZoom(), unicode(m8.getCenter()), unicode(c.getCenter())
+(6, u'38,-97', u'0.500019,0.5')
+>>> maps.Map().culled() is not None
+True
+>>> w = maps.Map(opts={'center': maps.LatLng(0, 180), 'zoom': 5,
+...                    'size': maps.Size(400, 300)})
+>>> dateline = maps.Polyline(opts={'map': w, 'path': [maps.LatLng(0, 170),
+...                                                   maps.LatLng(0, -170)]})
+>>> [unicode(p) for p in w.culled().polylines[0].getPath()]
+[u'0,171.210938', u'0,-171.210938']
+
+# Test serving overlays as z/x/y tiles, loaded as the map moves.
+>>> from gmapi.tiles import TileIndex
+>>> m9 = maps.Map(opts={'center': maps.LatLng(38, -97), 'zoom': 4})
+>>> shops = [maps.Marker(opts={'map': m9, 'title': str(i),
+...                            'position': maps.LatLng(38, -97 + i)})
+...          for i in range(3)]
+>>> road = maps.Polyline(opts={'map': m9, 'path': [maps.LatLng(30, -100),
+...     maps.LatLng(31, -98), maps.LatLng(30, -90)]})
+>>> tiles = TileIndex.from_map(m9, '/tiles/{z}/{x}/{y}.json',
+...                            {'minZoom': 2, 'maxZoom': 12})
+>>> m9.markers, m9.polylines, m9['til']
+([], [], [{'url': '/tiles/{z}/{x}/{y}.json', 'maxZoom': 12, 'minZoom': 2}])
+>>> print tiles.tile(4, 3, 6)
+{"pln":[{"arg":[{"path":[{"arg":[30.0,-100.0],"cls":"LatLng"},{"arg":[31.0,-98.0],"cls":"LatLng"},{"arg":[30.0,-90.0],"cls":"LatLng"}]}],"cls":"Polyline"}],"mkr":[{"arg":[{"position":{"arg":[38.0,-97.0],"cls":"LatLng"},"title":"0"}],"cls":"Marker"},{"arg":[{"position":{"arg":[38.0,-96.0],"cls":"LatLng"},"title":"1"}],"cls":"Marker"},{"arg":[{"position":{"arg":[38.0,-95.0],"cls":"LatLng"},"title":"2"}],"cls":"Marker"}]}
+>>> [m['arg'][0]['title'] for m in json.loads(tiles.tile(8, 59, 98))['mkr']]
+[u'0', u'1']
+>>> [len(json.loads(tiles.tile(0, 0, 0))[k]) for k in ('mkr', 'pln')]
+[3, 1]
+>>> print tiles.tile(12, 0, 0)
+{}
+>>> tiles.tile(13, 0, 0)
+Traceback (most recent call last):
+    ...
+ValueError: Tiles are indexed for zoom levels 0 to 12, not 13.
+>>> responses = []
+>>> def start_response(status, headers):
+...     responses.append((status, dict(headers)['Content-Type']))
+>>> tiles({'PATH_INFO': '/tiles/4/3/6.json'}, start_response) == [tiles.tile(4, 3, 6)]
+True
+>>> tiles({'PATH_INFO': '/tiles/1/0/0.json'}, start_response)
+['Not Found']
+>>> responses
+[('200 OK', 'application/json'), ('404 Not Found', 'text/plain')]
+>>> tiles.addMarkers([maps.Marker(opts={'position': maps.LatLng(38, -90 + i / 1e4)})
+...                   for i in range(2000)])
+>>> counts = []
+>>> def serve():
+...     counts.append(len(json.loads(tiles.tile(0, 0, 0))['mkr']))
+>>> servers = [threading.Thread(target=serve) for _ in range(8)]
+>>> for thread in servers:
+...     thread.start()
+>>> for thread in servers:
+...     thread.join()
+>>> counts
+[2003, 2003, 2003, 2003, 2003, 2003, 2003, 2003]
+>>> tiles.setMap(None)
+>>> 'til' in m9
+False
+
+# Test keeping overlays by identity, so equal markers are told apart.
+>>> m10, m11 = maps.Map(), maps.Map()
+>>> twins = [maps.Marker(opts={'map': m10, 'position': maps.LatLng(1, 2)})
+...          for i in range(3)]
+>>> twins[0] == twins[2], twins[2] in m10.markers
+(True, True)
+>>> twins[2].setOptions({'map': m11})
+>>> [t is twins[2] for t in m11.markers], [t is twins[2] for t in m10.markers]
+([True], [False, False])
+>>> m10.markers
+[{'arg': [{'position': {'arg': [1, 2], 'cls': 'LatLng'}}], 'cls': 'Marker'}, {'arg': [{'position': {'arg': [1, 2], 'cls': 'LatLng'}}], 'cls': 'Marker'}]
+>>> print maps.MapEncoder(separators=(',', ':')).encode(m11)
+{"arg":["div"],"mkr":[{"arg":[{"position":{"arg":[1.0,2.0],"cls":"LatLng"}}],"cls":"Marker"}],"cls":"Map"}
+>>> m11.markers.remove(twins[0])
+Traceback (most recent call last):
+    ...
+ValueError: OverlayList.remove(x): x not in list
+>>> m10.markers.index(twins[1]), m10.markers[1] is twins[1]
+(1, True)
+>>> m10.markers.remove(twins[0])
+>>> m10.markers.index(twins[1]), len(m10.markers)
+(0, 1)
+>>> m12 = maps.Map()
+>>> crowd = [maps.Marker(opts={'map': m12, 'title': str(i)}) for i in range(4)]
+>>> crowd[1].setMap(None)
+>>> len(m12.markers), crowd[1] in m12.markers, m12.markers.index(crowd[3])
+(3, False, 2)
+>>> [m['arg'][0]['title'] for m in json.loads(dumps(m12))['mkr']]
+[u'0', u'2', u'3']
+>>> dumps(m11, sort_keys=True) == maps.MapEncoder(sort_keys=True).encode(m11)
+True
+
 
 """
@@ -0,0 +1,301 @@
+"""Serve a map's overlays as Web Mercator tiles of JSON.
+
+A TileIndex splits markers and polylines into z/x/y tiles (as used by
+Google Maps), each encoded as a JSON fragment of the same form as a
+map's 'mkr' and 'pln' lists. Added to a Map, it tells our jQuery
+plugin to fetch the tiles in view as the map is panned and zoomed,
+instead of sending every overlay with the page.
+
+"""
+import re
+import threading
+import gmapi.utils.settings as settings
+from bisect import bisect_left
+from itertools import izip
+from math import ceil, floor
+from gmapi.geometry import effectiveAreas, simplify
+from gmapi.maps import (Args, CompactLatLng, MapEncoder, Marker, MarkerLayer,
+                        PathArray, Polyline, _clipPath, _mercator,
+                        _unwrapPath, _worldShifts)
+
+# How long clients may cache tiles for (in seconds).
+TILE_MAX_AGE = getattr(settings, 'GMAPI_TILE_MAX_AGE', 3600)
+
+_TILE_PATH = re.compile(r'(\d+)/(\d+)/(\d+)\.json$')
+
+
+def _spread(v):
+    """Spread the bits of v out to every other bit."""
+    v = (v | (v << 16)) & 0x0000ffff0000ffff
+    v = (v | (v << 8)) & 0x00ff00ff00ff00ff
+    v = (v | (v << 4)) & 0x0f0f0f0f0f0f0f0f
+    v = (v | (v << 2)) & 0x3333333333333333
+    return (v | (v << 1)) & 0x5555555555555555
+
+
+class TileIndex(object):
+    """An index of markers and polylines by z/x/y tile.
+
+    url is where the tiles are served, with {z}, {x} and {y} in place
+    of the tile coordinates (see __call__). Tiles are served for zoom
+    levels minZoom to maxZoom; the map shows maxZoom tiles when
+    zoomed in further, and no tiles below minZoom, so set minZoom
+    high enough for tiles to hold a reasonable number of markers.
+
+    Markers are kept sorted by the Z-order (quadkey) of their maxZoom
+    tile, so every tile's markers are a contiguous run. The points of
+    MarkerLayers are kept as positions, and only made into Markers
+    when their tiles are served. Polylines are kept by the smallest
+    tile holding their bounding box, so a tile's polylines are those
+    of the tiles above it and runs of the tiles below it. They are
+    clipped to each tile and simplified to a pixel at its zoom level.
+    Polygons are not split into tiles.
+
+    Markers and polylines added are sorted into the index in bulk, the
+    next time a tile is requested. Tiles are served from the lists of
+    the index as it was then, which are replaced rather than changed,
+    so tiles may be requested (and overlays added) from many threads.
+
+    """
+    def __init__(self, url, markers=None, polylines=None, opts=None):
+        opts = opts or {}
+        self.url = url
+        self.minZoom = opts.get('minZoom', 0)
+        self.maxZoom = opts.get('maxZoom', 16)
+        self._map = None
+        self._lock = threading.Lock()
+        self._codes = []
+        self._markers = []
+        self._newMarkers = []
+        # Polylines (numbered in the order they were added) by the zoom
+        # level of their tile: sorted tile codes, and the polylines in
+        # the same order.
+        self._lineCount = 0
+        self._lineCodes = [[] for _ in xrange(self.maxZoom + 1)]
+        self._lines = [[] for _ in xrange(self.maxZoom + 1)]
+        self._newLines = []
+        # Polylines which cross the antimeridian.
+        self._wideLines = []
+        if markers:
+            self.addMarkers(markers)
+        if polylines:
+            self.addPolylines(polylines)
+
+    @classmethod
+    def from_map(cls, map, url, opts=None):
+        """Move a map's markers and polylines into a new TileIndex."""
+        markers, polylines = list(map.markers), list(map.polylines)
+        for overlay in markers + polylines:
+            overlay.setOptions({'map': None})
+        index = cls(url, markers, polylines, opts)
+        index.setMap(map)
+        return index
+
+    def __call__(self, environ, start_response):
+        """Serve tiles as a WSGI application.
+
+        Answers any path ending in z/x/y.json with that tile, so the
+        application can be mounted wherever the index's url points.
+
+        """
+        match = _TILE_PATH.search(environ.get('PATH_INFO', ''))
+        if match:
+            z, x, y = [int(g) for g in match.groups()]
+            if (self.minZoom <= z <= self.maxZoom and
+                    x < 2 ** z and y < 2 ** z):
+                body = self.tile(z, x, y)
+                start_response('200 OK', [
+                    ('Content-Type', 'application/json'),
+                    ('Content-Length', str(len(body))),
+                    ('Cache-Control', 'max-age=%d' % TILE_MAX_AGE)])
+                return [body]
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return ['Not Found']
+
+    def _code(self, lat, lng):
+        scale = 2 ** self.maxZoom
+        x, y = _mercator(lat, lng)
+        x = min(int(floor(x * scale)), scale - 1)
+        y = min(max(int(floor(y * scale)), 0), scale - 1)
+        return _spread(x) | (_spread(y) << 1)
+
+    def addMarker(self, marker):
+        self.addMarkers([marker])
+
+    def addMarkers(self, markers):
+        """Add Markers (or the points of MarkerLayers) in bulk."""
+        code = self._code
+        entries = []
+        for marker in markers:
+            if isinstance(marker, MarkerLayer):
+                opts = marker._marker['arg'].get('opts', {})
+                positions = marker._positions
+                entries.extend(
+                    (code(lat, lng), (opts, lat, lng))
+                    for lat, lng in izip(positions.lats, positions.lngs))
+                continue
+            position = marker.getPosition()
+            if position is not None:
+                entries.append((code(position.lat(), position.lng()), marker))
+        with self._lock:
+            self._newMarkers.extend(entries)
+
+    def _lineTile(self, bounds):
+        """Return the zoom level and code of the smallest tile holding
+        a bounding box, or None if it crosses the antimeridian."""
+        x0, y0, x1, y1 = bounds
+        shift = floor(x0)
+        x0, x1 = x0 - shift, x1 - shift
+        scale = 2 ** self.maxZoom
+        # Tiles touching the box, edges included (as tile checks them).
+        ax, bx = int(ceil(x0 * scale)) - 1, int(floor(x1 * scale))
+        if ax < 0 or bx >= scale:
+            return None
+        ay = min(max(int(ceil(y0 * scale)) - 1, 0), scale - 1)
+        by = min(max(int(floor(y1 * scale)), 0), scale - 1)
+        z = self.maxZoom
+        while ax != bx or ay != by:
+            ax, ay, bx, by = ax >> 1, ay >> 1, bx >> 1, by >> 1
+            z -= 1
+        return z, _spread(ax) | (_spread(ay) << 1)
+
+    def addPolyline(self, polyline):
+        self.addPolylines([polyline])
+
+    def addPolylines(self, polylines):
+        added = []
+        for polyline in polylines:
+            opts = polyline['arg'].get('opts', {})
+            path = PathArray.from_points(opts.get('path') or [])
+            if len(path) > 1:
+                xs, ys = _unwrapPath(path)
+                bounds = (min(xs), min(ys), max(xs), max(ys))
+                added.append((self._lineTile(bounds),
+                              (opts, path, effectiveAreas(path), bounds)))
+        with self._lock:
+            for tile, line in added:
+                line = (self._lineCount, line)
+                self._lineCount += 1
+                if tile is None:
+                    self._wideLines.append(line)
+                else:
+                    self._newLines.append((tile, line))
+
+    def _flush(self):
+        """Sort markers and polylines added since into the index.
+
+        Call with the lock held.
+
+        """
+        if self._newMarkers:
+            entries = zip(self._codes, self._markers) + self._newMarkers
+            entries.sort(key=lambda entry: entry[0])
+            self._codes = [code for code, m in entries]
+            self._markers = [m for code, m in entries]
+            self._newMarkers = []
+        if self._newLines:
+            for z in set(tile[0] for tile, line in self._newLines):
+                entries = zip(self._lineCodes[z], self._lines[z]) + [
+                    (tile[1], line) for tile, line in self._newLines
+                    if tile[0] == z]
+                entries.sort(key=lambda entry: entry[0])
+                self._lineCodes[z] = [code for code, line in entries]
+                self._lines[z] = [line for code, line in entries]
+            self._newLines = []
+
+    def _snapshot(self):
+        """Return the index, with anything added since sorted in: the
+        marker codes and markers, the polyline codes and polylines by
+        zoom level, and the polylines crossing the antimeridian."""
+        with self._lock:
+            self._flush()
+            return (self._codes, self._markers, list(self._lineCodes),
+                    list(self._lines), list(self._wideLines))
+
+    def getMap(self):
+        return self._map
+
+    def setMap(self, map):
+        """Have our jQuery plugin load tiles from this index on map."""
+        if self._map:
+            self._map['til'].remove(self._options())
+            if not self._map['til']:
+                del self._map['til']
+            self._map._changed()
+        self._map = map
+        if map:
+            map.setdefault('til', []).append(self._options())
+            map._changed()
+
+    def _options(self):
+        return {'url': self.url, 'minZoom': self.minZoom,
+                'maxZoom': self.maxZoom}
+
+    def tile(self, z, x, y):
+        """Return the overlays in tile z/x/y, encoded as JSON.
+
+        Raises ValueError for zoom levels above maxZoom, which the
+        index is not fine enough for.
+
+        """
+        if not 0 <= z <= self.maxZoom:
+            raise ValueError('Tiles are indexed for zoom levels 0 to %d, '
+                             'not %d.' % (self.maxZoom, z))
+        codes, markers, lineCodes, lines, wideLines = self._snapshot()
+        tile = {}
+        code = _spread(x) | (_spread(y) << 1)
+        shift = 2 * (self.maxZoom - z)
+        start = bisect_left(codes, code << shift)
+        end = bisect_left(codes, (code + 1) << shift)
+        if end > start:
+            tile['mkr'] = [_marker(m) for m in markers[start:end]]
+        n = float(2 ** z)
+        rect = (x / n, y / n, (x + 1) / n, (y + 1) / n)
+        # Leave out details smaller than half a pixel at this zoom.
+        tolerance = (360.0 / (256 * n)) ** 2 / 2
+        pieces = []
+        for opts, path, areas, (x0, y0, x1, y1) in self._tileLines(
+                z, code, lineCodes, lines, wideLines):
+            if y1 < rect[1] or y0 > rect[3] or not any(
+                    x0 + k <= rect[2] and x1 + k >= rect[0]
+                    for k in _worldShifts((x0, x1), rect[0], rect[2])):
+                continue
+            for piece in _clipPath(simplify(path, tolerance, areas), *rect):
+                line = Polyline()
+                line['arg'] = Args(Polyline._schema,
+                                   [dict(opts, path=piece)])
+                pieces.append(line)
+        if pieces:
+            tile['pln'] = pieces
+        return MapEncoder(separators=(',', ':')).encode(tile)
+
+    def _tileLines(self, z, code, lineCodes, lines, wideLines):
+        """Return the polylines (of a _snapshot) which may meet tile
+        z/code, in the order they were added."""
+        found = list(wideLines)
+        for level in xrange(self.maxZoom + 1):
+            codes = lineCodes[level]
+            if not codes:
+                continue
+            if level <= z:
+                # The tile above (or this tile itself).
+                lo = code >> 2 * (z - level)
+                hi = lo + 1
+            else:
+                # The tiles below.
+                lo = code << 2 * (level - z)
+                hi = (code + 1) << 2 * (level - z)
+            found.extend(lines[level][bisect_left(codes, lo):
+                                      bisect_left(codes, hi)])
+        found.sort(key=lambda line: line[0])
+        return [line for number, line in found]
+
+
+def _marker(entry):
+    """Return a Marker for an indexed marker or MarkerLayer point."""
+    if isinstance(entry, tuple):
+        opts, lat, lng = entry
+        marker = Marker()
+        marker['arg'].append(dict(opts, position=CompactLatLng(lat, lng)))
+        return marker
+    return entry
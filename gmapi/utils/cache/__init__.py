@@ -18,17 +18,18 @@ from gmapi.utils import settings
 from gmapi.utils import signals
 
 import importlib
+import os
+import threading
+from urlparse import parse_qsl
 
 
-# Name for use in settings file --> name of module in "backends" directory.
+# Name for use in settings file --> backend class in "backends" directory.
 # Any backend scheme that is not in this dictionary is treated as a Python
-# import path to a custom backend.
+# import path to a custom backend module, which defines a CacheClass.
 BACKENDS = {
-    'memcached': 'memcached',
-    'locmem': 'locmem',
-    'file': 'filebased',
-    'db': 'db',
-    'dummy': 'dummy',
+    'locmem': 'locmem.LocMemCache',
+    'file': 'filebased.FileBasedCache',
+    'sqlite': 'sqlite.SQLiteCache',
 }
 
 DEFAULT_CACHE_ALIAS = 'default'
@@ -67,45 +68,55 @@ def parse_backend_uri(backend_uri):
 
     return scheme, host, params
 
-if not settings.CACHES:
-    legacy_backend = getattr(settings, 'CACHE_BACKEND', None)
-    if legacy_backend:
-        import warnings
-        warnings.warn(
-            "settings.CACHE_* is deprecated; use settings.CACHES instead.",
-            DeprecationWarning
-        )
-    else:
-        # The default cache setting is put here so that we
-        # can differentiate between a user who has provided
-        # an explicit CACHE_BACKEND of locmem://, and the
-        # default value. When the deprecation cycle has completed,
-        # the default can be restored to global_settings.py
-        settings.CACHE_BACKEND = 'locmem://'
-
-    # Mapping for new-style cache backend api
-    backend_classes = {
-    }
-    engine, host, params = parse_backend_uri(settings.CACHE_BACKEND)
-    if engine in backend_classes:
-        engine = 'django.core.cache.backends.%s' % backend_classes[engine]
-    else:
-        engine = '%s.CacheClass' % engine
-    defaults = {
-        'BACKEND': engine,
-        'LOCATION': host,
-    }
-    defaults.update(params)
-    settings.CACHES[DEFAULT_CACHE_ALIAS] = defaults
+_configured = False
 
-if DEFAULT_CACHE_ALIAS not in settings.CACHES:
-    raise ImproperlyConfigured("You must define a '%s' cache" % DEFAULT_CACHE_ALIAS)
+def _configure_caches():
+    """
+    Fills in the default cache from the legacy CACHE_BACKEND setting if
+    needed. This runs on first use rather than at import time.
+    """
+    global _configured
+    if _configured:
+        return
+    if not settings.CACHES:
+        legacy_backend = getattr(settings, 'CACHE_BACKEND', None)
+        if legacy_backend:
+            import warnings
+            warnings.warn(
+                "settings.CACHE_* is deprecated; use settings.CACHES instead.",
+                DeprecationWarning
+            )
+        else:
+            # The default cache setting is put here so that we
+            # can differentiate between a user who has provided
+            # an explicit CACHE_BACKEND of locmem://, and the
+            # default value. When the deprecation cycle has completed,
+            # the default can be restored to global_settings.py
+            settings.CACHE_BACKEND = 'locmem://'
+
+        engine, host, params = parse_backend_uri(settings.CACHE_BACKEND)
+        if engine in BACKENDS:
+            engine = 'gmapi.utils.cache.backends.%s' % BACKENDS[engine]
+        else:
+            engine = '%s.CacheClass' % engine
+        defaults = {
+            'BACKEND': engine,
+            'LOCATION': host,
+        }
+        defaults.update(params)
+        settings.CACHES[DEFAULT_CACHE_ALIAS] = defaults
+
+    if DEFAULT_CACHE_ALIAS not in settings.CACHES:
+        raise ImproperlyConfigured("You must define a '%s' cache" %
+                                   DEFAULT_CACHE_ALIAS)
+    _configured = True
 
 def parse_backend_conf(backend, **kwargs):
     """
     Helper function to parse the backend configuration
     that doesn't use the URI notation.
     """
+    _configure_caches()
     # Try to get the CACHES entry for the given backend name first
     conf = settings.CACHES.get(backend, None)
     if conf is not None:
@@ -143,8 +154,8 @@ def get_cache(backend, **kwargs):
     To load a backend with its dotted import path,
     including arbitrary options::
 
-        cache = get_cache('django.core.cache.backends.memcached.MemcachedCache', **{
-            'LOCATION': '127.0.0.1:11211', 'TIMEOUT': 30,
+        cache = get_cache('gmapi.utils.cache.backends.sqlite.SQLiteCache', **{
+            'LOCATION': '/var/tmp/gmapi.db', 'TIMEOUT': 30,
         })
 
     """
@@ -153,24 +164,51 @@ def get_cache(backend, **kwargs):
             # for backwards compatibility
             backend, location, params = parse_backend_uri(backend)
             if backend in BACKENDS:
-                backend = 'django.core.cache.backends.%s' % BACKENDS[backend]
+                backend = 'gmapi.utils.cache.backends.%s' % BACKENDS[backend]
+            else:
+                backend = '%s.CacheClass' % backend
             params.update(kwargs)
-            mod = importlib.import_module(backend)
-            backend_cls = mod.CacheClass
         else:
             backend, location, params = parse_backend_conf(backend, **kwargs)
-            mod_path, cls_name = backend.rsplit('.', 1)
-            mod = importlib.import_module(mod_path)
-            backend_cls = getattr(mod, cls_name)
+        mod_path, cls_name = backend.rsplit('.', 1)
+        mod = importlib.import_module(mod_path)
+        backend_cls = getattr(mod, cls_name)
     except (AttributeError, ImportError), e:
         raise InvalidCacheBackendError(
             "Could not find backend '%s': %s" % (backend, e))
     return backend_cls(location, params)
 
-cache = get_cache(DEFAULT_CACHE_ALIAS)
-
-# Some caches -- python-memcached in particular -- need to do a cleanup at the
-# end of a request cycle. If the cache provides a close() method, wire it up
-# here.
-if hasattr(cache, 'close'):
-    signals.request_finished.connect(cache.close)
+class CacheProxy(object):
+    """
+    Stands in for a cache backend that is only created when it is first
+    used, and created again in a forked child process, so that importing
+    this module doesn't configure or connect to anything.
+    """
+    def __init__(self, alias):
+        self._alias = alias
+        self._backend = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_backend(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    backend = get_cache(self._alias)
+                    # Some caches -- python-memcached in particular -- need
+                    # to do a cleanup at the end of a request cycle. If the
+                    # cache provides a close() method, wire it up here.
+                    if hasattr(backend, 'close'):
+                        signals.request_finished.connect(backend.close)
+                    self._backend = backend
+                    self._pid = pid
+        return self._backend
+
+    def __getattr__(self, name):
+        return getattr(self._get_backend(), name)
+
+    def __contains__(self, key):
+        return key in self._get_backend()
+
+cache = CacheProxy(DEFAULT_CACHE_ALIAS)
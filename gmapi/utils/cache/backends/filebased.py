@@ -0,0 +1,177 @@
+"File-based cache backend, sharded over subdirectories."
+import errno
+import os
+import random
+import shutil
+import tempfile
+import time
+from hashlib import md5
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from gmapi.utils.cache.backends.base import BaseCache
+
+
+class FileBasedCache(BaseCache):
+    """
+    Keeps each value in its own file, named after the md5 of its key and
+    sharded over two levels of subdirectories (ab/cd/ef0123...).
+
+    A file holds the pickled expiry time followed by the pickled value.
+    Files are written to a temporary file in the same directory and then
+    renamed over the target, so readers never see a partial write.
+    Once there are more than max_entries files, expired files and then
+    the least recently written 1/cull_frequency of them are removed.
+    """
+    def __init__(self, dir, params):
+        BaseCache.__init__(self, params)
+        self._dir = dir
+        self._count = None
+        if not os.path.exists(self._dir):
+            self._createdir(self._dir)
+
+    def add(self, key, value, timeout=None, version=None):
+        if self.has_key(key, version=version):
+            return False
+        self.set(key, value, timeout=timeout, version=version)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        fname = self._key_to_file(key)
+        try:
+            f = open(fname, 'rb')
+        except IOError, e:
+            if e.errno != errno.ENOENT:
+                raise
+            return default
+        try:
+            expiry = pickle.load(f)
+            if expiry is not None and expiry <= time.time():
+                f.close()
+                self._delete(fname)
+                return default
+            return pickle.load(f)
+        except (EOFError, pickle.UnpicklingError):
+            return default
+        finally:
+            f.close()
+
+    def set(self, key, value, timeout=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        fname = self._key_to_file(key)
+        dirname = os.path.dirname(fname)
+        self._maybe_cull()
+        if not os.path.exists(dirname):
+            self._createdir(dirname)
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                pickle.dump(self.get_expiry(timeout), f,
+                            pickle.HIGHEST_PROTOCOL)
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+            if os.name == 'nt' and os.path.exists(fname):
+                # Windows can't rename over an existing file.
+                os.remove(fname)
+            os.rename(tmp, fname)
+        except Exception:
+            self._delete(tmp)
+            raise
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._delete(self._key_to_file(key))
+
+    def _delete(self, fname):
+        try:
+            os.remove(fname)
+        except OSError, e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def _maybe_cull(self):
+        # Counting files means walking the tree, so only do it now and
+        # then and keep a running estimate in between.
+        if self._count is None or random.random() < 1.0 / 64:
+            self._count = len(self._list_cache_files())
+        else:
+            self._count += 1
+        if self._count >= self._max_entries:
+            self._cull()
+
+    def _cull(self):
+        """Drop expired files, then the least recently written ones."""
+        now = time.time()
+        entries = []
+        for fname in self._list_cache_files():
+            try:
+                f = open(fname, 'rb')
+                try:
+                    expiry = pickle.load(f)
+                finally:
+                    f.close()
+                if expiry is not None and expiry <= now:
+                    self._delete(fname)
+                else:
+                    entries.append((os.path.getmtime(fname), fname))
+            except (IOError, OSError, EOFError, pickle.UnpicklingError):
+                continue
+        if len(entries) >= self._max_entries:
+            if self._cull_frequency == 0:
+                return self.clear()
+            entries.sort()
+            doomed = entries[:max(1, len(entries) // self._cull_frequency)]
+            for _, fname in doomed:
+                self._delete(fname)
+            entries = entries[len(doomed):]
+        self._count = len(entries)
+
+    def _createdir(self, dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError, e:
+            # Another thread or process may have created it.
+            if e.errno != errno.EEXIST:
+                raise EnvironmentError(
+                    "Cache directory '%s' does not exist and could not be "
+                    "created" % dirname)
+
+    def _key_to_file(self, key):
+        """
+        Convert the filename into an md5 string. We'll turn the first couple
+        bits of the path into directory prefixes to be nice to filesystems
+        that have problems with large numbers of files in a directory.
+
+        Thus, a cache key of "foo" gets turnned into a file named
+        ``{cache-dir}ac/bd/18db4cc2f85cedef654fccc4a4d8``.
+        """
+        path = md5(key).hexdigest()
+        path = os.path.join(path[:2], path[2:4], path[4:])
+        return os.path.join(self._dir, path)
+
+    def _list_cache_files(self):
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self._dir):
+            files.extend(os.path.join(dirpath, f) for f in filenames
+                         if not f.startswith('.tmp'))
+        return files
+
+    def clear(self):
+        try:
+            shutil.rmtree(self._dir)
+        except (IOError, OSError):
+            pass
+        self._createdir(self._dir)
+        self._count = 0
@@ -0,0 +1,138 @@
+"Thread-safe in-memory cache backend with LRU eviction."
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from gmapi.utils.cache.backends.base import BaseCache
+
+# Global in-memory store of cache data. Keyed by name, to provide
+# multiple named local memory caches.
+_caches = {}
+_locks = {}
+
+
+class LocMemCache(BaseCache):
+    """
+    Keeps pickled values in an ordered dict, least recently used first.
+
+    Each entry is an (expiry, pickled value) pair. Expired entries are
+    dropped when they are next looked at, and once there are more than
+    max_entries the least recently used entries are evicted.
+    """
+    def __init__(self, name, params):
+        BaseCache.__init__(self, params)
+        self._cache = _caches.setdefault(name, OrderedDict())
+        self._lock = _locks.setdefault(name, threading.Lock())
+
+    def add(self, key, value, timeout=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._get(key, time.time()) is not None:
+                return False
+            self._set(key, pickled, timeout)
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            pickled = self._get(key, time.time())
+        if pickled is None:
+            return default
+        return pickle.loads(pickled)
+
+    def _get(self, key, now):
+        """Return a pickled value and mark it as recently used."""
+        entry = self._cache.pop(key, None)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= now:
+            return None
+        self._cache[key] = entry
+        return entry[1]
+
+    def _set(self, key, pickled, timeout=None):
+        self._cache.pop(key, None)
+        self._cache[key] = (self.get_expiry(timeout), pickled)
+        if len(self._cache) > self._max_entries:
+            self._cull()
+
+    def _cull(self):
+        """Drop expired entries, then least recently used ones."""
+        now = time.time()
+        for key, (expiry, _) in self._cache.items():
+            if expiry is not None and expiry <= now:
+                del self._cache[key]
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+
+    def set(self, key, value, timeout=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._set(key, pickled, timeout)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        made = [self.make_key(key, version=version) for key in keys]
+        for key in made:
+            self.validate_key(key)
+        with self._lock:
+            now = time.time()
+            found = [(key, self._get(k, now)) for key, k in zip(keys, made)]
+        return dict((key, pickle.loads(pickled)) for key, pickled in found
+                    if pickled is not None)
+
+    def set_many(self, data, timeout=None, version=None):
+        items = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items.append((key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+        with self._lock:
+            for key, pickled in items:
+                self._set(key, pickled, timeout)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            pickled = self._get(key, time.time())
+            if pickled is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(pickled) + delta
+            # Keep the original expiry time.
+            self._cache[key] = (self._cache[key][0],
+                                pickle.dumps(new_value,
+                                             pickle.HIGHEST_PROTOCOL))
+        return new_value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            return self._get(key, time.time()) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        with self._lock:
+            for key in keys:
+                self._cache.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
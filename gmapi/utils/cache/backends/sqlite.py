@@ -0,0 +1,121 @@
+"Disk-backed cache backend using an SQLite database file."
+import random
+import sqlite3
+import threading
+import time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from gmapi.utils.cache.backends.base import BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """
+    Keeps pickled values in a single SQLite table, which survives restarts
+    and can be shared between processes.
+
+    Every hit records its access time, so that once there are more than
+    max_entries rows the least recently used ones can be culled. Expired
+    rows are deleted when they are next looked at and when culling.
+    Each thread uses its own connection.
+    """
+    def __init__(self, path, params):
+        BaseCache.__init__(self, params)
+        self._path = path
+        self._local = threading.local()
+        self._count = None
+        cursor = self._connection().cursor()
+        cursor.execute('CREATE TABLE IF NOT EXISTS cache ('
+                       'key TEXT PRIMARY KEY, value BLOB, '
+                       'expires REAL, accessed REAL)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS cache_accessed '
+                       'ON cache (accessed)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def add(self, key, value, timeout=None, version=None):
+        if self.has_key(key, version=version):
+            return False
+        self.set(key, value, timeout=timeout, version=version)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        row = connection.execute('SELECT value, expires FROM cache '
+                                 'WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        now = time.time()
+        if row[1] is not None and row[1] <= now:
+            connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return default
+        connection.execute('UPDATE cache SET accessed = ? WHERE key = ?',
+                           (now, key))
+        return pickle.loads(str(row[0]))
+
+    def set(self, key, value, timeout=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)', (key, sqlite3.Binary(pickled),
+                                    self.get_expiry(timeout), time.time()))
+        self._maybe_cull()
+
+    def _maybe_cull(self):
+        # Counting rows is a table scan, so only do it now and then.
+        if self._count is None or random.random() < 1.0 / 64:
+            self._count = self._connection().execute(
+                'SELECT COUNT(*) FROM cache').fetchone()[0]
+        else:
+            self._count += 1
+        if self._count > self._max_entries:
+            self._cull()
+
+    def _cull(self):
+        """Drop expired rows, then least recently used ones."""
+        connection = self._connection()
+        connection.execute('DELETE FROM cache WHERE expires <= ?',
+                           (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)', (count - self._max_entries,))
+        self._count = min(count, self._max_entries)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection().execute(
+            'SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+        return row is not None and (row[0] is None or row[0] > time.time())
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+        self._count = 0
+
+    def close(self, **kwargs):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -31,13 +31,22 @@ def urlencode(query, doseq=0, safe=''):
     """Custom urlencode that leaves static map delimiters ("|", ",", ":") alone.
 
     Based on Django's unicode-safe version of urllib.quote_plus.
+    Encoded polylines ("enc:...") are quoted in full, as they may
+    contain the delimiters themselves.
 
     """
     safe = safe + '|,:'
     if hasattr(query, 'items'):
         query = query.items()
-    return '&'.join([urlquote_plus(k, safe) + '=' + urlquote_plus(v, safe)
+    return '&'.join([urlquote_plus(k, safe) + '=' + _quote_value(v, safe)
                      for k, s in query
                      for v in ((isinstance(s, basestring) and [s])
                                or (doseq and hasattr(s, '__len__') and s)
                                or [s])])
+
+
+def _quote_value(value, safe):
+    if isinstance(value, basestring) and 'enc:' in value:
+        head, tail = value.split('enc:', 1)
+        return urlquote_plus(head, safe) + 'enc:' + urlquote_plus(tail)
+    return urlquote_plus(value, safe)